@@ -0,0 +1,103 @@
+"""
+API benchmarks: /predict, /anomaly/detect and /stats/predictions latency
+and throughput at several concurrency levels, for several device counts.
+
+For every device count the API is started fresh (through standins.py) on a
+database seeded with `per_device` readings per device, warmed up with one
+pass over every device, then measured with ml_model/load_test.py. A level
+with failed requests aborts the run rather than recording error latencies.
+"""
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+
+import numpy as np
+
+from standins import BENCH_COLLECTION, BENCH_DB, ML_MODEL_DIR, free_port, seed_collection, stop, wait_for_port
+
+sys.path.insert(0, ML_MODEL_DIR)
+from load_test import run_level  # noqa: E402
+
+STANDINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standins.py")
+# mongomock does not implement $lookup with a pipeline, which these endpoints use
+NEEDS_MONGOD = {"/stats/predictions"}
+
+
+def endpoint_requests(base_url, devices, seed=42):
+    rng = np.random.default_rng(seed)
+    device_ids = [f"sensor_{i + 1:02d}" for i in range(devices)]
+    return {
+        "/predict": [
+            ("POST", f"{base_url}/predict", {"device_id": d, "humidity": round(float(h), 2)})
+            for d, h in zip(device_ids, rng.uniform(40, 85, devices))
+        ],
+        "/anomaly/detect": [
+            ("POST", f"{base_url}/anomaly/detect", {"temperature": round(float(t), 2), "humidity": round(float(h), 2)})
+            for t, h in zip(rng.uniform(18, 37, 256), rng.uniform(35, 90, 256))
+        ],
+        "/stats/predictions": [("GET", f"{base_url}/stats/predictions?limit=500", None)],
+    }
+
+
+def start_api(mongo, devices, per_device, models_dir):
+    port = free_port()
+    env = dict(os.environ, MODELS_DIR=models_dir, DB_NAME=BENCH_DB, COLLECTION_NAME=BENCH_COLLECTION)
+    command = [sys.executable, STANDINS, "api", "--port", str(port),
+               "--devices", str(devices), "--per-device", str(per_device)]
+    if mongo is None:
+        command.append("--mongomock")
+    else:
+        env["MONGODB_URI"] = mongo
+
+    process = subprocess.Popen(command, env=env, cwd=ML_MODEL_DIR)
+    wait_for_port(port, process, timeout=120)
+    base_url = f"http://127.0.0.1:{port}"
+    with urllib.request.urlopen(f"{base_url}/health", timeout=30) as response:
+        health = json.loads(response.read())
+    if not health.get("models_loaded"):
+        stop(process)
+        raise RuntimeError(f"API started without models from {models_dir}")
+    return process, base_url
+
+
+def check_errors(endpoint, devices, metrics):
+    if metrics["errors"]:
+        raise RuntimeError(
+            f"{endpoint} (devices={devices}, c={metrics['concurrency']}): "
+            f"{metrics['errors']}/{metrics['requests']} requests failed; not recording the result"
+        )
+
+
+def run(mongo, device_counts, concurrency_levels, requests_per_level, per_device, models_dir):
+    results = []
+    if mongo is None:
+        print(f"⚠️  mongomock stand-in: {', '.join(sorted(NEEDS_MONGOD))} skipped (needs mongod)")
+    for devices in device_counts:
+        if mongo is not None:
+            import pymongo
+            client = pymongo.MongoClient(mongo)
+            seed_collection(client[BENCH_DB][BENCH_COLLECTION], devices, per_device)
+            client.close()
+
+        process, base_url = start_api(mongo, devices, per_device, models_dir)
+        try:
+            for endpoint, requests in endpoint_requests(base_url, devices).items():
+                if mongo is None and endpoint in NEEDS_MONGOD:
+                    continue
+                # Fill the reading buffer / first-call paths before measuring
+                check_errors(endpoint, devices, run_level(requests, min(8, max(concurrency_levels)), len(requests)))
+                for concurrency in concurrency_levels:
+                    metrics = run_level(requests, concurrency, max(requests_per_level, concurrency))
+                    check_errors(endpoint, devices, metrics)
+                    metrics.pop("concurrency")
+                    print(f"  {endpoint:<21} devices={devices:<7} c={concurrency:<4} "
+                          f"{metrics['throughput_rps']:>8,.0f} rps  p50 {metrics['p50_ms']}ms "
+                          f"p99 {metrics['p99_ms']}ms  errors {metrics['errors']}")
+                    results.append({"suite": "api", "name": endpoint,
+                                    "params": {"devices": devices, "concurrency": concurrency},
+                                    "metrics": metrics})
+        finally:
+            stop(process)
+    return results
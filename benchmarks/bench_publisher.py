@@ -0,0 +1,93 @@
+"""
+Publisher benchmarks: generate_sensor_data throughput per fleet size, and
+publish_sensor_data throughput (QoS 1, until every message is acknowledged)
+against a local mosquitto for JSON and binary payloads.
+"""
+import contextlib
+import os
+import sys
+import time
+
+from standins import PUBLISHER_DIR
+
+sys.path.insert(0, PUBLISHER_DIR)
+import mqtt_publisher  # noqa: E402
+
+
+def bench_generate(devices, min_time):
+    states = mqtt_publisher.DeviceStates(devices, seed=42)
+    mqtt_publisher.generate_sensor_data(states)  # warm-up
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        mqtt_publisher.generate_sensor_data(states)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+    return {
+        "readings_per_s": round(devices * calls / elapsed, 1),
+        "call_us": round(elapsed / calls * 1e6, 2),
+    }
+
+
+def bench_publish(broker_port, devices, payload_format, min_time, ack_timeout=60.0):
+    mqtt_publisher.DEVICES = [mqtt_publisher.device_name(i) for i in range(devices)]
+    mqtt_publisher.TOPIC = "benchmark/sensors/data"
+    mqtt_publisher.MQTT_SHARDS = 0
+    mqtt_publisher.PAYLOAD_FORMAT = payload_format
+    mqtt_publisher.TRACE_PAYLOADS = False
+
+    acked = [0]
+    client = mqtt_publisher.create_client(f"benchmark_{os.getpid()}", use_tls=False)
+    client.on_publish = lambda client, userdata, mid: acked.__setitem__(0, acked[0] + 1)
+    client.connect("127.0.0.1", broker_port, 60)
+    client.loop_start()
+
+    states = mqtt_publisher.DeviceStates(devices, seed=42)
+    messages_per_cycle = devices if payload_format == "json" else 1
+    cycles = 0
+    try:
+        # publish_sensor_data prints every reading; that cost is part of the
+        # real loop, but the terminal is not
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            while time.perf_counter() - started < min_time or not cycles:
+                mqtt_publisher.publish_sensor_data(client, states)
+                cycles += 1
+            publish_elapsed = time.perf_counter() - started
+
+            deadline = time.monotonic() + ack_timeout
+            while acked[0] < cycles * messages_per_cycle and time.monotonic() < deadline:
+                time.sleep(0.001)
+            elapsed = time.perf_counter() - started
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+    return {
+        "readings_per_s": round(devices * cycles / elapsed, 1),
+        "publish_call_readings_per_s": round(devices * cycles / publish_elapsed, 1),
+        "messages_per_s": round(acked[0] / elapsed, 1),
+        "unacked": cycles * messages_per_cycle - acked[0],
+    }
+
+
+def run(device_counts, min_time, broker_port=None):
+    results = []
+    for devices in device_counts:
+        metrics = bench_generate(devices, min_time)
+        print(f"  generate_sensor_data  devices={devices:<7} {metrics['readings_per_s']:>14,.0f} readings/s")
+        results.append({"suite": "publisher", "name": "generate_sensor_data",
+                        "params": {"devices": devices}, "metrics": metrics})
+
+    if broker_port is None:
+        return results
+    for payload_format in ("json", "binary"):
+        for devices in device_counts:
+            metrics = bench_publish(broker_port, devices, payload_format, min_time)
+            print(f"  publish_sensor_data   devices={devices:<7} {payload_format:<6} "
+                  f"{metrics['readings_per_s']:>8,.0f} readings/s acked")
+            results.append({"suite": "publisher", "name": "publish_sensor_data",
+                            "params": {"devices": devices, "format": payload_format}, "metrics": metrics})
+    return results
@@ -0,0 +1,93 @@
+"""
+Training benchmark: train_models.py wall time and peak RSS per dataset size.
+
+Each run is a fresh process (started through standins.py) training on
+`readings` synthetic readings spread over `devices` devices. Peak RSS is the
+child's ru_maxrss; with mongomock it includes the in-process database, so
+compare mongomock runs only with other mongomock runs.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from standins import BENCH_COLLECTION, BENCH_DB, ML_MODEL_DIR, seed_collection
+
+STANDINS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standins.py")
+
+
+def published_version(models_dir):
+    """Version named by the registry's CURRENT pointer, or None"""
+    try:
+        with open(os.path.join(models_dir, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def train(mongo, readings, devices, models_dir, chunk_size=50000):
+    """
+    Run train_models.py once and return its metrics. Raises if it failed or
+    published no model version, so a broken run is never recorded as a timing.
+    """
+    per_device = max(readings // devices, 1)
+    env = dict(os.environ, MODELS_DIR=models_dir, DB_NAME=BENCH_DB, COLLECTION_NAME=BENCH_COLLECTION)
+    command = [sys.executable, STANDINS, "train", "--devices", str(devices), "--per-device", str(per_device)]
+    if mongo is None:
+        command.append("--mongomock")
+    else:
+        import pymongo
+        client = pymongo.MongoClient(mongo)
+        seed_collection(client[BENCH_DB][BENCH_COLLECTION], devices, per_device)
+        client.close()
+        env["MONGODB_URI"] = mongo
+    command += ["--", "--chunk-size", str(chunk_size)]
+
+    previous_version = published_version(models_dir)
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, cwd=ML_MODEL_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.stdout.read().decode(errors="replace")
+    # wait4 rather than wait() to get the child's own resource usage
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - started
+
+    train_seconds = None
+    for line in output.splitlines():
+        if line.startswith("BENCH_TRAIN_SECONDS "):
+            train_seconds = float(line.split()[1])
+
+    metrics = {
+        "train_s": round(train_seconds, 3) if train_seconds is not None else None,
+        "process_wall_s": round(elapsed, 3),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is in KiB on Linux
+        "readings_per_s": round(readings / train_seconds, 1) if train_seconds else None,
+    }
+
+    # train_models.py exits 0 when it finds too little data, so also require a published version
+    if process.returncode != 0 or published_version(models_dir) in (None, previous_version):
+        print(output[-2000:])
+        raise RuntimeError(
+            f"train_models.py failed for {readings:,} readings (exit code {process.returncode}, "
+            f"{'no model version published' if process.returncode == 0 else 'see output above'}); "
+            f"not recording the result"
+        )
+    return metrics
+
+
+def run(mongo, dataset_sizes, devices, models_dir=None):
+    """Returns (results, models_dir of the last run)"""
+    results = []
+    trained_dir = None
+    for readings in dataset_sizes:
+        run_dir = models_dir or tempfile.mkdtemp(prefix="bench-models-")
+        metrics = train(mongo, readings, devices, run_dir)
+        trained_dir = run_dir
+        print(f"  train_models          readings={readings:<9,} {metrics['train_s']}s, "
+              f"peak RSS {metrics['peak_rss_mb']} MB")
+        results.append({"suite": "training", "name": "train_models",
+                        "params": {"readings": readings, "devices": devices},
+                        "metrics": metrics})
+    return results, trained_dir
@@ -0,0 +1,80 @@
+"""
+Compare two run_benchmarks.py result files.
+
+Results are matched by suite, name and parameters. Throughput metrics
+(*_per_s, *_rps) regress when they drop, everything else (latencies, times,
+memory) when it grows. Exits with status 1 if any metric regressed by more
+than --threshold, or a result that had no errors now has some.
+
+    python compare_results.py results/base.json results/new.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+IGNORED = {"requests", "unacked"}
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_s") or metric.endswith("_rps")
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    results = {}
+    for result in report["results"]:
+        key = (result["suite"], result["name"], json.dumps(result["params"], sort_keys=True))
+        results[key] = result["metrics"]
+    return report, results
+
+
+def compare(base, new, threshold):
+    """Yield (key, metric, base value, new value, relative change, regressed)"""
+    for key in sorted(base.keys() & new.keys()):
+        for metric, old in base[key].items():
+            value = new[key].get(metric)
+            if metric in IGNORED or old is None or value is None:
+                continue
+            if metric == "errors":
+                yield key, metric, old, value, None, value > old == 0
+                continue
+            change = (value - old) / old if old else 0.0
+            worse = -change if higher_is_better(metric) else change
+            yield key, metric, old, value, change, worse > threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    parser.add_argument("--all", action="store_true", help="print every metric, not only regressions")
+    args = parser.parse_args()
+
+    base_report, base = load(args.base)
+    new_report, new = load(args.new)
+    print(f"base {(base_report.get('commit') or '?')[:8]} ({base_report['started']})  →  "
+          f"new {(new_report.get('commit') or '?')[:8]} ({new_report['started']})")
+    if base_report.get("environment") != new_report.get("environment"):
+        print("⚠️  Runs come from different environments; differences may not be regressions")
+    if base_report.get("mongo") != new_report.get("mongo"):
+        print(f"⚠️  MongoDB stand-ins differ: {base_report.get('mongo')} vs {new_report.get('mongo')}")
+
+    regressions = 0
+    for (suite, name, params), metric, old, value, change, regressed in compare(base, new, args.threshold):
+        regressions += regressed
+        if regressed or args.all:
+            marker = "❌" if regressed else "  "
+            delta = f"{change:+.1%}" if change is not None else ""
+            print(f"{marker} {suite}/{name} {params} {metric}: {old} → {value} {delta}")
+
+    only_base, only_new = len(base.keys() - new.keys()), len(new.keys() - base.keys())
+    if only_base or only_new:
+        print(f"ℹ️  {only_base} results only in base, {only_new} only in new")
+    print(f"{'❌' if regressions else '✓'} {regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
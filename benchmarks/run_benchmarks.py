@@ -0,0 +1,151 @@
+"""
+Benchmark suite for the publisher, the prediction API and model training.
+
+Starts local stand-ins (mosquitto, and mongod or an in-process mongomock
+when mongod is not installed), runs the selected suites and writes every
+measurement to one JSON file under results/, named after the time and the
+git commit, so runs can be compared with compare_results.py.
+
+    python run_benchmarks.py
+    python run_benchmarks.py --suite api --api-devices 10,1000 --concurrency 1,16,64
+    python run_benchmarks.py --suite training --dataset-sizes 10000,100000,1000000
+    python run_benchmarks.py --mongo mongomock --quick
+    python compare_results.py results/<base>.json results/<new>.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from standins import ROOT, Mongod, Mosquitto
+
+SUITES = ["publisher", "training", "api"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the publisher, API and training against local stand-ins")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="suite to run (repeatable, default all)")
+    parser.add_argument("--mongo", default="auto",
+                        help="'mongod' (start one), 'mongomock', a mongodb:// URI, or 'auto' (mongod if installed)")
+    parser.add_argument("--broker-port", type=int, default=None,
+                        help="use a broker already listening on this port instead of starting mosquitto")
+    parser.add_argument("--publisher-devices", type=int_list, default=[5, 100, 1000, 10000])
+    parser.add_argument("--min-time", type=float, default=2.0, help="seconds per publisher measurement")
+    parser.add_argument("--dataset-sizes", type=int_list, default=[10000, 100000, 1000000],
+                        help="readings per training run")
+    parser.add_argument("--train-devices", type=int, default=20)
+    parser.add_argument("--api-devices", type=int_list, default=[10, 100, 1000])
+    parser.add_argument("--api-readings-per-device", type=int, default=50)
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and concurrency level")
+    parser.add_argument("--models-dir", default=None,
+                        help="models for the API suite (default: trained by the training suite, or once up front)")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--output", default=None, help="results file (default results/<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.publisher_devices, args.min_time = [5, 1000], 0.5
+        args.dataset_sizes, args.api_devices = [5000], [10, 100]
+        args.concurrency, args.requests = [1, 16], 100
+    suites = args.suite or SUITES
+
+    revision = git_revision()
+    started = datetime.now()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{started.strftime('%Y%m%d-%H%M%S')}-{(revision['commit'] or 'nogit')[:8]}.json"
+    )
+
+    results = []
+    with contextlib.ExitStack() as stack:
+        mongo_mode = args.mongo
+        if mongo_mode == "auto":
+            mongo_mode = "mongod" if Mongod.available() else "mongomock"
+        if mongo_mode == "mongod":
+            mongo = stack.enter_context(Mongod()).uri
+        elif mongo_mode == "mongomock":
+            mongo = None  # each child process seeds its own mongomock database
+        else:
+            mongo = mongo_mode
+        if {"training", "api"} & set(suites):
+            print(f"🗄️  MongoDB stand-in: {mongo or 'mongomock (in-process)'}")
+
+        if "publisher" in suites:
+            import bench_publisher
+
+            broker_port = args.broker_port
+            if broker_port is None and Mosquitto.available():
+                broker_port = stack.enter_context(Mosquitto()).port
+            elif broker_port is None:
+                print("⚠️  mosquitto not found on PATH; publish benchmarks skipped")
+            print("\n📤 Publisher")
+            results += bench_publisher.run(args.publisher_devices, args.min_time, broker_port)
+
+        models_dir = args.models_dir
+        if "training" in suites:
+            import bench_training
+
+            print("\n🤖 Training")
+            training, trained_dir = bench_training.run(mongo, args.dataset_sizes, args.train_devices)
+            results += training
+            models_dir = models_dir or trained_dir
+
+        if "api" in suites:
+            import bench_api
+            import bench_training
+
+            if models_dir is None:
+                print("\n🤖 Training models for the API suite (not measured)...")
+                models_dir = tempfile.mkdtemp(prefix="bench-models-")
+                bench_training.train(mongo, min(args.dataset_sizes), args.train_devices, models_dir)
+            print("\n🌐 API")
+            results += bench_api.run(
+                mongo, args.api_devices, args.concurrency, args.requests, args.api_readings_per_device, models_dir
+            )
+
+    report = {
+        "schema": 1,
+        "started": started.isoformat(timespec="seconds"),
+        **revision,
+        "environment": environment(),
+        "mongo": "mongomock" if mongo is None else mongo_mode,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "suite")},
+        "suites": suites,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ {len(results)} results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
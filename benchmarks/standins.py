@@ -0,0 +1,211 @@
+"""
+Local stand-ins for the benchmark suite: a mosquitto broker, a throwaway
+mongod (or an in-process mongomock database when mongod is not installed)
+and synthetic sensor readings.
+
+This file is also the entry point the suite starts its child processes
+through, so that with mongomock the API and the training script see a
+seeded database in their own process:
+
+    python standins.py api --port 8100 --mongomock --devices 100 --per-device 50
+    python standins.py train --mongomock --devices 20 --per-device 5000 -- --chunk-size 50000
+"""
+import argparse
+import os
+import runpy
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ML_MODEL_DIR = os.path.join(ROOT, "ml_model")
+PUBLISHER_DIR = os.path.join(ROOT, "mqtt_publisher")
+
+BENCH_DB = "iot_benchmark"
+BENCH_COLLECTION = "sensor_data"
+READING_INTERVAL = 5   # seconds between a device's readings, like the simulator
+
+# Same ranges and drift as mqtt_publisher.py
+TEMP_RANGE = (20.0, 35.0)
+HUMIDITY_RANGE = (40.0, 85.0)
+TEMP_DRIFT = 1.5
+HUMIDITY_DRIFT = 3.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process=None, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout:.0f}s")
+
+
+def stop(process, timeout=10.0):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class Mosquitto:
+    """mosquitto on a free local port for the duration of a with block"""
+
+    def __init__(self, port=None):
+        self.port = port or free_port()
+        self.process = None
+
+    @staticmethod
+    def available():
+        return shutil.which("mosquitto") is not None
+
+    def __enter__(self):
+        executable = shutil.which("mosquitto")
+        if executable is None:
+            raise RuntimeError("mosquitto not found on PATH")
+        self.process = subprocess.Popen(
+            [executable, "-p", str(self.port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_port(self.port, self.process)
+        return self
+
+    def __exit__(self, *exc):
+        stop(self.process)
+
+
+class Mongod:
+    """mongod with a temporary data directory on a free local port"""
+
+    def __init__(self, port=None):
+        self.port = port or free_port()
+        self.uri = f"mongodb://127.0.0.1:{self.port}"
+        self.dbpath = None
+        self.process = None
+
+    @staticmethod
+    def available():
+        return shutil.which("mongod") is not None
+
+    def __enter__(self):
+        executable = shutil.which("mongod")
+        if executable is None:
+            raise RuntimeError("mongod not found on PATH")
+        self.dbpath = tempfile.mkdtemp(prefix="bench-mongod-")
+        self.process = subprocess.Popen(
+            [executable, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1", "--quiet"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_port(self.port, self.process)
+        return self
+
+    def __exit__(self, *exc):
+        stop(self.process)
+        shutil.rmtree(self.dbpath, ignore_errors=True)
+
+
+def synthetic_readings(devices, per_device, seed=42, end=None):
+    """
+    Yield (device_ids, temperatures, humidities, timestamps, is_anomaly) one
+    time step at a time, oldest first: the simulator's bounded random walk
+    with readings READING_INTERVAL seconds apart, ending at `end` (now).
+    About 1% of readings are flagged as anomalies.
+    """
+    rng = np.random.default_rng(seed)
+    device_ids = [f"sensor_{i + 1:02d}" for i in range(devices)]
+    temps = rng.uniform(*TEMP_RANGE, devices)
+    hums = rng.uniform(*HUMIDITY_RANGE, devices)
+    end = end or datetime.utcnow().replace(microsecond=0)
+
+    for step in range(per_device):
+        temps = np.clip(temps + rng.uniform(-TEMP_DRIFT, TEMP_DRIFT, devices), *TEMP_RANGE)
+        hums = np.clip(hums + rng.uniform(-HUMIDITY_DRIFT, HUMIDITY_DRIFT, devices), *HUMIDITY_RANGE)
+        timestamp = end - timedelta(seconds=READING_INTERVAL * (per_device - 1 - step))
+        yield device_ids, np.round(temps, 2), np.round(hums, 2), timestamp, rng.random(devices) < 0.01
+
+
+def seed_collection(collection, devices, per_device, seed=42, chunk_size=50000):
+    """Replace the collection's contents with devices × per_device synthetic readings"""
+    collection.drop()
+    docs = []
+    for device_ids, temps, hums, timestamp, anomalies in synthetic_readings(devices, per_device, seed):
+        docs.extend(
+            {"device_id": d, "temperature": t, "humidity": h, "timestamp": timestamp, "isAnomaly": a}
+            for d, t, h, a in zip(device_ids, temps.tolist(), hums.tolist(), anomalies.tolist())
+        )
+        if len(docs) >= chunk_size:
+            collection.insert_many(docs, ordered=False)
+            docs = []
+    if docs:
+        collection.insert_many(docs, ordered=False)
+    return devices * per_device
+
+
+def use_mongomock(devices, per_device, seed=42):
+    """Point every pymongo.MongoClient in this process at one seeded mongomock database"""
+    import mongomock
+    import pymongo
+
+    client = mongomock.MongoClient()
+    seed_collection(client[BENCH_DB][BENCH_COLLECTION], devices, per_device, seed)
+    pymongo.MongoClient = lambda *args, **kwargs: client
+    os.environ.update(MONGODB_URI="mongodb://mongomock", DB_NAME=BENCH_DB, COLLECTION_NAME=BENCH_COLLECTION)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API or the training script for the benchmark suite")
+    parser.add_argument("target", choices=["api", "train"])
+    parser.add_argument("--port", type=int, default=8100, help="api: port to serve on")
+    parser.add_argument("--mongomock", action="store_true", help="seed an in-process mongomock database first")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--per-device", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    # train: everything after "--" goes to train_models.py. Split it off before parsing;
+    # a REMAINDER positional would also swallow this script's own options.
+    argv = sys.argv[1:]
+    script_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    if args.mongomock:
+        use_mongomock(args.devices, args.per_device, args.seed)
+
+    sys.path.insert(0, ML_MODEL_DIR)
+    os.chdir(ML_MODEL_DIR)
+
+    if args.target == "api":
+        import uvicorn
+        uvicorn.run("prediction_api:app", host="127.0.0.1", port=args.port, log_level="warning")
+        return
+
+    sys.argv = ["train_models.py"] + script_args
+    started = time.perf_counter()
+    code = 0
+    try:
+        runpy.run_path(os.path.join(ML_MODEL_DIR, "train_models.py"), run_name="__main__")
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 0
+    # Parsed by bench_training.py; excludes interpreter start-up and mongomock seeding
+    print(f"BENCH_TRAIN_SECONDS {time.perf_counter() - started:.6f}", flush=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
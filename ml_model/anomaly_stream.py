@@ -0,0 +1,367 @@
+"""
+Streaming anomaly scoring service.
+
+Subscribes to the same MQTT topic the simulator publishes to (JSON or packed
+binary payloads, see sensor_codec), groups readings into micro-batches (by
+size or deadline, whichever comes first), scores each batch with a single
+IsolationForest call and writes the flags (isAnomaly, anomalyScore) back onto
+the readings in the sensor collection with one unordered bulk_write per
+batch, matching each reading on (device_id, timestamp). Readings the backend
+has not saved yet are retried once after --retry-delay-ms.
+
+Run against a local broker:
+    mosquitto -p 1883
+    python anomaly_stream.py --broker localhost --port 1883 --no-tls
+
+With a sharding publisher, run one instance per group of shards:
+    python anomaly_stream.py --no-tls --shard 0 --shard 1
+    python anomaly_stream.py --no-tls --shard 2 --shard 3
+
+Traced messages (publisher --trace / TRACE_PAYLOADS=true) add per-hop
+latency (publish → receive → scored → written) and drop / duplicate /
+reorder counts to the periodic summary, see latency_trace.
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import joblib
+import numpy as np
+import paho.mqtt.client as mqtt
+import pymongo
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from latency_trace import LatencyTracer, clock_ns, trace_from_reading
+from model_registry import ModelRegistry
+import sensor_codec
+
+# Load environment variables
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("DB_NAME")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+TRACE_HOPS = ["publish→receive", "receive→scored", "scored→written", "end_to_end"]
+
+
+class MicroBatcher:
+    """
+    Thread-safe buffer that hands out batches of about max_batch readings,
+    waiting no longer than max_delay seconds after the first item arrives.
+    An item may hold several readings (a packed binary message); its size is
+    passed to put(). Readings beyond max_pending are dropped so memory stays
+    bounded.
+    """
+
+    def __init__(self, max_batch=1000, max_delay=0.05, max_pending=200000):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.items = deque()
+        self.pending = 0
+        self.first_arrival = None
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item, size=1):
+        with self.cond:
+            if self.pending + size > self.max_pending:
+                self.dropped += size
+                return False
+            if not self.items:
+                # Wake the consumer so it starts the deadline clock
+                self.first_arrival = time.monotonic()
+                self.items.append((item, size))
+                self.pending += size
+                self.cond.notify()
+                return True
+            self.items.append((item, size))
+            self.pending += size
+            if self.pending >= self.max_batch:
+                self.cond.notify()
+            return True
+
+    def get_batch(self):
+        """Block until a batch is ready; returns [] once closed and drained"""
+        with self.cond:
+            while True:
+                if self.items:
+                    remaining = self.first_arrival + self.max_delay - time.monotonic()
+                    if self.pending >= self.max_batch or remaining <= 0 or self.closed:
+                        break
+                    self.cond.wait(remaining)
+                elif self.closed:
+                    return []
+                else:
+                    self.cond.wait()
+
+            # Whole items only, so a large packed message can overshoot max_batch
+            batch, n = [], 0
+            while self.items and n < self.max_batch:
+                item, size = self.items.popleft()
+                batch.append(item)
+                n += size
+            self.pending -= n
+            self.first_arrival = time.monotonic() if self.items else None
+            return batch
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class AnomalyStreamScorer:
+    """Scores micro-batches of readings and bulk-writes the flags back onto them"""
+
+    def __init__(self, get_model, collection=None, anomalies_only=False, tracer=None, retry_delay=1.0):
+        self.get_model = get_model  # resolved per batch so new model versions are picked up
+        self.collection = collection
+        self.anomalies_only = anomalies_only
+        self.tracer = tracer
+        self.retry_delay = retry_delay
+        self.retries = deque()  # (due, updates) whose readings were not in the collection yet
+
+        self.scored = 0
+        self.anomalies = 0
+        self.batches = 0
+        self.unmatched = 0  # flags dropped because their reading never showed up
+        self.latencies = deque(maxlen=10000)  # receive -> written, seconds
+
+    def score(self, features):
+        """One pass over the forest for the whole batch; label derived from offset_"""
+        model = self.get_model()
+        scores = model.score_samples(features)
+        return scores < model.offset_, scores
+
+    def process(self, batch):
+        # batch items: (received_ns, device_ids, temperatures, humidities, timestamps, sent_ns),
+        # one message each (a single JSON reading, a JSON list or a packed binary message);
+        # sent_ns is None for untraced messages
+        temperatures = np.concatenate([item[2] for item in batch])
+        humidities = np.concatenate([item[3] for item in batch])
+        is_anomaly, scores = self.score(np.column_stack([temperatures, humidities]))
+        scored_ns = clock_ns()
+
+        if self.collection is not None:
+            device_ids = [d for item in batch for d in item[1]]
+            timestamps = [t for item in batch for t in item[4]]
+            updates = [
+                UpdateOne(
+                    {"device_id": device_id, "timestamp": timestamp},
+                    {"$set": {"isAnomaly": flag, "anomalyScore": score}}
+                )
+                for device_id, timestamp, flag, score in zip(
+                    device_ids, timestamps, is_anomaly.tolist(), scores.tolist()
+                )
+                if flag or not self.anomalies_only
+            ]
+            self.write(updates)
+
+        done_ns = clock_ns()
+        for item in batch:
+            self.latencies.extend([(done_ns - item[0]) / 1e9] * len(item[2]))
+        if self.tracer is not None:
+            traced = [item for item in batch if item[5] is not None]
+            if traced:
+                received = np.array([item[0] for item in traced], dtype=np.int64)
+                sent = np.array([item[5] for item in traced], dtype=np.int64)
+                self.tracer.record("receive→scored", scored_ns - received)
+                self.tracer.record("scored→written", np.full(len(traced), done_ns - scored_ns))
+                self.tracer.record("end_to_end", done_ns - sent)
+        self.scored += len(temperatures)
+        self.anomalies += int(is_anomaly.sum())
+        self.batches += 1
+
+    def write(self, updates):
+        """
+        Apply one batch of flag updates, plus any earlier batch whose retry is due.
+        The backend may not have saved a reading by the time it is scored, so a
+        batch with unmatched updates is re-applied once ($set is idempotent).
+        """
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            _, retry = self.retries.popleft()
+            result = self.collection.bulk_write(retry, ordered=False)
+            self.unmatched += len(retry) - result.matched_count
+
+        if updates:
+            result = self.collection.bulk_write(updates, ordered=False)
+            if result.matched_count < len(updates):
+                self.retries.append((now + self.retry_delay, updates))
+
+    def summary(self):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "scored": self.scored,
+            "anomalies": self.anomalies,
+            "batches": self.batches,
+            "unmatched": self.unmatched,
+            "avg_batch": round(self.scored / self.batches, 1) if self.batches else 0,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        }
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return datetime.utcnow()
+
+
+def print_trace(trace):
+    hops = " | ".join(
+        f"{hop} p50 {stats['p50_ms']:.2f}ms p99 {stats['p99_ms']:.2f}ms"
+        for hop, stats in trace["hops"].items() if stats["count"]
+    )
+    seq = trace["sequence"]
+    print(f"⏱️  {hops}")
+    print(f"🔢 {seq['received']:,} traced messages from {seq['streams']} streams | missing {seq['missing']:,} "
+          f"(+{seq['open_gaps']:,} open) | duplicates {seq['duplicates']:,} | reordered {seq['reordered']:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batched streaming anomaly scoring over MQTT")
+    parser.add_argument("--broker", default=os.getenv("MQTT_BROKER", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MQTT_PORT", "1883")))
+    parser.add_argument("--topic", default=os.getenv("MQTT_TOPIC", "iot/sensors/data"))
+    parser.add_argument("--shard", type=int, action="append", default=None,
+                        help="subscribe to this shard's topic instead of --topic (repeatable)")
+    parser.add_argument("--topic-template", default=os.getenv("MQTT_TOPIC_TEMPLATE", "sensors/{shard}/data"))
+    parser.add_argument("--no-tls", action="store_true", help="plain TCP (e.g. local mosquitto)")
+    parser.add_argument("--model", default=None, help="fixed model file (default: active registry version)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("ANOMALY_BATCH_SIZE", "1000")))
+    parser.add_argument("--max-delay-ms", type=float, default=float(os.getenv("ANOMALY_BATCH_DELAY_MS", "50")))
+    parser.add_argument("--max-pending", type=int, default=200000)
+    parser.add_argument("--anomalies-only", action="store_true", help="only write flags of readings scored as anomalies")
+    parser.add_argument("--retry-delay-ms", type=float, default=float(os.getenv("ANOMALY_RETRY_DELAY_MS", "1000")),
+                        help="wait before re-applying flags whose readings were not saved yet")
+    parser.add_argument("--dry-run", action="store_true", help="score without writing to MongoDB")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between summaries")
+    args = parser.parse_args()
+
+    if args.model:
+        model = joblib.load(args.model)
+        get_model = lambda: model
+    else:
+        registry = ModelRegistry(root=MODELS_DIR)
+        registry.start_watcher()
+        if registry.active().get("anomaly_model") is None:
+            print("❌ No anomaly model found. Run train_models.py first!")
+            return
+        get_model = lambda: registry.active().get("anomaly_model")
+
+    collection = None
+    if not args.dry_run:
+        collection = pymongo.MongoClient(MONGO_URI)[DB_NAME][COLLECTION_NAME]
+
+    batcher = MicroBatcher(args.batch_size, args.max_delay_ms / 1000, args.max_pending)
+    tracer = LatencyTracer(TRACE_HOPS)
+    scorer = AnomalyStreamScorer(get_model, collection, args.anomalies_only, tracer, args.retry_delay_ms / 1000)
+    malformed = 0
+
+    topics = [args.topic_template.format(shard=s) for s in args.shard] if args.shard else [args.topic]
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe([(topic, 1) for topic in topics])
+            print(f"✓ Subscribed to {', '.join(topics)} on {args.broker}:{args.port}")
+        else:
+            print(f"❌ Connection failed with code {rc}")
+
+    def trace_message(topic, trace, received_ns):
+        if trace is None:
+            return None
+        producer, seq, sent_ns = trace
+        tracer.observe(producer, topic, seq)
+        tracer.record("publish→receive", [received_ns - sent_ns])
+        return sent_ns
+
+    def on_message(client, userdata, msg):
+        nonlocal malformed
+        received_ns = clock_ns()
+        try:
+            if sensor_codec.is_binary(msg.payload):
+                records = sensor_codec.decode(msg.payload)
+                device_ids, temperatures, humidities, _ = sensor_codec.to_columns(records)
+                timestamps = records['timestamp'].astype('datetime64[ms]').tolist()
+                sent_ns = trace_message(msg.topic, sensor_codec.trace_of(msg.payload), received_ns)
+                batcher.put((received_ns, device_ids, temperatures, humidities, timestamps, sent_ns), len(records))
+                return
+
+            data = json.loads(msg.payload)
+            # A single reading, or a list of them from the batching publisher (trace on the first)
+            readings = data if isinstance(data, list) else [data]
+            item = (
+                received_ns,
+                [r["device_id"] for r in readings],
+                [float(r["temperature"]) for r in readings],
+                [float(r["humidity"]) for r in readings],
+                [parse_timestamp(r.get("timestamp")) for r in readings],
+                trace_message(msg.topic, trace_from_reading(readings[0]), received_ns) if readings else None,
+            )
+            batcher.put(item, len(readings))
+        except (ValueError, KeyError, TypeError, IndexError):
+            malformed += 1
+
+    client = mqtt.Client(client_id=f"anomaly_stream_{os.getpid()}")
+    if not args.no_tls:
+        client.tls_set()
+    username, password = os.getenv("MQTT_USERNAME"), os.getenv("MQTT_PASSWORD")
+    if username and password:
+        client.username_pw_set(username, password)
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    def score_loop():
+        while True:
+            batch = batcher.get_batch()
+            if not batch:
+                return
+            try:
+                scorer.process(batch)
+            except Exception as e:
+                print(f"⚠️  Batch of {len(batch)} failed: {e}")
+
+    worker = threading.Thread(target=score_loop, daemon=True)
+    worker.start()
+
+    client.connect(args.broker, args.port, 60)
+    client.loop_start()
+    print(f"🔍 Scoring in batches of up to {args.batch_size} / {args.max_delay_ms}ms. Press Ctrl+C to stop")
+
+    try:
+        last_scored = 0
+        while True:
+            time.sleep(args.report_every)
+            stats = scorer.summary()
+            rate = (stats["scored"] - last_scored) / args.report_every
+            last_scored = stats["scored"]
+            print(f"📊 {rate:,.0f} msg/s | scored {stats['scored']:,} | anomalies {stats['anomalies']:,} | "
+                  f"avg batch {stats['avg_batch']} | p50 {stats['p50_ms']}ms p99 {stats['p99_ms']}ms | "
+                  f"dropped {batcher.dropped:,} | malformed {malformed:,} | unmatched {stats['unmatched']:,}")
+            trace = tracer.summary()
+            if trace["sequence"]["received"]:
+                print_trace(trace)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping...")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        batcher.close()
+        worker.join()
+        print(f"✓ Final: {scorer.summary()}")
+        if tracer.summary()["sequence"]["received"]:
+            print_trace(tracer.summary())
+
+
+if __name__ == "__main__":
+    main()
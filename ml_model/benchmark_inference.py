@@ -0,0 +1,91 @@
+"""
+Micro-benchmark: sklearn scaler + LinearRegression vs the fused affine path.
+
+Reports per-row and batched latency for both paths and the maximum
+difference between their predictions.
+
+    python benchmark_inference.py              # active models from models/
+    python benchmark_inference.py --synthetic  # no trained models needed
+"""
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import MinMaxScaler
+
+from fused_model import FusedLinearModel, probe_features
+from model_registry import ModelRegistry
+
+warnings.filterwarnings('ignore')
+
+
+def synthetic_models(n=5000, seed=42):
+    """Scaler + model fitted on data shaped like the real feature matrix"""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(40, 85, n),     # humidity
+        rng.integers(0, 24, n),     # hour
+        rng.integers(0, 7, n),      # day_of_week
+        rng.uniform(20, 35, n),     # temp_lag_1
+        rng.uniform(20, 35, n),     # temp_lag_2
+        rng.uniform(40, 85, n),     # humidity_lag_1
+    ])
+    y = 0.8 * X[:, 3] + 0.15 * X[:, 4] - 0.02 * X[:, 0] + rng.normal(0, 0.3, n)
+
+    scaler = MinMaxScaler().fit(X)
+    model = LinearRegression().fit(scaler.transform(X), y)
+    return scaler, model
+
+
+def time_per_call(fn, features, repeat):
+    fn(features)  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(features)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sklearn and fused linear inference")
+    parser.add_argument("--synthetic", action="store_true", help="fit throwaway models instead of loading")
+    parser.add_argument("--models-dir", default=os.getenv("MODELS_DIR", "models"))
+    parser.add_argument("--batch-sizes", default="1,10,100,1000,10000")
+    parser.add_argument("--min-time", type=float, default=0.5, help="approx seconds per measurement")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        scaler, model = synthetic_models()
+    else:
+        models = ModelRegistry(root=args.models_dir).active()
+        scaler, model = models.get('scaler'), models.get('temperature_model')
+        if scaler is None or model is None:
+            print("❌ Models not found. Run train_models.py first or pass --synthetic")
+            return
+
+    fused = FusedLinearModel(scaler, model)
+    sklearn_path = lambda X: model.predict(scaler.transform(X))
+
+    probe = probe_features(scaler, n=10000)
+    max_err = float(np.max(np.abs(fused.predict(probe) - sklearn_path(probe))))
+    print(f"Max |fused - sklearn| over {len(probe)} rows: {max_err:.3e}\n")
+
+    print(f"{'batch':>7} {'sklearn µs/call':>16} {'fused µs/call':>14} {'sklearn µs/row':>15} {'fused µs/row':>13} {'speedup':>8}")
+    for size in (int(b) for b in args.batch_sizes.split(",")):
+        features = probe_features(scaler, n=size, seed=size)
+
+        # Size the loop so each measurement takes roughly --min-time
+        single = time_per_call(sklearn_path, features, 3)
+        repeat = max(3, int(args.min_time / max(single, 1e-7)))
+
+        t_sklearn = time_per_call(sklearn_path, features, repeat)
+        t_fused = time_per_call(fused.predict, features, repeat * 10)
+
+        print(f"{size:>7} {t_sklearn * 1e6:>16.2f} {t_fused * 1e6:>14.2f} "
+              f"{t_sklearn / size * 1e6:>15.3f} {t_fused / size * 1e6:>13.3f} {t_sklearn / t_fused:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Chunked, columnar training data loader.
+
+Reads sensor documents from MongoDB in timestamp order with a projection of
+only the fields training needs, and turns each batch into NumPy columns.
+Lag features are computed per chunk; the last readings of every device are
+carried over so lags are correct across chunk boundaries.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+PROJECTION = {'_id': 0, 'device_id': 1, 'timestamp': 1, 'temperature': 1, 'humidity': 1}
+FEATURE_COLUMNS = ['humidity', 'hour', 'day_of_week', 'temp_lag_1', 'temp_lag_2', 'humidity_lag_1']
+
+
+def build_query(start=None, end=None, device_ids=None):
+    query = {}
+    if start is not None or end is not None:
+        query['timestamp'] = {}
+        if start is not None:
+            query['timestamp']['$gte'] = start
+        if end is not None:
+            query['timestamp']['$lt'] = end
+    if device_ids:
+        query['device_id'] = {'$in': list(device_ids)}
+    return query
+
+
+def parse_datetime(value):
+    """ISO timestamp as a naive UTC datetime (stored timestamps are naive UTC); None passes through"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def iter_raw_chunks(collection, query=None, chunk_size=50000, limit=None, with_ids=False):
+    """
+    Yield dicts of NumPy columns (device_id, timestamp, temperature, humidity,
+    plus _id with with_ids), at most chunk_size rows each, in timestamp order.
+    """
+    projection = dict(PROJECTION, _id=1) if with_ids else PROJECTION
+    cursor = collection.find(query or {}, projection).sort('timestamp', 1).batch_size(min(chunk_size, 10000))
+    if limit:
+        cursor = cursor.limit(limit)
+
+    ids, device_ids, timestamps = [], [], []
+    temperature = np.empty(chunk_size, dtype=np.float64)
+    humidity = np.empty(chunk_size, dtype=np.float64)
+    n = 0
+
+    def flush():
+        chunk = {
+            'device_id': np.array(device_ids, dtype=object),
+            'timestamp': np.array(timestamps, dtype='datetime64[ms]'),
+            'temperature': temperature[:n].copy(),
+            'humidity': humidity[:n].copy(),
+        }
+        if with_ids:
+            chunk['_id'] = np.array(ids, dtype=object)
+        return chunk
+
+    for doc in cursor:
+        if with_ids:
+            ids.append(doc['_id'])
+        device_ids.append(doc['device_id'])
+        timestamps.append(doc['timestamp'])
+        temperature[n] = doc['temperature']
+        humidity[n] = doc['humidity']
+        n += 1
+
+        if n == chunk_size:
+            yield flush()
+            ids, device_ids, timestamps = [], [], []
+            n = 0
+
+    if n:
+        yield flush()
+
+
+class Watermark:
+    """
+    Read position of an incremental job in the timestamp-ordered stream.
+
+    A strict `timestamp > newest seen` query skips readings that arrive late
+    or share the newest timestamp (the simulator stamps every device with the
+    same second). Instead each run re-reads from `overlap` seconds before the
+    newest timestamp and drops readings already admitted, by _id. Readings
+    later than that are still missed; the _ids kept cover one overlap window.
+    """
+
+    def __init__(self, overlap=120.0):
+        self.overlap = overlap
+        self.newest = None      # epoch ms
+        self.seen = {}          # _id -> epoch ms, readings inside the overlap window
+
+    @classmethod
+    def after(cls, timestamp, overlap=120.0):
+        """Continue from a plain timestamp watermark (nothing to dedupe against yet)"""
+        watermark = cls(overlap)
+        if timestamp is not None:
+            watermark.newest = int(np.datetime64(timestamp, 'ms').astype(np.int64))
+        return watermark
+
+    def query(self, query=None):
+        query = dict(query or {})
+        if self.newest is not None:
+            if self.seen:
+                since = self.newest - int(self.overlap * 1000)
+                query['timestamp'] = {'$gte': np.datetime64(since, 'ms').item()}
+            else:
+                query['timestamp'] = {'$gt': np.datetime64(self.newest, 'ms').item()}
+        return query
+
+    def admit(self, chunk):
+        """Drop (and the _id column) readings admitted before; remember the rest"""
+        ids = chunk.pop('_id')
+        ms = chunk['timestamp'].astype(np.int64)
+        keep = np.fromiter((i not in self.seen for i in ids), dtype=bool, count=len(ids))
+
+        if len(ms):
+            self.seen.update(zip(ids[keep].tolist(), ms[keep].tolist()))
+            self.newest = int(ms.max()) if self.newest is None else max(self.newest, int(ms.max()))
+            cutoff = self.newest - int(self.overlap * 1000)
+            self.seen = {i: t for i, t in self.seen.items() if t >= cutoff}
+        return {name: column[keep] for name, column in chunk.items()}
+
+    def __str__(self):
+        return str(np.datetime64(self.newest, 'ms')) if self.newest is not None else "None"
+
+
+class LagState:
+    """Last two temperatures and last humidity per device, carried between chunks"""
+
+    def __init__(self):
+        self.codes = {}
+        self.temp_1 = np.full(0, np.nan)
+        self.temp_2 = np.full(0, np.nan)
+        self.humidity_1 = np.full(0, np.nan)
+
+    def encode(self, device_ids):
+        codes = np.fromiter(
+            (self.codes.setdefault(d, len(self.codes)) for d in device_ids),
+            dtype=np.int64, count=len(device_ids)
+        )
+        grow = len(self.codes) - len(self.temp_1)
+        if grow > 0:
+            pad = np.full(grow, np.nan)
+            self.temp_1 = np.concatenate([self.temp_1, pad])
+            self.temp_2 = np.concatenate([self.temp_2, pad])
+            self.humidity_1 = np.concatenate([self.humidity_1, pad])
+        return codes
+
+
+def add_features(chunk, state):
+    """
+    Add hour, day_of_week, minute and lag columns to a chunk in place.
+    Equivalent to groupby('device_id').shift() over the concatenated stream.
+    """
+    ts = chunk['timestamp']
+    chunk['hour'] = (ts.astype('datetime64[h]').astype(np.int64) % 24).astype(np.float64)
+    # 1970-01-01 was a Thursday; pandas dayofweek counts Monday as 0
+    chunk['day_of_week'] = ((ts.astype('datetime64[D]').astype(np.int64) + 3) % 7).astype(np.float64)
+    chunk['minute'] = (ts.astype('datetime64[m]').astype(np.int64) % 60).astype(np.float64)
+
+    codes = state.encode(chunk['device_id'])
+    n = len(codes)
+
+    # Group rows by device while keeping time order within each device
+    order = np.argsort(codes, kind='stable')
+    dev = codes[order]
+    temp = chunk['temperature'][order]
+    hum = chunk['humidity'][order]
+
+    starts = np.r_[True, dev[1:] != dev[:-1]]
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    pos = np.arange(n) - group_start
+
+    temp_lag_1 = np.empty(n)
+    temp_lag_1[1:] = temp[:-1]
+    temp_lag_1[pos == 0] = state.temp_1[dev[pos == 0]]
+
+    temp_lag_2 = np.empty(n)
+    temp_lag_2[2:] = temp[:-2]
+    temp_lag_2[pos == 0] = state.temp_2[dev[pos == 0]]
+    temp_lag_2[pos == 1] = state.temp_1[dev[pos == 1]]
+
+    humidity_lag_1 = np.empty(n)
+    humidity_lag_1[1:] = hum[:-1]
+    humidity_lag_1[pos == 0] = state.humidity_1[dev[pos == 0]]
+
+    # Carry each device's last readings into the next chunk
+    ends = np.r_[dev[1:] != dev[:-1], True]
+    last = np.flatnonzero(ends)
+    last_dev = dev[last]
+    state.temp_2[last_dev] = np.where(pos[last] >= 1, temp[last - 1], state.temp_1[last_dev])
+    state.temp_1[last_dev] = temp[last]
+    state.humidity_1[last_dev] = hum[last]
+
+    # Back to time order
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[order] = np.arange(n)
+    chunk['temp_lag_1'] = temp_lag_1[inverse]
+    chunk['temp_lag_2'] = temp_lag_2[inverse]
+    chunk['humidity_lag_1'] = humidity_lag_1[inverse]
+    return chunk
+
+
+def iter_feature_chunks(collection, query=None, chunk_size=50000, limit=None, dropna=True, state=None,
+                        watermark=None):
+    """
+    Feature-engineered chunks; rows without full lag history are dropped by default.
+    Pass a saved LagState to continue lags from a previous run, and a Watermark
+    to read only readings that run has not seen (it advances as chunks are read).
+    """
+    state = state if state is not None else LagState()
+    if watermark is not None:
+        query = watermark.query(query)
+    for chunk in iter_raw_chunks(collection, query, chunk_size, limit, with_ids=watermark is not None):
+        if watermark is not None:
+            chunk = watermark.admit(chunk)
+            if not len(chunk['temperature']):
+                continue
+        chunk = add_features(chunk, state)
+        if dropna:
+            keep = ~np.isnan(chunk['temp_lag_2']) & ~np.isnan(chunk['humidity_lag_1'])
+            chunk = {name: column[keep] for name, column in chunk.items()}
+        if len(chunk['temperature']):
+            yield chunk
+
+
+def load_features(collection, query=None, chunk_size=50000, limit=None):
+    """Concatenate all feature chunks into one dict of columns"""
+    chunks = list(iter_feature_chunks(collection, query, chunk_size, limit))
+    if not chunks:
+        return None
+    return {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
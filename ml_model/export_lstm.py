@@ -0,0 +1,63 @@
+"""
+Export the trained LSTM to TensorFlow Lite for lower per-call latency.
+
+Writes lstm_temperature_model.tflite next to the .h5 in the active (or given)
+model version. Serve it with LSTM_RUNTIME=tflite; the API falls back to Keras
+when the file is missing.
+
+    python export_lstm.py
+    python export_lstm.py --version 20250101120000
+"""
+import argparse
+import os
+
+from model_registry import ModelRegistry
+from lstm_service import KERAS_FILE, TFLITE_FILE, load_keras_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the LSTM model to TensorFlow Lite")
+    parser.add_argument("--models-dir", default=os.getenv("MODELS_DIR", "models"))
+    parser.add_argument("--version", default=None, help="model version (default: active)")
+    parser.add_argument("--quantize", action="store_true", help="dynamic-range quantize weights")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    registry = ModelRegistry(root=args.models_dir)
+    version = registry.version(args.version) if args.version else registry.active()
+
+    keras_path = os.path.join(version.path, KERAS_FILE)
+    if not os.path.exists(keras_path):
+        print(f"❌ {keras_path} not found. Run train_models.py first!")
+        return
+
+    model = load_keras_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if args.quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    try:
+        tflite_model = converter.convert()
+    except Exception as e:
+        # LSTMs with non-default activations may need TF ops the builtin set lacks
+        print(f"⚠️  Builtin-only conversion failed ({e}); retrying with SELECT_TF_OPS")
+        print("   Note: the result then needs the full TensorFlow runtime, not tflite_runtime")
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+            tf.lite.OpsSet.SELECT_TF_OPS,
+        ]
+        converter._experimental_lower_tensor_list_ops = False
+        tflite_model = converter.convert()
+
+    # Write then rename so a running API never reads a half-written file
+    tflite_path = os.path.join(version.path, TFLITE_FILE)
+    with open(tflite_path + ".tmp", "wb") as f:
+        f.write(tflite_model)
+    os.replace(tflite_path + ".tmp", tflite_path)
+
+    print(f"✓ Exported {tflite_path} ({len(tflite_model) / 1024:.1f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Local columnar feature store.
+
+Engineered features (hour, day_of_week, minute, temp/humidity lags) are
+written once, partitioned by day, as raw little-endian column files:
+
+    feature_store/
+        devices.json                 device_id -> int code
+        _state.pkl                   lag state, watermark and committed rows per day
+        day=2025-10-29/
+            _meta.json               committed row count
+            timestamp.i8  device.i4  temperature.f8  humidity.f8  ...
+
+Appends only add bytes to the end of each column file and then bump the row
+count in _meta.json, so readers never see a partial batch. A build chunk can
+span several days; it is committed as a whole when _state.pkl records the new
+watermark together with every day's row count, and a build that crashed
+before that point is rolled back to those counts on the next run. Readers
+memory-map only the columns they ask for and filter by time and device.
+
+    python feature_store.py build                 # append everything new from Mongo
+    python feature_store.py build --reset         # rebuild from scratch
+    python feature_store.py info
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import timedelta
+
+import joblib
+import numpy as np
+
+from data_loader import LagState, Watermark, iter_feature_chunks
+
+COLUMNS = {
+    'timestamp': np.int64,       # epoch milliseconds
+    'device': np.int32,          # code from devices.json
+    'temperature': np.float64,
+    'humidity': np.float64,
+    'hour': np.float64,
+    'day_of_week': np.float64,
+    'minute': np.float64,
+    'temp_lag_1': np.float64,
+    'temp_lag_2': np.float64,
+    'humidity_lag_1': np.float64,
+}
+SUFFIX = {np.int64: 'i8', np.int32: 'i4', np.float64: 'f8'}
+
+
+class FeatureStore:
+    def __init__(self, root="feature_store"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.devices = self._read_json(os.path.join(root, "devices.json"), {})
+
+    @staticmethod
+    def _read_json(path, default):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    @staticmethod
+    def _write_json(path, data):
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def _column_path(self, partition, column):
+        return os.path.join(self.root, partition, f"{column}.{SUFFIX[COLUMNS[column]]}")
+
+    def partitions(self, start_day=None, end_day=None):
+        """Day partitions (YYYY-MM-DD), inclusive range"""
+        days = sorted(
+            name[4:] for name in os.listdir(self.root)
+            if name.startswith("day=") and os.path.isdir(os.path.join(self.root, name))
+        )
+        return [d for d in days if (start_day is None or d >= start_day) and (end_day is None or d <= end_day)]
+
+    def rows(self, day):
+        return self._read_json(os.path.join(self.root, f"day={day}", "_meta.json"), {"rows": 0})["rows"]
+
+    # Writing
+
+    def append(self, chunk):
+        """Append a feature chunk from data_loader, split by day"""
+        codes = np.fromiter(
+            (self.devices.setdefault(str(d), len(self.devices)) for d in chunk['device_id']),
+            dtype=np.int32, count=len(chunk['device_id'])
+        )
+        self._write_json(os.path.join(self.root, "devices.json"), self.devices)
+
+        ms = chunk['timestamp'].astype('datetime64[ms]').astype(np.int64)
+        days = chunk['timestamp'].astype('datetime64[D]')
+        data = dict(chunk, timestamp=ms, device=codes)
+
+        for day in np.unique(days):
+            mask = days == day
+            self._append_partition(str(day), {c: data[c][mask] for c in COLUMNS})
+
+    def rollback(self, committed):
+        """Cut every day back to the row counts of the last saved state (days missing from it to 0)"""
+        for day in self.partitions():
+            rows = committed.get(day, 0)
+            if self.rows(day) <= rows:
+                continue
+            partition = f"day={day}"
+            for column, dtype in COLUMNS.items():
+                path = self._column_path(partition, column)
+                if os.path.exists(path):
+                    os.truncate(path, min(os.path.getsize(path), rows * np.dtype(dtype).itemsize))
+            self._write_json(os.path.join(self.root, partition, "_meta.json"), {"rows": rows})
+            print(f"↩️  Rolled back day={day} to {rows:,} committed rows")
+
+    def _append_partition(self, day, columns):
+        partition = f"day={day}"
+        os.makedirs(os.path.join(self.root, partition), exist_ok=True)
+        committed = self.rows(day)
+
+        for column, dtype in COLUMNS.items():
+            path = self._column_path(partition, column)
+            with open(path, "ab") as f:
+                # Drop bytes from an append that crashed before committing
+                f.truncate(committed * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(columns[column], dtype=dtype).tobytes())
+
+        self._write_json(
+            os.path.join(self.root, partition, "_meta.json"),
+            {"rows": committed + len(columns['timestamp'])}
+        )
+
+    # Reading
+
+    def open_partition(self, day, columns):
+        """Memory-mapped (read-only) columns of one day"""
+        n = self.rows(day)
+        partition = f"day={day}"
+        return {
+            c: np.memmap(self._column_path(partition, c), dtype=COLUMNS[c], mode="r", shape=(n,))
+            if n else np.empty(0, dtype=COLUMNS[c])
+            for c in columns
+        }
+
+    def iter_partitions(self, columns, start_day=None, end_day=None, device_ids=None, start=None, end=None):
+        """
+        Yield (day, columns) with only the requested columns, optionally filtered by device.
+        start (inclusive) and end (exclusive) are naive UTC datetimes, like the Mongo
+        query in data_loader.build_query; only the boundary days are filtered row by row.
+        """
+        codes = None
+        if device_ids is not None:
+            codes = np.array([self.devices[d] for d in device_ids if d in self.devices], dtype=np.int32)
+
+        first_day = last_day = None
+        if start is not None:
+            first_day = start.date().isoformat()
+            start_day = max(start_day, first_day) if start_day else first_day
+        if end is not None:
+            last_day = (end - timedelta(milliseconds=1)).date().isoformat()
+            end_day = min(end_day, last_day) if end_day else last_day
+
+        for day in self.partitions(start_day, end_day):
+            bounded = day in (first_day, last_day)
+            extra = (['device'] if codes is not None else []) + (['timestamp'] if bounded else [])
+            data = self.open_partition(day, list(dict.fromkeys(list(columns) + extra)))
+
+            mask = None
+            if codes is not None:
+                mask = np.isin(data['device'], codes)
+            if bounded:
+                ms = data['timestamp']
+                in_range = np.ones(len(ms), dtype=bool)
+                if start is not None:
+                    in_range &= ms >= np.datetime64(start, 'ms').astype(np.int64)
+                if end is not None:
+                    in_range &= ms < np.datetime64(end, 'ms').astype(np.int64)
+                mask = in_range if mask is None else mask & in_range
+            if mask is not None:
+                data = {c: data[c][mask] for c in columns}
+            yield day, data
+
+    def read(self, columns, start_day=None, end_day=None, device_ids=None, start=None, end=None):
+        """Concatenate the requested columns across partitions"""
+        parts = [data for _, data in self.iter_partitions(columns, start_day, end_day, device_ids, start, end)]
+        if not parts:
+            return {c: np.empty(0, dtype=COLUMNS[c]) for c in columns}
+        return {c: np.concatenate([p[c] for p in parts]) for c in columns}
+
+    def device_names(self, codes):
+        names = np.empty(len(self.devices), dtype=object)
+        for name, code in self.devices.items():
+            names[code] = name
+        return names[codes]
+
+    # Incremental build state
+
+    def load_state(self):
+        path = os.path.join(self.root, "_state.pkl")
+        if not os.path.exists(path):
+            return {"lag_state": LagState(), "watermark": Watermark(), "partitions": {}}
+        state = joblib.load(path)
+        if not isinstance(state["watermark"], Watermark):
+            # Stores from before the overlap re-read kept a plain timestamp
+            state["watermark"] = Watermark.after(state["watermark"])
+        # Stores built before per-day counts were recorded: trust what is on disk
+        state.setdefault("partitions", {day: self.rows(day) for day in self.partitions()})
+        return state
+
+    def save_state(self, state):
+        path = os.path.join(self.root, "_state.pkl")
+        joblib.dump(state, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def build(store, collection, chunk_size=50000, overlap=120.0):
+    """Append every reading the store has not seen (late ones up to `overlap` seconds included)"""
+    state = store.load_state()
+    # Drop rows appended after the last saved state; they are read again below
+    store.rollback(state["partitions"])
+    state["watermark"].overlap = overlap
+
+    rows = 0
+    for chunk in iter_feature_chunks(
+        collection, chunk_size=chunk_size, state=state["lag_state"], watermark=state["watermark"]
+    ):
+        store.append(chunk)
+        state["partitions"].update(
+            (str(day), store.rows(str(day))) for day in np.unique(chunk['timestamp'].astype('datetime64[D]'))
+        )
+        # The commit point: watermark, lag state and row counts are saved in one atomic replace
+        store.save_state(state)
+        rows += len(chunk['temperature'])
+    return rows
+
+
+def main():
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Build or inspect the local feature store")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--root", default=os.getenv("FEATURE_STORE_DIR", "feature_store"))
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--overlap", type=float, default=120.0,
+                        help="seconds re-read before the watermark to catch late readings")
+    parser.add_argument("--reset", action="store_true", help="delete the store before building")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.reset and os.path.isdir(args.root):
+            shutil.rmtree(args.root)
+        store = FeatureStore(args.root)
+        collection = pymongo.MongoClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")][os.getenv("COLLECTION_NAME")]
+        rows = build(store, collection, args.chunk_size, args.overlap)
+        print(f"✓ Appended {rows:,} rows to {args.root}")
+
+    store = FeatureStore(args.root)
+    days = store.partitions()
+    total = sum(store.rows(d) for d in days)
+    print(f"📦 {args.root}: {total:,} rows, {len(days)} days, {len(store.devices)} devices")
+    if days:
+        print(f"   {days[0]} … {days[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import warnings
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday; pandas dayofweek counts Monday as 0
+EPOCH_DAY_OF_WEEK = 3
+
+
+def time_features(epoch_seconds):
+    """Vectorized UTC (hour, day_of_week), matching the training features"""
+    days, seconds = np.divmod(np.asarray(epoch_seconds, dtype=np.float64), SECONDS_PER_DAY)
+    return seconds // 3600, (days + EPOCH_DAY_OF_WEEK) % 7
+
+
+def infer_step_seconds(timestamps, default=5.0):
+    """Median spacing between readings for each device; (k, n) oldest first -> (k,)"""
+    if timestamps.shape[1] < 2:
+        return np.full(len(timestamps), default)
+    gaps = np.diff(timestamps, axis=1)
+    with warnings.catch_warnings():
+        # Devices with fewer than two distinct timestamps take the default
+        warnings.simplefilter("ignore", RuntimeWarning)
+        step = np.nanmedian(np.where(gaps > 0, gaps, np.nan), axis=1)
+    return np.where(np.isfinite(step), step, default)
+
+
+def rollout(predict, humidity, temp_lag_1, temp_lag_2, start_time, step_seconds, horizon):
+    """
+    Roll the lag model forward `horizon` steps for every device at once.
+
+    Each step predicts all devices with one (k, 6) model call and feeds the
+    prediction back as the next temp_lag_1. Humidity has no forecast model,
+    so it is held at the last observed value.
+
+    Returns (temperatures, times), both (k, horizon).
+    """
+    k = len(temp_lag_1)
+    lag_1 = np.asarray(temp_lag_1, dtype=np.float64).copy()
+    lag_2 = np.asarray(temp_lag_2, dtype=np.float64).copy()
+    humidity = np.asarray(humidity, dtype=np.float64)
+
+    steps = np.arange(1, horizon + 1)
+    times = np.asarray(start_time, dtype=np.float64)[:, None] + np.asarray(step_seconds)[:, None] * steps
+    hours, days = time_features(times)
+
+    features = np.empty((k, 6))
+    features[:, 0] = humidity
+    features[:, 5] = humidity
+    temperatures = np.empty((k, horizon))
+
+    for h in range(horizon):
+        features[:, 1] = hours[:, h]
+        features[:, 2] = days[:, h]
+        features[:, 3] = lag_1
+        features[:, 4] = lag_2
+
+        prediction = predict(features)
+        temperatures[:, h] = prediction
+        lag_2 = lag_1
+        lag_1 = prediction
+
+    return temperatures, times
@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class FusedLinearModel:
+    """
+    MinMaxScaler followed by LinearRegression folded into one affine map.
+
+        scaled = X * scale_ + min_
+        y      = scaled @ coef_ + intercept_
+               = X @ (scale_ * coef_) + (min_ @ coef_ + intercept_)
+
+    predict() is a single dot product with no sklearn input validation, so
+    callers must pass a finite float (n, n_features) array.
+    """
+
+    def __init__(self, scaler, model):
+        if getattr(scaler, "clip", False):
+            raise ValueError("cannot fuse a MinMaxScaler with clip=True")
+
+        coef = np.ravel(model.coef_).astype(np.float64)
+        self.n_features = coef.shape[0]
+        self.weights = np.ascontiguousarray(scaler.scale_ * coef)
+        self.bias = float(np.dot(scaler.min_, coef) + np.ravel(model.intercept_)[0])
+
+    def predict(self, features):
+        return features @ self.weights + self.bias
+
+
+def predict_per_device(bundle, features, device_ids, predict_global):
+    """
+    Rows of devices in a train_per_device.py bundle use their own fused
+    weights; the remaining rows go through predict_global in one call.
+    """
+    features = np.asarray(features, dtype=np.float64)
+    groups = np.fromiter(
+        (bundle['device_index'].get(d, -1) for d in device_ids),
+        dtype=np.int64, count=len(device_ids)
+    )
+    own = groups >= 0
+
+    predictions = np.empty(len(features))
+    if own.any():
+        g = groups[own]
+        predictions[own] = np.einsum('ij,ij->i', features[own], bundle['weights'][g]) + bundle['bias'][g]
+    if not own.all():
+        predictions[~own] = predict_global(features[~own])
+    return predictions
+
+
+def probe_features(scaler, n=256, seed=0):
+    """Random rows spanning (and slightly beyond) the scaler's training range"""
+    rng = np.random.default_rng(seed)
+    low, high = scaler.data_min_, scaler.data_max_
+    margin = (high - low) * 0.1
+    return rng.uniform(low - margin, high + margin, size=(n, len(low)))
+
+
+def build_fused_model(scaler, model, rtol=1e-9, atol=1e-9):
+    """
+    Fuse the scaler and model, verifying the result against the sklearn path.
+    Returns None if they disagree so callers can fall back.
+    """
+    fused = FusedLinearModel(scaler, model)
+
+    probe = probe_features(scaler)
+    expected = model.predict(scaler.transform(probe))
+    actual = fused.predict(probe)
+
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        max_err = float(np.max(np.abs(actual - expected)))
+        print(f"⚠️  Fused model disagrees with sklearn (max error {max_err:.3e}); using sklearn path")
+        return None
+    return fused
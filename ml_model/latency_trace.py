@@ -0,0 +1,158 @@
+"""
+End-to-end latency tracing for traced sensor messages.
+
+Publishers started with --trace (load_generator.py) or TRACE_PAYLOADS=true
+(mqtt_publisher.py) stamp every message with a producer id, a per-topic
+sequence number and a send time in nanoseconds. Consumers turn these into
+per-hop latency histograms and count missing, duplicate and reordered
+messages from the sequence numbers.
+
+Send and receive times must come from the same clock: CLOCK_MONOTONIC by
+default (publisher and consumer on one host), or the wall clock with
+TRACE_CLOCK=realtime on both sides for clock-synchronized hosts.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+TRACE_CLOCK = os.getenv("TRACE_CLOCK", "monotonic").lower()
+
+# Histogram buckets in ms: 1µs .. 60s, log-spaced
+BINS_MS = np.concatenate([[0.0], np.geomspace(1e-3, 60000.0, 256), [np.inf]])
+
+
+def clock_ns():
+    return time.time_ns() if TRACE_CLOCK == "realtime" else time.monotonic_ns()
+
+
+def trace_from_reading(reading):
+    """(producer, seq, sent_ns) from a JSON reading's "trace" member, or None"""
+    trace = reading.get("trace")
+    if not isinstance(trace, dict):
+        return None
+    try:
+        return int(trace["producer"]), int(trace["seq"]), int(trace["sent_ns"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = np.zeros(len(BINS_MS) - 1, dtype=np.int64)
+        self.sum_ms = 0.0
+
+    def add(self, latencies_ms):
+        latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+        self.counts += np.histogram(latencies_ms, bins=BINS_MS)[0]
+        self.sum_ms += float(latencies_ms.sum())
+
+    def percentile(self, p):
+        """Upper edge of the bucket holding the p-th percentile"""
+        total = self.counts.sum()
+        if not total:
+            return None
+        i = np.searchsorted(np.cumsum(self.counts), total * p / 100)
+        return round(float(min(BINS_MS[i + 1], BINS_MS[-2])), 3)
+
+    def summary(self):
+        total = int(self.counts.sum())
+        return {
+            "count": total,
+            "mean_ms": round(self.sum_ms / total, 3) if total else None,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+        }
+
+
+class SequenceTracker:
+    """
+    Drop / duplicate / reorder accounting per (producer, topic) stream.
+
+    Each stream remembers which of its last `window` sequence numbers have
+    arrived. A number that leaves the window without arriving is counted as
+    missing; until then it is an open gap (it may still arrive late).
+    Numbers before the first one seen are not expected.
+    """
+
+    def __init__(self, window=4096):
+        self.window = window
+        self.streams = {}       # key -> [first, highest, seen ring]
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.missing = 0
+
+    def observe(self, key, seq):
+        self.received += 1
+        w = self.window
+        stream = self.streams.get(key)
+        if stream is None:
+            seen = np.zeros(w, dtype=bool)
+            seen[seq % w] = True
+            self.streams[key] = [seq, seq, seen]
+            return
+
+        first, highest, seen = stream
+        if seq > highest:
+            # Numbers pushed out of the window without arriving are lost
+            evicted = np.arange(max(highest - w + 1, first), min(highest, seq - w) + 1)
+            self.missing += int((~seen[evicted % w]).sum())
+            if seq - w > highest:
+                self.missing += seq - w - highest
+            seen[np.arange(max(highest + 1, seq - w + 1), seq) % w] = False
+            seen[seq % w] = True
+            stream[1] = seq
+        elif seq < first or seq <= highest - w:
+            self.reordered += 1          # too late to tell a duplicate from a late arrival
+        elif seen[seq % w]:
+            self.duplicates += 1
+        else:
+            seen[seq % w] = True
+            self.reordered += 1
+
+    def open_gaps(self):
+        gaps = 0
+        for first, highest, seen in self.streams.values():
+            span = np.arange(max(highest - self.window + 1, first), highest + 1)
+            gaps += int((~seen[span % self.window]).sum())
+        return gaps
+
+    def summary(self):
+        return {
+            "streams": len(self.streams),
+            "received": self.received,
+            "missing": self.missing,
+            "open_gaps": self.open_gaps(),
+            "duplicates": self.duplicates,
+            "reordered": self.reordered,
+        }
+
+
+class LatencyTracer:
+    """Per-hop latency histograms plus sequence accounting; thread-safe"""
+
+    def __init__(self, hops, window=4096):
+        self.hops = {hop: LatencyHistogram() for hop in hops}
+        self.sequences = SequenceTracker(window)
+        self.lock = threading.Lock()
+
+    def observe(self, producer, topic, seq):
+        with self.lock:
+            self.sequences.observe((producer, topic), seq)
+
+    def record(self, hop, latencies_ns):
+        latencies_ms = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+        with self.lock:
+            self.hops[hop].add(latencies_ms)
+
+    def summary(self):
+        with self.lock:
+            return {
+                "clock": TRACE_CLOCK,
+                "hops": {hop: histogram.summary() for hop, histogram in self.hops.items()},
+                "sequence": self.sequences.summary(),
+            }
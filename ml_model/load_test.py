@@ -0,0 +1,93 @@
+"""
+Local load test for the prediction API.
+
+Fires requests at increasing concurrency levels and reports throughput and
+latency percentiles, so you can check that latency scales with concurrency
+instead of queueing behind slow Mongo calls.
+
+    uvicorn prediction_api:app --port 8000
+    python load_test.py --url http://localhost:8000 --concurrency 1,8,32,64
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def build_requests(base_url, devices):
+    """Mix of read endpoints that all touch Mongo and the models"""
+    requests = []
+    for device_id in devices:
+        requests.append(("POST", f"{base_url}/predict", {"device_id": device_id, "humidity": 60.0}))
+        requests.append(("GET", f"{base_url}/predict/next-hour/{device_id}", None))
+        requests.append(("POST", f"{base_url}/anomaly/detect", {"temperature": 27.5, "humidity": 60.0}))
+    requests.append(("GET", f"{base_url}/stats/predictions", None))
+    requests.append(("GET", f"{base_url}/anomaly/history?limit=50", None))
+    return requests
+
+
+def send(method, url, body):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            ok = response.status < 500
+    except urllib.error.HTTPError as e:
+        ok = e.code < 500
+    except Exception:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run_level(requests, concurrency, total):
+    jobs = [requests[i % len(requests)] for i in range(total)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda job: send(*job), jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    errors = sum(1 for r in results if not r[1])
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the ML prediction API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--devices", default="sensor_01,sensor_02,sensor_03,sensor_04,sensor_05")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--requests", type=int, default=500, help="requests per concurrency level")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    requests = build_requests(args.url.rstrip("/"), args.devices.split(","))
+
+    if not args.json:
+        print(f"{'conc':>6} {'req':>6} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for level in (int(c) for c in args.concurrency.split(",")):
+        result = run_level(requests, level, args.requests)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{result['concurrency']:>6} {result['requests']:>6} {result['errors']:>5} "
+                  f"{result['throughput_rps']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import asyncio
+
+import numpy as np
+
+LSTM_MODEL = "lstm_temperature_model"
+LSTM_SCALER = "lstm_scaler"
+KERAS_FILE = f"{LSTM_MODEL}.h5"
+TFLITE_FILE = f"{LSTM_MODEL}.tflite"
+# Carried over as a group by training runs that do not retrain the LSTM
+LSTM_FILES = [KERAS_FILE, TFLITE_FILE, f"{LSTM_SCALER}.pkl"]
+
+
+def load_keras_model(path):
+    # TensorFlow is imported here so the linear-only endpoints never pay for it
+    from tensorflow.keras.models import load_model
+    return load_model(path, compile=False)
+
+
+def load_tflite_model(path):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite import Interpreter
+    return Interpreter(model_path=path)
+
+
+class KerasPredictor:
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, windows):
+        # Direct call avoids Model.predict's per-call dataset setup
+        return np.asarray(self.model(windows, training=False)).reshape(-1)
+
+
+class TFLitePredictor:
+    """Not thread-safe; LSTMForecaster only runs one batch at a time"""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.input_index = interpreter.get_input_details()[0]["index"]
+        self.output_index = interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+
+    def __call__(self, windows):
+        if windows.shape[0] != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, windows.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = windows.shape[0]
+        self.interpreter.set_tensor(self.input_index, windows)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).reshape(-1)
+
+
+class LSTMForecaster:
+    """
+    Serves the LSTM with request coalescing: windows from concurrent requests
+    are queued and run through the model together once per tick, in model
+    calls of at most max_batch windows.
+    """
+
+    def __init__(self, registry, run_inference, runtime="keras", seq_length=10,
+                 tick=0.01, max_batch=1024):
+        self.registry = registry
+        self.run_inference = run_inference
+        self.runtime = runtime
+        self.seq_length = seq_length
+        self.tick = tick
+        self.max_batch = max_batch
+
+        self.pending = []           # (windows, future)
+        self.pending_rows = 0
+        self.wakeup = None
+        self.worker = None
+
+        self.batches = 0
+        self.rows = 0
+
+    def available(self):
+        models = self.registry.active()
+        return models.available(LSTM_MODEL, KERAS_FILE) and models.available(LSTM_SCALER)
+
+    def _predictor(self):
+        """
+        Load (once per model version and runtime) the scaler and predictor.
+        The runtime is resolved on every call, so a .tflite exported into the
+        active version after the Keras fallback was loaded is picked up.
+        """
+        models = self.registry.active()
+        scaler = models.get(LSTM_SCALER)
+
+        if self.runtime == "tflite" and models.available(TFLITE_FILE, TFLITE_FILE):
+            return scaler, models.derived("lstm_predictor_tflite", lambda: TFLitePredictor(
+                models.get(TFLITE_FILE, TFLITE_FILE, load_tflite_model)
+            ))
+        return scaler, models.derived("lstm_predictor_keras", lambda: KerasPredictor(
+            models.get(LSTM_MODEL, KERAS_FILE, load_keras_model)
+        ))
+
+    def _predict(self, windows):
+        """(k, seq_length) temperatures, oldest first -> (k,) next-step temperatures"""
+        scaler, predictor = self._predictor()
+
+        # MinMaxScaler on one feature is x * scale_ + min_
+        scale, offset = scaler.scale_[0], scaler.min_[0]
+        scaled = (windows * scale + offset).astype(np.float32)[:, :, None]
+        return (predictor(scaled) - offset) / scale
+
+    async def forecast(self, windows):
+        """Queue windows for the next tick and wait for their predictions"""
+        windows = np.asarray(windows, dtype=np.float64).reshape(-1, self.seq_length)
+        loop = asyncio.get_running_loop()
+
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()
+            self.worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self.pending.append((windows, future))
+        self.pending_rows += len(windows)
+        self.wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+
+            # Let other requests join this batch unless it is already full
+            if self.pending_rows < self.max_batch:
+                await asyncio.sleep(self.tick)
+
+            batch, self.pending, self.pending_rows = self.pending, [], 0
+            if not batch:
+                continue
+
+            try:
+                windows = np.concatenate([w for w, _ in batch])
+                parts = []
+                for start in range(0, len(windows), self.max_batch):
+                    parts.append(await self.run_inference(self._predict, windows[start:start + self.max_batch]))
+                    self.batches += 1
+                predictions = np.concatenate(parts)
+                self.rows += len(predictions)
+
+                start = 0
+                for windows, future in batch:
+                    if not future.done():
+                        future.set_result(predictions[start:start + len(windows)])
+                    start += len(windows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def stats(self):
+        return {
+            "runtime": self.runtime,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.batches, 1) if self.batches else 0,
+        }
@@ -0,0 +1,325 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+# Layout written by train_models.py:
+#   models/versions/<version>/<name>.pkl
+#   models/CURRENT              -> name of the active version
+# Trees without a CURRENT pointer fall back to the flat models/<name>.pkl files.
+CURRENT_POINTER = "CURRENT"
+VERSIONS_DIR = "versions"
+LEGACY_VERSION = "legacy"
+
+# The global temperature model; a per-device bundle is only valid alongside the one it was fitted with
+GLOBAL_MODEL_FILES = ["temperature_model.pkl", "scaler.pkl"]
+ANOMALY_MODEL_FILES = ["anomaly_model.pkl"]
+
+
+def new_version():
+    """Version name for a training run (sortable timestamp, to the microsecond)"""
+    return datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+
+
+def version_dir(root, version):
+    """Create the directory of a new version; raises FileExistsError if another run took the name"""
+    os.makedirs(os.path.join(root, VERSIONS_DIR), exist_ok=True)
+    path = os.path.join(root, VERSIONS_DIR, version)
+    os.mkdir(path)
+    return path
+
+
+def create_version(root, attempts=10):
+    """
+    Name and create the directory of a new version, returning (version, path).
+    Two runs never share a directory: on a collision the name gets a suffix,
+    which still sorts after the plain name and before the next timestamp.
+    """
+    version = new_version()
+    for attempt in range(attempts):
+        name = version if attempt == 0 else f"{version}-{attempt}"
+        try:
+            return name, version_dir(root, name)
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"no free version name after {attempts} attempts ({version})")
+
+
+def publish_version(root, version):
+    """Atomically point CURRENT at a fully written version directory"""
+    tmp_path = os.path.join(root, CURRENT_POINTER + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, CURRENT_POINTER))
+
+
+def active_version_dir(root):
+    """Directory of the published version, or None before the first publish"""
+    pointer = os.path.join(root, CURRENT_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return os.path.join(root, VERSIONS_DIR, f.read().strip())
+
+
+def carry_over(root, target_dir, filenames):
+    """
+    Hard-link (or copy) the given files of the active version that target_dir
+    does not have yet. Each producer names the artifacts it does not train, so
+    nothing it makes stale (such as a per-device bundle) is carried along.
+    """
+    source_dir = active_version_dir(root)
+    if source_dir is None:
+        return []
+
+    carried = []
+    for filename in filenames:
+        source = os.path.join(source_dir, filename)
+        target = os.path.join(target_dir, filename)
+        if not os.path.isfile(source) or os.path.exists(target):
+            continue
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+        carried.append(filename)
+    return carried
+
+
+def global_model_id(path):
+    """Content hash of the global model in a version directory (None if it has none)"""
+    digest = hashlib.sha256()
+    for filename in GLOBAL_MODEL_FILES:
+        try:
+            with open(os.path.join(path, filename), "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            return None
+    return digest.hexdigest()[:16]
+
+
+def estimate_nbytes(obj, seen=None):
+    """Approximate (resident, memory-mapped) array bytes held by a fitted model"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0, 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        mapped = isinstance(obj, np.memmap) or isinstance(obj.base, np.memmap)
+        return (0, obj.nbytes) if mapped else (obj.nbytes, 0)
+
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif hasattr(obj, "__dict__"):
+        children = vars(obj).values()
+    elif hasattr(obj, "__getstate__"):
+        # Cython objects such as sklearn's Tree expose their arrays via __getstate__
+        try:
+            state = obj.__getstate__()
+        except Exception:
+            return 0, 0
+        children = state.values() if isinstance(state, dict) else ()
+    else:
+        return 0, 0
+
+    resident = mapped = 0
+    for child in children:
+        r, m = estimate_nbytes(child, seen)
+        resident += r
+        mapped += m
+    return resident, mapped
+
+
+class ModelVersion:
+    """One set of artifacts; each model is loaded on first use"""
+
+    def __init__(self, name, path, mmap_mode=None):
+        self.name = name
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.models = {}
+        self.sources = {}   # model_name -> (filename, loader), to reload in a newer version
+        self.load_stats = {}
+        # Reentrant: derived() builders load their inputs through get()
+        self.lock = threading.RLock()
+
+    def file_path(self, model_name, filename=None):
+        return os.path.join(self.path, filename or f"{model_name}.pkl")
+
+    def available(self, model_name, filename=None):
+        return model_name in self.models or os.path.exists(self.file_path(model_name, filename))
+
+    def get(self, model_name, filename=None, loader=None):
+        """
+        Return the loaded model, or None if the artifact does not exist.
+        Non-joblib artifacts (e.g. Keras .h5) pass their own filename and loader(path).
+        """
+        model = self.models.get(model_name)
+        if model is not None:
+            return model
+
+        with self.lock:
+            if model_name in self.models:
+                return self.models[model_name]
+
+            path = self.file_path(model_name, filename)
+            if not os.path.exists(path):
+                return None
+
+            started = time.perf_counter()
+            if loader is None:
+                model = joblib.load(path, mmap_mode=self.mmap_mode)
+            else:
+                model = loader(path)
+            load_seconds = time.perf_counter() - started
+
+            resident, mapped = estimate_nbytes(model)
+            self.load_stats[model_name] = {
+                "load_seconds": round(load_seconds, 4),
+                "file_bytes": os.path.getsize(path),
+                "memory_bytes": resident,
+                "mmap_bytes": mapped,
+            }
+            self.models[model_name] = model
+            self.sources[model_name] = (filename, loader)
+            print(f"✓ Loaded {model_name} ({self.name}) in {load_seconds:.3f}s")
+            return model
+
+    def derived(self, key, build):
+        """Artifact computed once per version from loaded models (e.g. a fused predictor)"""
+        if key in self.models:
+            return self.models[key]
+
+        with self.lock:
+            if key not in self.models:
+                started = time.perf_counter()
+                self.models[key] = build()
+                self.load_stats[key] = {"build_seconds": round(time.perf_counter() - started, 4)}
+            return self.models[key]
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "loaded": dict(self.load_stats),
+        }
+
+
+class ModelRegistry:
+    """
+    Resolves the active model version and hot-swaps it when train_models.py
+    publishes a new one. Callers take a snapshot with active() so a request
+    always uses a consistent set of artifacts, even across a swap.
+    """
+
+    def __init__(self, root="models", mmap_mode=None, keep_versions=3, check_interval=5.0):
+        self.root = root
+        self.mmap_mode = mmap_mode
+        self.keep_versions = keep_versions
+        self.check_interval = check_interval
+
+        self.versions = OrderedDict()   # version name -> ModelVersion, oldest first
+        self.current = None
+        self.last_check = 0.0
+        self.swaps = 0
+        self.watching = False
+        self.lock = threading.Lock()
+
+    def _pointer(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_POINTER)) as f:
+                return f.read().strip() or LEGACY_VERSION
+        except FileNotFoundError:
+            return LEGACY_VERSION
+
+    def _version(self, name):
+        version = self.versions.get(name)
+        if version is None:
+            path = self.root if name == LEGACY_VERSION else os.path.join(self.root, VERSIONS_DIR, name)
+            version = ModelVersion(name, path, self.mmap_mode)
+            self.versions[name] = version
+        else:
+            self.versions.move_to_end(name)
+
+        # Keep a few versions resident for rollback / side-by-side use
+        while len(self.versions) > self.keep_versions:
+            oldest = next(iter(self.versions))
+            if oldest == name or (self.current is not None and oldest == self.current.name):
+                break
+            del self.versions[oldest]
+        return version
+
+    def _swap(self, version):
+        # Warm the models the previous version had in use before switching
+        if self.current is not None:
+            for model_name, (filename, loader) in list(self.current.sources.items()):
+                try:
+                    version.get(model_name, filename, loader)
+                except Exception as e:
+                    print(f"⚠️  Failed to load {model_name} for {version.name}: {e}")
+                    return
+        previous = self.current
+        self.current = version
+        self.swaps += 1
+        if previous is not None:
+            print(f"✓ Switched models {previous.name} -> {version.name}")
+
+    def refresh(self, force=False):
+        """Check the CURRENT pointer; swap to a newly published version"""
+        now = time.monotonic()
+        if not force and self.current is not None and now - self.last_check < self.check_interval:
+            return
+        with self.lock:
+            self.last_check = now
+            name = self._pointer()
+            if self.current is not None and name == self.current.name:
+                return
+            self._swap(self._version(name))
+
+    def start_watcher(self):
+        """Poll for new versions in a background thread so swaps never block a request"""
+        def watch():
+            while True:
+                time.sleep(self.check_interval)
+                try:
+                    self.refresh(force=True)
+                except Exception as e:
+                    print(f"⚠️  Model registry refresh failed: {e}")
+
+        self.watching = True
+        threading.Thread(target=watch, daemon=True).start()
+
+    def active(self):
+        """Snapshot of the active version"""
+        if self.current is None or not self.watching:
+            self.refresh()
+        return self.current
+
+    def version(self, name):
+        """A specific version, loaded side by side with the active one"""
+        with self.lock:
+            return self._version(name)
+
+    def available_versions(self):
+        path = os.path.join(self.root, VERSIONS_DIR)
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    def stats(self):
+        current = self.current
+        return {
+            "active_version": current.name if current else None,
+            "swaps": self.swaps,
+            "mmap_mode": self.mmap_mode,
+            "versions": {name: v.stats() for name, v in self.versions.items()},
+        }
@@ -1,14 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import joblib
 import numpy as np
+import orjson
 import pymongo
-from datetime import datetime, timedelta
-import pandas as pd
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
 import os
+import asyncio
+import contextvars
+import functools
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from reading_buffer import ReadingBuffer
+from result_cache import ResultCache
+from sensor_store import ensure_indexes, print_index_report
+from model_registry import ModelRegistry, global_model_id
+from fused_model import build_fused_model, predict_per_device
+from lstm_service import LSTMForecaster
+from forecasting import infer_step_seconds, rollout
+from latency_trace import LatencyTracer, clock_ns, trace_from_reading
+from sampling_profiler import SamplingProfiler
+from service_metrics import MetricsMiddleware, ServiceMetrics, batch_size, function_name
+import sensor_codec
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +48,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request/stage latency, model batch sizes and event-loop lag, served on /metrics
+metrics = ServiceMetrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+
+# Sampling profiler endpoints are only enabled when a token is configured
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+profiler = SamplingProfiler()
+
 handler = app
 
 # MongoDB connection
@@ -35,23 +64,132 @@ MONGO_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("DB_NAME")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
-client = pymongo.MongoClient(MONGO_URI)
+# Pool sizing: Mongo calls and model inference run in bounded thread pools
+# so neither blocks the event loop
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "32"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", str(MONGO_MAX_POOL_SIZE)))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+client = pymongo.MongoClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE)
 db = client[DB_NAME]
 collection = db[COLLECTION_NAME]
+# "check" logs missing or outdated indexes at startup, "create" also builds them
+# (dropping same-named outdated ones) in the background, "off" skips the check.
+# Prefer building them with `python sensor_store.py indexes` outside the serving process.
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "check").lower()
+
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="mongo-io")
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+def in_context(fn, *args, **kwargs):
+    """
+    The call bound to a copy of the current context: run_in_executor does not
+    carry contextvars into the pool, and stage timings inside it need the request's
+    """
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking Mongo call in the I/O pool"""
+    loop = asyncio.get_running_loop()
+    with metrics.stage("mongo"):
+        return await loop.run_in_executor(io_executor, in_context(fn, *args, **kwargs))
+
+def timed_model_call(fn, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        metrics.record_model_call(function_name(fn), time.perf_counter() - started, batch_size(args, kwargs))
+
+async def run_inference(fn, *args, **kwargs):
+    """Run CPU-bound model code in the inference pool"""
+    loop = asyncio.get_running_loop()
+    with metrics.stage("inference"):
+        return await loop.run_in_executor(
+            inference_executor, in_context(timed_model_call, fn, *args, **kwargs)
+        )
+
+# LSTM forecasting: sequence length used in training, runtime ("keras" or "tflite"), batching tick
+LSTM_SEQ_LENGTH = 10
+LSTM_RUNTIME = os.getenv("LSTM_RUNTIME", "keras").lower()
+LSTM_TICK_MS = float(os.getenv("LSTM_TICK_MS", "10"))
+LSTM_MAX_BATCH = int(os.getenv("LSTM_MAX_BATCH", "1024"))
+
+# Multi-step forecasting
+FORECAST_MAX_HORIZON = int(os.getenv("FORECAST_MAX_HORIZON", "24"))
+
+# In-process window of recent readings per device (lag features without a Mongo round-trip)
+READING_BUFFER_WINDOW = max(int(os.getenv("READING_BUFFER_WINDOW", "16")), LSTM_SEQ_LENGTH)
+READING_BUFFER_MAX_DEVICES = int(os.getenv("READING_BUFFER_MAX_DEVICES", "10000"))
+READING_BUFFER_CHANGE_STREAM = os.getenv("READING_BUFFER_CHANGE_STREAM", "false").lower() == "true"
+# Devices not refreshed by /ingest or the change stream for this many seconds are reloaded from Mongo
+READING_BUFFER_MAX_AGE = float(os.getenv("READING_BUFFER_MAX_AGE", "15"))
+
+reading_buffer = ReadingBuffer(
+    window=READING_BUFFER_WINDOW,
+    max_devices=READING_BUFFER_MAX_DEVICES,
+    max_age=READING_BUFFER_MAX_AGE
+)
+
+# Models are loaded lazily from the registry on first use and hot-swapped
+# when train_models.py publishes a new version
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE") or None
+MODEL_KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "3"))
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "5"))
+# "fused" folds scaler + linear model into one dot product; "sklearn" keeps the original path
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "fused").lower()
+# Use the per-device bundle from train_per_device.py when the active version has one
+PER_DEVICE_MODELS = os.getenv("PER_DEVICE_MODELS", "true").lower() == "true"
+
+# Dashboard polling endpoints share results for a short TTL; concurrent identical
+# requests wait for one computation. New readings or a new model version invalidate.
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "2"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+stats_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+anomaly_cache = ResultCache(RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+
+# /anomaly/history returns only these fields; NDJSON streams this many documents per chunk
+ANOMALY_HISTORY_PROJECTION = {
+    'device_id': 1, 'temperature': 1, 'humidity': 1, 'timestamp': 1, 'isAnomaly': 1, 'alerts': 1
+}
+ANOMALY_STREAM_BATCH = int(os.getenv("ANOMALY_STREAM_BATCH", "500"))
+
+def result_cache_stats():
+    return {
+        "stats_predictions": stats_cache.stats(),
+        "anomaly_history": anomaly_cache.stats()
+    }
+
+# publish -> ingest latency and drop/duplicate counts for traced readings
+ingest_tracer = LatencyTracer(["publish→ingest"])
 
-# Load models
-print("🤖 Loading ML models...")
-try:
-    lr_model = joblib.load('models/temperature_model.pkl')
-    scaler = joblib.load('models/scaler.pkl')
-    anomaly_model = joblib.load('models/anomaly_model.pkl')
-    print("✓ Models loaded successfully")
-except Exception as e:
-    print(f"❌ Error loading models: {e}")
-    print("   Please run train_models.py first!")
-    lr_model = None
-    scaler = None
-    anomaly_model = None
+def trace_ingest(trace, topic):
+    if trace is not None:
+        producer, seq, sent_ns = trace
+        ingest_tracer.observe(producer, topic, seq)
+        ingest_tracer.record("publish→ingest", [clock_ns() - sent_ns])
+
+registry = ModelRegistry(
+    root=MODELS_DIR,
+    mmap_mode=MODEL_MMAP_MODE,
+    keep_versions=MODEL_KEEP_VERSIONS,
+    check_interval=MODEL_CHECK_INTERVAL
+)
+
+lstm_forecaster = LSTMForecaster(
+    registry,
+    run_inference,
+    runtime=LSTM_RUNTIME,
+    seq_length=LSTM_SEQ_LENGTH,
+    tick=LSTM_TICK_MS / 1000,
+    max_batch=LSTM_MAX_BATCH
+)
+
+def models_available(*names):
+    """True if the active version has all the given artifacts (no loading)"""
+    models = registry.active()
+    return all(models.available(name) for name in names)
 
 # Request/Response models
 class PredictionRequest(BaseModel):
@@ -66,6 +204,39 @@ class PredictionResponse(BaseModel):
     confidence: float
     timestamp: str
 
+class BatchPredictionRequest(BaseModel):
+    requests: List[PredictionRequest]
+
+class BatchPredictionResult(BaseModel):
+    device_id: str
+    predicted_temperature: Optional[float] = None
+    confidence: Optional[float] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    count: int
+    results: List[BatchPredictionResult]
+    timestamp: str
+
+class SensorReading(BaseModel):
+    device_id: str
+    temperature: float
+    humidity: float
+    timestamp: Optional[datetime] = None
+    trace: Optional[dict] = None  # {"producer", "seq", "sent_ns"} from a tracing publisher
+
+class IngestRequest(BaseModel):
+    readings: List[SensorReading]
+    topic: Optional[str] = None  # MQTT topic the readings arrived on; sequence numbers are per topic
+
+class LSTMBatchRequest(BaseModel):
+    device_ids: List[str]
+
+class ForecastRequest(BaseModel):
+    device_ids: Optional[List[str]] = None  # None = every device in the reading buffer
+    horizon: int = 12
+    step_seconds: Optional[float] = None    # None = each device's median reading interval
+
 class AnomalyRequest(BaseModel):
     temperature: float
     humidity: float
@@ -75,14 +246,252 @@ class AnomalyResponse(BaseModel):
     anomaly_score: float
     message: str
 
-# Helper function to get recent data
-def get_recent_data(device_id: str, limit: int = 10):
-    """Get recent sensor data for a device"""
-    data = list(collection.find(
-        {'device_id': device_id}
-    ).sort('timestamp', -1).limit(limit))
+class AnomalyBatchRequest(BaseModel):
+    readings: List[AnomalyRequest]
+
+class AnomalyBatchResponse(BaseModel):
+    count: int
+    anomaly_count: int
+    results: List[AnomalyResponse]
+
+def fetch_window(device_id: str):
+    """A device's latest window of readings from Mongo, newest first (blocking)"""
+    return list(collection.find(
+        {'device_id': device_id},
+        {'_id': 0, 'temperature': 1, 'humidity': 1, 'timestamp': 1}
+    ).sort('timestamp', -1).limit(READING_BUFFER_WINDOW))
+
+async def get_lag_features(device_id: str):
+    """
+    Return (temp_lag_1, temp_lag_2, humidity_lag_1) for a device, or None.
+    Served from the reading buffer; a miss or a stale entry goes to Mongo, off the event loop.
+    The fetch is timed as "mongo" and the buffer reload as "features", without overlap.
+    """
+    with metrics.stage("features"):
+        latest = reading_buffer.latest(device_id, n=2)
+    
+    if latest is None:
+        data = await run_io(fetch_window, device_id)
+        if len(data) < 2:
+            return None
+        
+        with metrics.stage("features"):
+            reading_buffer.load(device_id, data)
+        return data[0]['temperature'], data[1]['temperature'], data[0]['humidity']
+    
+    temps, hums = latest
+    return temps[0], temps[1], hums[0]
+
+async def reload_windows(device_ids: List[str]):
+    """Reload the latest window of several devices into the reading buffer with one aggregation"""
+    docs = await run_io(lambda: list(fetch_latest_readings(READING_BUFFER_WINDOW, device_ids=list(set(device_ids)))))
+    with metrics.stage("features"):
+        for doc in docs:
+            reading_buffer.load(doc['_id'], doc['readings'])
+
+async def get_history_windows(device_ids: List[str], length: int, min_count: Optional[int] = None):
+    """
+    (k, length) temperature, humidity and epoch-timestamp windows, oldest first,
+    from the reading buffer, plus a mask of devices with at least min_count
+    (default length) readings; shorter windows are NaN-padded at the start.
+    All misses are reloaded from Mongo in a single aggregation.
+    """
+    with metrics.stage("features"):
+        temps, hums, stamps, found = reading_buffer.latest_many(device_ids, n=length, min_count=min_count)
+    
+    missing = [d for d, ok in zip(device_ids, found) if not ok]
+    if missing:
+        await reload_windows(missing)
+        with metrics.stage("features"):
+            temps, hums, stamps, found = reading_buffer.latest_many(device_ids, n=length, min_count=min_count)
+    
+    return temps[:, ::-1], hums[:, ::-1], stamps[:, ::-1], found
+
+async def get_lag_features_many(device_ids: List[str]):
+    """
+    get_lag_features for several devices, refilling every miss with one aggregation.
+    A failed refill is returned in place of the lags of the devices it was for.
+    """
+    try:
+        temps, hums, _, found = await get_history_windows(device_ids, 2)
+    except Exception as e:
+        with metrics.stage("features"):
+            temps, hums, _, found = reading_buffer.latest_many(device_ids, n=2)
+        return [(t[1], t[0], h[1]) if ok else e for t, h, ok in zip(temps, hums, found)]
+    
+    return [(t[1], t[0], h[1]) if ok else None for t, h, ok in zip(temps, hums, found)]
+
+def fetch_latest_readings(n: int, after: Optional[str] = None, limit: Optional[int] = None,
+                          device_ids: Optional[List[str]] = None):
+    """
+    Latest n readings (newest first) for every device, or only for device_ids,
+    in a single aggregation. Devices come back sorted by id so callers can page
+    with `after`.
+    
+    The page of device ids is taken first: $sort on {device_id, timestamp}
+    followed by $group/$first is served by a DISTINCT_SCAN of the
+    {device_id: 1, timestamp: -1} index, one key per device. Each device's
+    readings are then an index-bounded $lookup, so the cost follows the page
+    size rather than the size of the collection.
+    """
+    pipeline = []
+    if device_ids is not None:
+        pipeline.append({'$match': {'device_id': {'$in': device_ids}}})
+    if after is not None:
+        pipeline.append({'$match': {'device_id': {'$gt': after}}})
+    
+    pipeline += [
+        {'$sort': {'device_id': 1, 'timestamp': -1}},
+        {'$group': {'_id': '$device_id', 'timestamp': {'$first': '$timestamp'}}},
+        {'$sort': {'_id': 1}}
+    ]
+    if limit:
+        pipeline.append({'$limit': limit})
+    
+    pipeline.append({'$lookup': {
+        'from': collection.name,
+        'localField': '_id',
+        'foreignField': 'device_id',
+        'pipeline': [
+            {'$sort': {'timestamp': -1}},
+            {'$limit': n},
+            {'$project': {'_id': 0, 'temperature': 1, 'humidity': 1, 'timestamp': 1}}
+        ],
+        'as': 'readings'
+    }})
+    
+    return collection.aggregate(pipeline, allowDiskUse=True)
+
+def warm_reading_buffer():
+    """Fill the reading buffer with the latest window of every device in one aggregation"""
+    devices = 0
+    for doc in fetch_latest_readings(READING_BUFFER_WINDOW, limit=READING_BUFFER_MAX_DEVICES):
+        reading_buffer.load(doc['_id'], doc['readings'])
+        devices += 1
+    return devices
+
+def follow_change_stream():
+    """Keep the reading buffer current from Mongo inserts (requires a replica set)"""
+    while True:
+        try:
+            with collection.watch([{'$match': {'operationType': 'insert'}}]) as stream:
+                for change in stream:
+                    doc = change['fullDocument']
+                    reading_buffer.append(
+                        doc['device_id'], doc['temperature'], doc['humidity'], doc.get('timestamp')
+                    )
+                    stats_cache.invalidate()
+                    if doc.get('isAnomaly'):
+                        anomaly_cache.invalidate()
+        except Exception as e:
+            print(f"⚠️  Change stream error: {e}. Retrying in 5s...")
+            time.sleep(5)
+
+@app.on_event("shutdown")
+def stop_executors():
+    io_executor.shutdown(wait=False)
+    inference_executor.shutdown(wait=False)
+
+@app.on_event("startup")
+def start_model_watcher():
+    registry.start_watcher()
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    asyncio.create_task(metrics.monitor_loop_lag(LOOP_LAG_INTERVAL_MS / 1000))
+
+@app.on_event("startup")
+def start_index_check():
+    if MONGO_ENSURE_INDEXES == "off":
+        return
+    
+    def check():
+        try:
+            report = ensure_indexes(collection, create=MONGO_ENSURE_INDEXES == "create")
+            print_index_report(collection, report)
+            if any(status in ("missing", "outdated") for status in report.values()):
+                print("   Build them with: python sensor_store.py indexes")
+        except Exception as e:
+            print(f"⚠️  Index check skipped: {e}")
+    
+    # Building an index on a large collection can take a while; don't hold up startup
+    threading.Thread(target=check, daemon=True).start()
+
+@app.on_event("startup")
+def start_reading_buffer():
+    try:
+        started = time.perf_counter()
+        devices = warm_reading_buffer()
+        print(f"✓ Reading buffer warmed with {devices} devices in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        print(f"⚠️  Reading buffer warm-up skipped: {e}")
+    
+    if READING_BUFFER_CHANGE_STREAM:
+        threading.Thread(target=follow_change_stream, daemon=True).start()
+        print("✓ Following MongoDB change stream")
+
+def predict_global(models, features):
+    if INFERENCE_MODE == "fused":
+        fused = models.derived('fused_temperature_model', lambda: build_fused_model(
+            models.get('scaler'), models.get('temperature_model')
+        ))
+        if fused is not None:
+            return fused.predict(np.asarray(features, dtype=np.float64))
     
-    return pd.DataFrame(data) if data else None
+    features_scaled = models.get('scaler').transform(features)
+    return models.get('temperature_model').predict(features_scaled)
+
+def device_bundle(models):
+    """
+    The version's per-device bundle, or None if it has none or it was
+    published next to a different global model than the one now active
+    (a later full or incremental retrain must not be shadowed by it).
+    """
+    def load():
+        bundle = models.get('device_models')
+        if bundle is not None and bundle.get('global_model') != global_model_id(models.path):
+            print(f"⚠️  Ignoring per-device models in {models.name}: fitted next to another global model")
+            return None
+        return bundle
+    
+    return models.derived('current_device_models', load)
+
+def predict_matrix(features, device_ids=None):
+    """
+    Scale and predict a whole (n, 6) feature matrix in one model call.
+    With device_ids, rows of devices in a current per-device bundle use their
+    own fused weights; the rest use the global model.
+    """
+    models = registry.active()
+    
+    bundle = None
+    if PER_DEVICE_MODELS and device_ids is not None and models.available('device_models'):
+        bundle = device_bundle(models)
+    if bundle is None:
+        return predict_global(models, features)
+    
+    return predict_per_device(bundle, features, device_ids, functools.partial(predict_global, models))
+
+def score_anomalies(features):
+    """
+    Score an (n, 2) matrix with a single pass over the forest.
+    IsolationForest.predict is just score_samples(X) - offset_ < 0, so the
+    label is derived from the score instead of walking the trees twice.
+    """
+    anomaly_model = registry.active().get('anomaly_model')
+    scores = anomaly_model.score_samples(features)
+    return scores < anomaly_model.offset_, scores
+
+def anomaly_response(is_anomaly, score):
+    return AnomalyResponse(
+        is_anomaly=bool(is_anomaly),
+        anomaly_score=round(float(score), 4),
+        message="Anomaly detected!" if is_anomaly else "Normal reading"
+    )
+
+def prediction_confidence(predictions, temp_lag_1):
+    """Confidence based on how far the prediction moves from the last reading"""
+    return np.clip(1.0 - np.abs(predictions - temp_lag_1) / 10, 0.6, 0.95)
 
 @app.get("/")
 def root():
@@ -94,40 +503,38 @@ def root():
 @app.post("/predict", response_model=PredictionResponse)
 async def predict_temperature(request: PredictionRequest):
     """Predict temperature based on current conditions"""
-    if lr_model is None or scaler is None:
+    if not models_available('temperature_model', 'scaler'):
         raise HTTPException(status_code=500, detail="Models not loaded. Run train_models.py first.")
     
     try:
-        # Get recent data for lag features
-        df_recent = get_recent_data(request.device_id, limit=5)
+        # Get lag features from the reading buffer
+        lags = await get_lag_features(request.device_id)
         
-        if df_recent is None or len(df_recent) < 2:
+        if lags is None:
             raise HTTPException(
                 status_code=400,
                 detail=f"Not enough historical data for {request.device_id}"
             )
         
         # Prepare features
-        now = datetime.now()
-        hour = request.hour if request.hour is not None else now.hour
-        day_of_week = request.day_of_week if request.day_of_week is not None else now.weekday()
-        
-        temp_lag_1 = df_recent.iloc[0]['temperature']
-        temp_lag_2 = df_recent.iloc[1]['temperature']
-        humidity_lag_1 = df_recent.iloc[0]['humidity']
-        
-        features = np.array([[
-            request.humidity,
-            hour,
-            day_of_week,
-            temp_lag_1,
-            temp_lag_2,
-            humidity_lag_1
-        ]])
+        with metrics.stage("features"):
+            now = datetime.now()
+            hour = request.hour if request.hour is not None else now.hour
+            day_of_week = request.day_of_week if request.day_of_week is not None else now.weekday()
+            
+            temp_lag_1, temp_lag_2, humidity_lag_1 = lags
+            
+            features = np.array([[
+                request.humidity,
+                hour,
+                day_of_week,
+                temp_lag_1,
+                temp_lag_2,
+                humidity_lag_1
+            ]])
         
         # Scale and predict
-        features_scaled = scaler.transform(features)
-        prediction = lr_model.predict(features_scaled)[0]
+        prediction = (await run_inference(predict_matrix, features, [request.device_id]))[0]
         
         # Calculate confidence (based on distance from training data mean)
         confidence = min(0.95, max(0.6, 1.0 - abs(prediction - temp_lag_1) / 10))
@@ -142,42 +549,161 @@ async def predict_temperature(request: PredictionRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_temperature_batch(request: BatchPredictionRequest):
+    """Predict temperature for many devices with a single scale+predict pass"""
+    if not models_available('temperature_model', 'scaler'):
+        raise HTTPException(status_code=500, detail="Models not loaded. Run train_models.py first.")
+    
+    now = datetime.now()
+    results = [BatchPredictionResult(device_id=item.device_id) for item in request.requests]
+    rows = []
+    row_index = []
+    
+    # Buffer misses are reloaded from Mongo in one aggregation before building the matrix
+    lag_results = await get_lag_features_many([item.device_id for item in request.requests])
+    
+    # Fill the feature matrix, recording per-device errors instead of failing the batch
+    with metrics.stage("features"):
+        for i, (item, lags) in enumerate(zip(request.requests, lag_results)):
+            try:
+                if isinstance(lags, Exception):
+                    raise lags
+            
+                if lags is None:
+                    results[i].error = f"Not enough historical data for {item.device_id}"
+                    continue
+            
+                rows.append([
+                    item.humidity,
+                    item.hour if item.hour is not None else now.hour,
+                    item.day_of_week if item.day_of_week is not None else now.weekday(),
+                    *lags
+                ])
+                row_index.append(i)
+            except Exception as e:
+                results[i].error = str(e)
+    
+    if rows:
+        try:
+            with metrics.stage("features"):
+                features = np.array(rows, dtype=float)
+                device_ids = [request.requests[i].device_id for i in row_index]
+            predictions = await run_inference(predict_matrix, features, device_ids)
+            confidences = prediction_confidence(predictions, features[:, 3])
+            
+            for i, prediction, confidence in zip(row_index, predictions, confidences):
+                results[i].predicted_temperature = round(float(prediction), 2)
+                results[i].confidence = round(float(confidence), 2)
+        except Exception as e:
+            for i in row_index:
+                results[i].error = str(e)
+    
+    return BatchPredictionResponse(
+        count=len(results),
+        results=results,
+        timestamp=now.isoformat()
+    )
+
+@app.post("/forecast")
+async def forecast_temperature(request: ForecastRequest):
+    """
+    Multi-step forecast for many devices: the linear model is rolled forward
+    `horizon` steps, feeding each prediction back in as the next lag. All
+    devices advance together, one model call per step, from one history lookup.
+    """
+    if not models_available('temperature_model', 'scaler'):
+        raise HTTPException(status_code=500, detail="Models not loaded. Run train_models.py first.")
+    
+    if not 1 <= request.horizon <= FORECAST_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"horizon must be between 1 and {FORECAST_MAX_HORIZON}")
+    
+    try:
+        device_ids = request.device_ids if request.device_ids is not None else reading_buffer.device_ids()
+        # The whole buffered window, so the step is a median over many gaps;
+        # two readings (the lags) are enough to forecast
+        temps, hums, stamps, found = await get_history_windows(device_ids, READING_BUFFER_WINDOW, min_count=2)
+        
+        results = [{"device_id": d} for d in device_ids]
+        for result, ok in zip(results, found):
+            if not ok:
+                result["error"] = f"Not enough historical data for {result['device_id']}"
+        
+        if found.any():
+            if request.step_seconds is not None:
+                step_seconds = np.full(int(found.sum()), request.step_seconds)
+            else:
+                step_seconds = infer_step_seconds(stamps[found])
+            
+            forecasts, times = await run_inference(
+                rollout,
+                functools.partial(predict_matrix, device_ids=[d for d, ok in zip(device_ids, found) if ok]),
+                humidity=hums[found, -1],
+                temp_lag_1=temps[found, -1],
+                temp_lag_2=temps[found, -2],
+                start_time=stamps[found, -1],
+                step_seconds=step_seconds,
+                horizon=request.horizon
+            )
+            
+            current = temps[found, -1]
+            hits = [r for r, ok in zip(results, found) if ok]
+            for i, result in enumerate(hits):
+                result["current_temperature"] = round(float(current[i]), 2)
+                result["step_seconds"] = round(float(step_seconds[i]), 3)
+                result["forecast"] = [
+                    {
+                        "step": h + 1,
+                        "timestamp": datetime.fromtimestamp(times[i, h], timezone.utc).isoformat().replace("+00:00", "Z"),
+                        "temperature": round(float(forecasts[i, h]), 2)
+                    }
+                    for h in range(request.horizon)
+                ]
+        
+        return {
+            "count": len(results),
+            "horizon": request.horizon,
+            "results": results,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/predict/next-hour/{device_id}")
 async def predict_next_hour(device_id: str):
     """Predict temperature for the next hour"""
-    if lr_model is None or scaler is None:
+    if not models_available('temperature_model', 'scaler'):
         raise HTTPException(status_code=500, detail="Models not loaded")
     
     try:
-        # Get recent data
-        df_recent = get_recent_data(device_id, limit=5)
+        # Get lag features from the reading buffer
+        lags = await get_lag_features(device_id)
         
-        if df_recent is None or len(df_recent) < 2:
+        if lags is None:
             raise HTTPException(
                 status_code=400,
                 detail=f"Not enough data for {device_id}"
             )
         
         # Prepare features for next hour
-        now = datetime.now()
-        next_hour = now + timedelta(hours=1)
-        
-        current_humidity = df_recent.iloc[0]['humidity']
-        temp_lag_1 = df_recent.iloc[0]['temperature']
-        temp_lag_2 = df_recent.iloc[1]['temperature']
-        humidity_lag_1 = df_recent.iloc[0]['humidity']
-        
-        features = np.array([[
-            current_humidity,
-            next_hour.hour,
-            next_hour.weekday(),
-            temp_lag_1,
-            temp_lag_2,
-            humidity_lag_1
-        ]])
-        
-        features_scaled = scaler.transform(features)
-        prediction = lr_model.predict(features_scaled)[0]
+        with metrics.stage("features"):
+            now = datetime.now()
+            next_hour = now + timedelta(hours=1)
+        
+            temp_lag_1, temp_lag_2, humidity_lag_1 = lags
+            current_humidity = humidity_lag_1
+        
+            features = np.array([[
+                current_humidity,
+                next_hour.hour,
+                next_hour.weekday(),
+                temp_lag_1,
+                temp_lag_2,
+                humidity_lag_1
+            ]])
+        
+        prediction = (await run_inference(predict_matrix, features, [device_id]))[0]
         
         return {
             "device_id": device_id,
@@ -190,105 +716,358 @@ async def predict_next_hour(device_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def lstm_forecast(device_ids: List[str]):
+    """Next-step LSTM forecast for each device; errors reported per device"""
+    windows, _, _, found = await get_history_windows(device_ids, LSTM_SEQ_LENGTH)
+    
+    results = [{"device_id": d} for d in device_ids]
+    for result, ok in zip(results, found):
+        if not ok:
+            result["error"] = f"Need {LSTM_SEQ_LENGTH} readings for {result['device_id']}"
+    
+    if found.any():
+        # Coalesced with other in-flight LSTM requests into one model call
+        predictions = await lstm_forecaster.forecast(windows[found])
+        hits = [r for r, ok in zip(results, found) if ok]
+        for result, window, prediction in zip(hits, windows[found], predictions):
+            result["current_temperature"] = round(float(window[-1]), 2)
+            result["predicted_temperature"] = round(float(prediction), 2)
+    
+    return results
+
+@app.get("/predict/lstm/{device_id}")
+async def predict_lstm(device_id: str):
+    """Next-reading temperature forecast from the LSTM over the last 10 readings"""
+    if not lstm_forecaster.available():
+        raise HTTPException(status_code=500, detail="LSTM model not loaded. Run train_models.py first.")
+    
+    try:
+        result = (await lstm_forecast([device_id]))[0]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    
+    return {
+        **result,
+        "model": "lstm",
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/predict/lstm/batch")
+async def predict_lstm_batch(request: LSTMBatchRequest):
+    """LSTM forecasts for many devices in one model call"""
+    if not lstm_forecaster.available():
+        raise HTTPException(status_code=500, detail="LSTM model not loaded. Run train_models.py first.")
+    
+    try:
+        results = await lstm_forecast(request.device_ids)
+        
+        return {
+            "count": len(results),
+            "results": results,
+            "model": "lstm",
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/anomaly/detect", response_model=AnomalyResponse)
 async def detect_anomaly(request: AnomalyRequest):
     """Detect if sensor reading is anomalous"""
-    if anomaly_model is None:
+    if not models_available('anomaly_model'):
         raise HTTPException(status_code=500, detail="Anomaly model not loaded")
     
     try:
-        features = np.array([[request.temperature, request.humidity]])
+        with metrics.stage("features"):
+            features = np.array([[request.temperature, request.humidity]])
         
-        # Predict (-1 for anomaly, 1 for normal)
-        prediction = anomaly_model.predict(features)[0]
+        # Score once (lower is more anomalous) and derive the label from it
+        is_anomaly, scores = await run_inference(score_anomalies, features)
         
-        # Get anomaly score (lower is more anomalous)
-        score = anomaly_model.score_samples(features)[0]
+        return anomaly_response(is_anomaly[0], scores[0])
         
-        is_anomaly = prediction == -1
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/anomaly/detect/batch", response_model=AnomalyBatchResponse)
+async def detect_anomaly_batch(request: AnomalyBatchRequest):
+    """Score many sensor readings with one model call"""
+    if not models_available('anomaly_model'):
+        raise HTTPException(status_code=500, detail="Anomaly model not loaded")
+    
+    try:
+        with metrics.stage("features"):
+            features = np.array(
+                [[r.temperature, r.humidity] for r in request.readings],
+                dtype=float
+            ).reshape(-1, 2)
         
-        message = "Anomaly detected!" if is_anomaly else "Normal reading"
+        if len(features) == 0:
+            return AnomalyBatchResponse(count=0, anomaly_count=0, results=[])
         
-        return AnomalyResponse(
-            is_anomaly=bool(is_anomaly),
-            anomaly_score=round(float(score), 4),
-            message=message
+        is_anomaly, scores = await run_inference(score_anomalies, features)
+        
+        return AnomalyBatchResponse(
+            count=len(features),
+            anomaly_count=int(is_anomaly.sum()),
+            results=[anomaly_response(flag, score) for flag, score in zip(is_anomaly, scores)]
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/anomaly/history")
-async def get_anomaly_history(limit: int = 50):
-    """Get historical anomalies from database"""
-    try:
-        anomalies = list(collection.find(
-            {'isAnomaly': True}
-        ).sort('timestamp', -1).limit(limit))
-        
-        # Convert ObjectId to string
-        for item in anomalies:
-            item['_id'] = str(item['_id'])
-        
-        return {
+async def get_anomaly_history(limit: int = 50, before: Optional[str] = None, fmt: str = Query("json", alias="format")):
+    """
+    Get historical anomalies from database, newest first.
+    format=json (cached for RESULT_CACHE_TTL seconds) returns next_before for the following page;
+    format=ndjson streams one anomaly per line straight off the cursor (limit=0 for all of them).
+    """
+    if fmt not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    query = anomaly_history_query(before)
+
+    if fmt == "ndjson":
+        cursor = find_anomalies(query, limit)
+        try:
+            first = await run_io(next_ndjson_chunk, cursor)
+        except Exception as e:
+            cursor.close()
+            raise HTTPException(status_code=500, detail=str(e))
+        return StreamingResponse(stream_ndjson(cursor, first), media_type="application/x-ndjson")
+
+    body = await anomaly_cache.get(("anomaly_history", limit, before), lambda: load_anomaly_history(query, limit))
+    return Response(body, media_type="application/json")
+
+def dumps(obj, option=None):
+    """orjson with ObjectIds (and other BSON types) as strings"""
+    return orjson.dumps(obj, default=str, option=option)
+
+def anomaly_history_query(before):
+    """Anomalies strictly after the (timestamp, _id) position encoded in `before`"""
+    query = {'isAnomaly': True}
+    if before:
+        try:
+            timestamp, oid = before.rsplit("_", 1)
+            timestamp, oid = datetime.fromisoformat(timestamp), ObjectId(oid)
+        except (ValueError, InvalidId):
+            raise HTTPException(status_code=400, detail="Invalid before cursor")
+        # The range on timestamp keeps this an index scan; _id breaks ties between equal timestamps
+        query['timestamp'] = {'$lte': timestamp}
+        query['$or'] = [{'timestamp': {'$lt': timestamp}}, {'_id': {'$lt': oid}}]
+    return query
+
+def history_cursor(doc):
+    timestamp = doc.get('timestamp')
+    return f"{timestamp.isoformat()}_{doc['_id']}" if isinstance(timestamp, datetime) else None
+
+def find_anomalies(query, limit):
+    return collection.find(query, ANOMALY_HISTORY_PROJECTION).sort(
+        [('timestamp', -1), ('_id', -1)]
+    ).limit(limit).batch_size(ANOMALY_STREAM_BATCH)
+
+async def load_anomaly_history(query, limit: int):
+    def load():
+        anomalies = list(find_anomalies(query, limit))
+        return dumps({
             "success": True,
             "count": len(anomalies),
-            "anomalies": anomalies
-        }
-        
+            "anomalies": anomalies,
+            "next_before": history_cursor(anomalies[-1]) if limit and len(anomalies) == limit else None
+        })
+
+    try:
+        # Query and serialization both run in the I/O pool, off the event loop
+        return await run_io(load)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def next_ndjson_chunk(cursor):
+    """Up to ANOMALY_STREAM_BATCH documents as NDJSON lines; b"" once the cursor is exhausted"""
+    return b"".join(dumps(doc, orjson.OPT_APPEND_NEWLINE) for doc in itertools.islice(cursor, ANOMALY_STREAM_BATCH))
+
+async def stream_ndjson(cursor, chunk):
+    # Only one batch is held at a time; the cursor is closed when the client disconnects
+    try:
+        while chunk:
+            yield chunk
+            chunk = await run_io(next_ndjson_chunk, cursor)
+    finally:
+        cursor.close()
+
 @app.get("/stats/predictions")
-async def get_prediction_stats():
-    """Get prediction statistics for all devices"""
+async def get_prediction_stats(limit: int = 500, after: Optional[str] = None):
+    """
+    Get prediction statistics for all devices.
+    Devices are paged by id: pass the returned `next_after` to fetch the next page.
+    Pages are cached for RESULT_CACHE_TTL seconds per model version.
+    """
+    key = ("stats_predictions", limit, after, registry.active().name)
+    return await stats_cache.get(key, lambda: compute_prediction_stats(limit, after))
+
+async def compute_prediction_stats(limit: int, after: Optional[str]):
     try:
-        devices = collection.distinct('device_id')
+        # Latest two readings of every device in the page, in one aggregation
+        docs = await run_io(lambda: list(fetch_latest_readings(2, after=after, limit=limit)))
+        
+        with metrics.stage("features"):
+            device_ids = []
+            rows = []
+            for doc in docs:
+                device_ids.append(doc['_id'])
+                readings = doc['readings']
+                if len(readings) >= 2:
+                    rows.append([
+                        readings[0]['humidity'],
+                        readings[0]['temperature'],
+                        readings[1]['temperature'],
+                        readings[0]['humidity']
+                    ])
+                else:
+                    rows.append(None)
+        
         predictions = []
+        usable = [i for i, row in enumerate(rows) if row is not None]
         
-        for device_id in devices:
-            df = get_recent_data(device_id, limit=10)
-            if df is not None and len(df) >= 2:
-                # Make prediction
-                temp_lag_1 = df.iloc[0]['temperature']
-                temp_lag_2 = df.iloc[1]['temperature']
-                humidity_lag_1 = df.iloc[0]['humidity']
-                current_humidity = df.iloc[0]['humidity']
-                
+        if usable and models_available('temperature_model', 'scaler'):
+            with metrics.stage("features"):
                 now = datetime.now()
-                features = np.array([[
-                    current_humidity,
-                    now.hour,
-                    now.weekday(),
-                    temp_lag_1,
-                    temp_lag_2,
-                    humidity_lag_1
-                ]])
-                
-                if lr_model and scaler:
-                    features_scaled = scaler.transform(features)
-                    prediction = lr_model.predict(features_scaled)[0]
-                    
-                    predictions.append({
-                        "device_id": device_id,
-                        "current_temp": round(temp_lag_1, 2),
-                        "predicted_temp": round(prediction, 2),
-                        "trend": "increasing" if prediction > temp_lag_1 else "decreasing"
-                    })
+                lags = np.array([rows[i] for i in usable], dtype=float)
+            
+                features = np.empty((len(usable), 6))
+                features[:, 0] = lags[:, 0]
+                features[:, 1] = now.hour
+                features[:, 2] = now.weekday()
+                features[:, 3:] = lags[:, 1:]
+            
+            # One vectorized prediction for the whole page
+            prediction_values = await run_inference(
+                predict_matrix, features, [device_ids[i] for i in usable]
+            )
+            
+            for i, prediction in zip(usable, prediction_values):
+                temp_lag_1 = rows[i][1]
+                predictions.append({
+                    "device_id": device_ids[i],
+                    "current_temp": round(temp_lag_1, 2),
+                    "predicted_temp": round(float(prediction), 2),
+                    "trend": "increasing" if prediction > temp_lag_1 else "decreasing"
+                })
         
         return {
             "success": True,
-            "predictions": predictions
+            "predictions": predictions,
+            "next_after": device_ids[-1] if limit and len(device_ids) == limit else None
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ingest")
+async def ingest_readings(request: IngestRequest):
+    """Push new readings into the reading buffer (alternative to the change stream)"""
+    accepted = 0
+    for reading in request.readings:
+        # Every traced reading counts: a request may bundle messages from several producers
+        trace_ingest(trace_from_reading({"trace": reading.trace}), request.topic)
+        if reading_buffer.append(reading.device_id, reading.temperature, reading.humidity, reading.timestamp):
+            accepted += 1
+    if accepted:
+        stats_cache.invalidate()
+    
+    return {
+        "success": True,
+        "accepted": accepted,
+        "received": len(request.readings)
+    }
+
+@app.post("/ingest/binary")
+async def ingest_binary(request: Request):
+    """Push readings in the packed binary format (application/octet-stream, see sensor_codec); ?topic= for tracing"""
+    body = await request.body()
+    try:
+        records = sensor_codec.decode(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    trace_ingest(sensor_codec.trace_of(body), request.query_params.get("topic"))
+
+    accepted = reading_buffer.append_many(*sensor_codec.to_columns(records))
+    if accepted:
+        stats_cache.invalidate()
+    return {
+        "success": True,
+        "accepted": accepted,
+        "received": len(records)
+    }
+
+@app.get("/models")
+def list_models():
+    """Model versions on disk and those currently resident"""
+    return {
+        "available_versions": registry.available_versions(),
+        **registry.stats()
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    """Request/stage latency per endpoint, model call batch sizes and event-loop lag"""
+    return {
+        **metrics.summary(),
+        "lstm": lstm_forecaster.stats(),
+        "reading_buffer": reading_buffer.stats(),
+        "result_cache": result_cache_stats(),
+        "profiler": profiler.status(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def check_profiler_token(token):
+    if not PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiler disabled; set PROFILER_TOKEN to enable it")
+    if token != PROFILER_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+@app.post("/debug/profiler/start")
+def start_profiler(interval_ms: float = 5.0, duration_s: Optional[float] = None, include_idle: bool = False,
+                   x_profiler_token: Optional[str] = Header(None)):
+    """Start sampling all thread stacks (stops by itself after duration_s)"""
+    check_profiler_token(x_profiler_token)
+    if not 1.0 <= interval_ms <= 1000.0:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if not profiler.start(interval_ms / 1000, duration_s, include_idle):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return profiler.status()
+
+@app.post("/debug/profiler/stop")
+def stop_profiler(x_profiler_token: Optional[str] = Header(None)):
+    check_profiler_token(x_profiler_token)
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/debug/profiler/stacks", response_class=PlainTextResponse)
+def profiler_stacks(x_profiler_token: Optional[str] = Header(None)):
+    """Sampled stacks in folded format, for flamegraph.pl / speedscope"""
+    check_profiler_token(x_profiler_token)
+    return profiler.folded()
+
 @app.get("/health")
 def health_check():
     return {
         "status": "OK",
-        "models_loaded": lr_model is not None and scaler is not None and anomaly_model is not None,
+        "models_loaded": models_available('temperature_model', 'scaler', 'anomaly_model'),
+        "models": registry.stats(),
+        "inference_mode": INFERENCE_MODE,
+        "lstm": lstm_forecaster.stats(),
+        "reading_buffer": reading_buffer.stats(),
+        "result_cache": result_cache_stats(),
+        "trace": ingest_tracer.summary(),
+        "pools": {
+            "mongo_max_pool_size": MONGO_MAX_POOL_SIZE,
+            "io_workers": IO_WORKERS,
+            "inference_workers": INFERENCE_WORKERS
+        },
         "timestamp": datetime.now().isoformat()
     }
 
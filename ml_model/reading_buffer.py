@@ -0,0 +1,187 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def to_epoch(value):
+    """Convert a Mongo/JSON timestamp (datetime, ISO string or number) to epoch seconds"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        # pymongo returns naive datetimes in UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class ReadingBuffer:
+    """
+    Fixed-size window of the most recent readings for each device.
+
+    All readings live in preallocated (max_devices, window) NumPy arrays, so
+    memory is bounded by max_devices * window no matter how many devices
+    report. When every slot is taken, the least recently updated device is
+    evicted. A device not updated for max_age seconds is reported as a miss
+    so the caller reloads it (max_age=0 keeps entries forever).
+    """
+
+    def __init__(self, window=16, max_devices=10000, max_age=0):
+        self.window = window
+        self.max_devices = max_devices
+        self.max_age = max_age
+
+        self.temperature = np.zeros((max_devices, window), dtype=np.float64)
+        self.humidity = np.zeros((max_devices, window), dtype=np.float64)
+        self.timestamp = np.zeros((max_devices, window), dtype=np.float64)
+        self.head = np.zeros(max_devices, dtype=np.int64)      # next write position
+        self.count = np.zeros(max_devices, dtype=np.int64)     # readings stored
+        self.last_update = np.zeros(max_devices, dtype=np.float64)
+
+        self.slots = {}                       # device_id -> row
+        self.devices = [None] * max_devices   # row -> device_id
+        self.free = list(range(max_devices - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.lock = threading.Lock()
+
+    def _slot(self, device_id):
+        row = self.slots.get(device_id)
+        if row is not None:
+            return row
+
+        if self.free:
+            row = self.free.pop()
+        else:
+            # Evict the least recently updated device
+            row = int(np.argmin(self.last_update))
+            del self.slots[self.devices[row]]
+            self.evictions += 1
+
+        self.slots[device_id] = row
+        self.devices[row] = device_id
+        self.head[row] = 0
+        self.count[row] = 0
+        return row
+
+    def _append(self, row, temperature, humidity, ts):
+        if self.count[row] and ts <= self.timestamp[row, (self.head[row] - 1) % self.window]:
+            # Duplicate or out-of-order reading (e.g. replayed after warm-up)
+            return False
+
+        pos = self.head[row]
+        self.temperature[row, pos] = temperature
+        self.humidity[row, pos] = humidity
+        self.timestamp[row, pos] = ts
+        self.head[row] = (pos + 1) % self.window
+        self.count[row] = min(self.count[row] + 1, self.window)
+        self.last_update[row] = time.monotonic()
+        return True
+
+    def append(self, device_id, temperature, humidity, timestamp=None):
+        """Add one reading; returns False if it is not newer than the stored ones"""
+        with self.lock:
+            row = self._slot(device_id)
+            return self._append(row, float(temperature), float(humidity), to_epoch(timestamp))
+
+    def append_many(self, device_ids, temperatures, humidities, timestamps):
+        """Add a block of readings (timestamps in epoch seconds) under one lock; returns how many were kept"""
+        accepted = 0
+        with self.lock:
+            for device_id, temperature, humidity, ts in zip(
+                device_ids, np.asarray(temperatures).tolist(),
+                np.asarray(humidities).tolist(), np.asarray(timestamps).tolist()
+            ):
+                accepted += self._append(self._slot(device_id), temperature, humidity, ts)
+        return accepted
+
+    def load(self, device_id, readings):
+        """Replace a device's window with readings given as dicts, in any order"""
+        readings = sorted(readings, key=lambda r: to_epoch(r.get('timestamp')))
+        with self.lock:
+            row = self._slot(device_id)
+            self.head[row] = 0
+            self.count[row] = 0
+            for r in readings[-self.window:]:
+                self._append(row, float(r['temperature']), float(r['humidity']), to_epoch(r.get('timestamp')))
+
+    def _fresh(self, rows):
+        """Mask of rows updated within max_age; counts the rest as expired"""
+        if not self.max_age:
+            return np.ones(len(rows), dtype=bool)
+        fresh = self.last_update[rows] >= time.monotonic() - self.max_age
+        self.expired += int(len(rows) - fresh.sum())
+        return fresh
+
+    def latest(self, device_id, n=2):
+        """Return (temperatures, humidities) newest first, or None if fewer than n are stored or they are stale"""
+        with self.lock:
+            row = self.slots.get(device_id)
+            if row is None or self.count[row] < n or not self._fresh([row])[0]:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            idx = (self.head[row] - 1 - np.arange(n)) % self.window
+            return self.temperature[row, idx].copy(), self.humidity[row, idx].copy()
+
+    def latest_many(self, device_ids, n=2, min_count=None):
+        """
+        Vectorized lookup for many devices.
+
+        Returns (temperatures, humidities, timestamps, found) where the arrays
+        are (k, n), newest first, and found marks devices with at least
+        min_count (default n) readings updated within max_age. Slots beyond a
+        found device's stored readings are NaN.
+        """
+        min_count = n if min_count is None else min_count
+        with self.lock:
+            rows = np.array([self.slots.get(d, -1) for d in device_ids], dtype=np.int64)
+            found = rows >= 0
+            found[found] = self.count[rows[found]] >= min_count
+            found[found] = self._fresh(rows[found])
+
+            hit_rows = rows[found]
+            idx = (self.head[hit_rows, None] - 1 - np.arange(n)) % self.window
+            temps = np.full((len(rows), n), np.nan)
+            hums = np.full((len(rows), n), np.nan)
+            stamps = np.full((len(rows), n), np.nan)
+            stored = np.arange(n) < self.count[hit_rows, None]
+            temps[found] = np.where(stored, self.temperature[hit_rows[:, None], idx], np.nan)
+            hums[found] = np.where(stored, self.humidity[hit_rows[:, None], idx], np.nan)
+            stamps[found] = np.where(stored, self.timestamp[hit_rows[:, None], idx], np.nan)
+
+            hits = int(found.sum())
+            self.hits += hits
+            self.misses += len(rows) - hits
+            return temps, hums, stamps, found
+
+    def device_ids(self):
+        with self.lock:
+            return list(self.slots)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "devices": len(self.slots),
+                "max_devices": self.max_devices,
+                "window": self.window,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "max_age": self.max_age,
+                "memory_bytes": int(
+                    self.temperature.nbytes + self.humidity.nbytes + self.timestamp.nbytes
+                    + self.head.nbytes + self.count.nbytes + self.last_update.nbytes
+                ),
+            }
@@ -0,0 +1,93 @@
+"""
+Short-lived shared cache for expensive read endpoints.
+
+Results are kept for `ttl` seconds under a key built from the query
+parameters (callers add the model version where the result depends on it,
+so a new version misses naturally). Concurrent requests for a key that is
+being computed wait for that one computation instead of starting their own
+(single flight). The least recently used entries are evicted beyond
+`max_entries`.
+
+invalidate() may be called from any thread (e.g. the change stream); it
+bumps a generation number, so older entries and computations that started
+before it are not served or stored afterwards.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, ttl=2.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()   # key -> (expires, generation, value)
+        self.inflight = {}             # key -> (generation, task computing it)
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, key, compute):
+        """Cached result for key, else the result of `await compute()` shared by concurrent callers"""
+        if self.ttl <= 0:
+            self.misses += 1
+            return await compute()
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, generation, value = entry
+            if expires > time.monotonic() and generation == self.generation:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        generation, task = self.inflight.get(key, (None, None))
+        if task is None or generation != self.generation:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fill(key, compute, self.generation))
+            # Retrieve the exception even if every waiter was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.inflight[key] = (self.generation, task)
+        else:
+            self.coalesced += 1
+        # A cancelled request (client gone) must not cancel the computation others wait on
+        return await asyncio.shield(task)
+
+    async def _fill(self, key, compute, generation):
+        try:
+            value = await compute()
+        finally:
+            if self.inflight.get(key, (None, None))[1] is asyncio.current_task():
+                del self.inflight[key]
+        if generation == self.generation:
+            self.entries[key] = (time.monotonic() + self.ttl, generation, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "ttl_s": self.ttl,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,121 @@
+"""
+Low-overhead sampling profiler for a running service.
+
+A background thread samples the Python stack of every other thread at a
+fixed interval and counts identical stacks. The result is in folded
+("collapsed") form, one `thread;outer;...;inner count` line per stack,
+which flamegraph.pl, speedscope and inferno read directly:
+
+    curl -X POST -H "X-Profiler-Token: $TOKEN" 'localhost:8000/debug/profiler/start?duration_s=30'
+    curl -H "X-Profiler-Token: $TOKEN" localhost:8000/debug/profiler/stacks > api.folded
+    flamegraph.pl api.folded > api.svg
+
+Threads parked waiting for work (idle pool workers, the event loop in
+select) are skipped unless include_idle is set.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# (file, function) of the innermost frame of a thread that is waiting for work
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, max_stacks=100000):
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.interval = None
+        self.started = None
+        self.stopped = None
+        self.include_idle = False
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=0.005, duration=None, include_idle=False, reset=True):
+        """Start sampling every `interval` seconds, for `duration` seconds or until stop(); False if running"""
+        with self.lock:
+            if self.running():
+                return False
+            if reset:
+                self.stacks.clear()
+                self.samples = self.dropped = 0
+            self.interval = interval
+            self.include_idle = include_idle
+            self.started, self.stopped = time.time(), None
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self, duration):
+        deadline = time.monotonic() + duration if duration else None
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            self._sample(own)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        self.stopped = time.time()
+
+    def _sample(self, own):
+        names = {t.ident: re.sub(r"[-_]\d+$", "", t.name) for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(ident, "thread"))
+            stack = ";".join(reversed(labels))
+
+            with self.lock:
+                self.samples += 1
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+                else:
+                    self.dropped += 1
+
+    def folded(self):
+        """Folded stacks, most frequent first"""
+        with self.lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.running(),
+                "interval_ms": self.interval * 1000 if self.interval else None,
+                "include_idle": self.include_idle,
+                "started": self.started,
+                "stopped": self.stopped,
+                "samples": self.samples,
+                "distinct_stacks": len(self.stacks),
+                "dropped_samples": self.dropped,
+            }
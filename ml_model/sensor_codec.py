@@ -0,0 +1,72 @@
+"""
+Decoder for the compact binary sensor payload.
+
+A message is an 8-byte header followed by fixed-size 16-byte records, all
+little-endian:
+
+    header   magic b"SR" | version u8 | flags u8 | count u32
+    record   device u32 | temperature i16 | humidity u16 | timestamp i64
+    trace    producer u32 | seq u64 | sent_ns u64      (only with flags & FLAG_TRACE)
+
+device is the numeric device index (sensor_01 is 0), temperature and
+humidity are in hundredths (°C, %) and timestamp is epoch milliseconds.
+Mirrors mqtt_publisher/sensor_codec.py; ml_model/tests/test_wire_format.py
+round-trips messages between the two copies.
+"""
+import struct
+
+import numpy as np
+
+MAGIC = b"SR"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+TRACE = struct.Struct("<IQQ")
+FLAG_TRACE = 1
+RECORD = np.dtype([
+    ('device', '<u4'),
+    ('temperature', '<i2'),
+    ('humidity', '<u2'),
+    ('timestamp', '<i8'),
+])
+
+
+def device_name(index):
+    """Device id the simulator uses for a device index (sensor_01, sensor_02, ...)"""
+    return f"sensor_{index + 1:02d}"
+
+
+def is_binary(payload):
+    return payload[:2] == MAGIC
+
+
+def decode(payload):
+    """Records of a message as a read-only NumPy view onto the payload (no copy)"""
+    if len(payload) < HEADER.size:
+        raise ValueError("payload shorter than the header")
+    magic, version, flags, count = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a version {VERSION} sensor payload")
+    if len(payload) != HEADER.size + count * RECORD.itemsize + (TRACE.size if flags & FLAG_TRACE else 0):
+        raise ValueError(f"payload size does not match {count} records")
+    return np.frombuffer(payload, dtype=RECORD, count=count, offset=HEADER.size)
+
+
+def trace_of(payload):
+    """(producer, seq, sent_ns) of a traced message, or None"""
+    if not payload[3] & FLAG_TRACE:
+        return None
+    return TRACE.unpack_from(payload, len(payload) - TRACE.size)
+
+
+def to_columns(records):
+    """
+    (device_ids, temperatures, humidities, timestamps) from decoded records:
+    device id strings, float64 °C / %, and float64 epoch seconds.
+    """
+    device_ids = [device_name(i) for i in records['device'].tolist()]
+    return (
+        device_ids,
+        records['temperature'] / 100.0,
+        records['humidity'] / 100.0,
+        records['timestamp'] / 1000.0,
+    )
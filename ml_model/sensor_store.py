@@ -0,0 +1,216 @@
+"""
+Indexes and collection layout of the sensor readings collection.
+
+The Python services read readings in three patterns, each served by an index
+so a query costs O(log n + k) instead of a collection scan:
+
+    device_timestamp    latest k readings of a device (/predict lag reloads, reading buffer)
+    anomaly_timestamp   latest anomalies (/anomaly/history), _id breaking timestamp ties for
+                        its page cursors; partial, only isAnomaly: true documents are
+                        indexed, so it stays small
+    timestamp           time-ordered / time-range scans (train_models.py, feature store, incremental training)
+
+ensure_indexes() creates missing ones (the `indexes` command) or only reports
+them (the API does this at startup). The collection can also be a MongoDB time-series collection
+(timeField timestamp, metaField device_id) with automatic expiry; `migrate`
+copies an existing collection into one, either a new collection to try out
+or, with --in-place, under the original name (the original is renamed to a
+backup first, since time-series collections cannot be renamed). Time-series
+collections do not support change streams, so READING_BUFFER_CHANGE_STREAM
+must stay off with that layout.
+
+    python sensor_store.py indexes --check
+    python sensor_store.py indexes
+    python sensor_store.py migrate --target sensor_data_ts --retention-days 30
+    python sensor_store.py migrate --in-place --retention-days 30
+    python sensor_store.py retention --retention-days 90
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+REQUIRED_INDEXES = [
+    {"name": "device_timestamp", "keys": [("device_id", 1), ("timestamp", -1)], "options": {}},
+    {"name": "anomaly_timestamp", "keys": [("isAnomaly", 1), ("timestamp", -1), ("_id", -1)],
+     "options": {"partialFilterExpression": {"isAnomaly": True}}},
+    {"name": "timestamp", "keys": [("timestamp", 1)], "options": {}},
+]
+
+MIGRATION_CHECKPOINTS = "sensor_store_migrations"
+
+
+def index_matches(info, spec):
+    """Whether an existing index (index_information() entry) serves the spec, whatever its name"""
+    keys = [(field, int(direction)) for field, direction in info["key"]]
+    return keys == spec["keys"] and info.get("partialFilterExpression") == spec["options"].get(
+        "partialFilterExpression"
+    )
+
+
+def ensure_indexes(collection, create=True):
+    """
+    Check the required indexes and create missing ones when `create` is set. An
+    index that has a required name but older keys is dropped and rebuilt.
+    Returns {index name: "ok" | "created" | "replaced" | "missing" | "outdated" | "failed: <reason>"}.
+    """
+    from pymongo.errors import OperationFailure
+
+    existing = collection.index_information()
+    report = {}
+    for spec in REQUIRED_INDEXES:
+        outdated = spec["name"] in existing
+        if any(index_matches(info, spec) for info in existing.values()):
+            report[spec["name"]] = "ok"
+        elif not create:
+            report[spec["name"]] = "outdated" if outdated else "missing"
+        else:
+            try:
+                if outdated:
+                    collection.drop_index(spec["name"])
+                collection.create_index(spec["keys"], name=spec["name"], **spec["options"])
+                report[spec["name"]] = "replaced" if outdated else "created"
+            except OperationFailure as e:
+                report[spec["name"]] = f"failed: {e.details.get('errmsg', e) if e.details else e}"
+    return report
+
+
+def print_index_report(collection, report):
+    for name, status in report.items():
+        icon = "✓" if status in ("ok", "created", "replaced") else "⚠️ "
+        print(f"{icon} Index {collection.name}.{name}: {status}")
+
+
+def is_timeseries(db, name):
+    info = next(db.list_collections(filter={"name": name}), None)
+    return info is not None and info.get("type") == "timeseries"
+
+
+def create_timeseries_collection(db, name, retention_days=None, granularity="seconds"):
+    """Time-series collection bucketed by device_id; readings expire after retention_days"""
+    options = {"timeseries": {"timeField": "timestamp", "metaField": "device_id", "granularity": granularity}}
+    if retention_days:
+        options["expireAfterSeconds"] = int(retention_days * 86400)
+    return db.create_collection(name, **options)
+
+
+def set_retention(db, name, retention_days):
+    """Change (or with None, turn off) the expiry of an existing time-series collection"""
+    return db.command("collMod", name, expireAfterSeconds=int(retention_days * 86400) if retention_days else "off")
+
+
+def migrate(db, source_name, target_name, retention_days=None, batch_size=10000, granularity="seconds"):
+    """
+    Copy every reading of `source_name` into the time-series collection `target_name`
+    (created if needed), in _id (insertion) order. Progress is checkpointed after
+    each batch, so an interrupted run resumes where it stopped; at most the batch
+    in flight when it was interrupted is copied twice.
+    """
+    if target_name not in db.list_collection_names():
+        create_timeseries_collection(db, target_name, retention_days, granularity)
+        print(f"✓ Created time-series collection {target_name}")
+    elif not is_timeseries(db, target_name):
+        raise ValueError(f"{target_name} exists and is not a time-series collection")
+
+    source, target = db[source_name], db[target_name]
+    checkpoints = db[MIGRATION_CHECKPOINTS]
+    checkpoint_id = f"{source_name}->{target_name}"
+    checkpoint = checkpoints.find_one({"_id": checkpoint_id}) or {"last_id": None, "copied": 0}
+
+    query = {"timestamp": {"$type": "date"}}   # time-series documents need a date timeField
+    if checkpoint["last_id"] is not None:
+        query["_id"] = {"$gt": checkpoint["last_id"]}
+        print(f"↻ Resuming after {checkpoint['copied']:,} readings")
+
+    copied = checkpoint["copied"]
+    started = last_report = time.perf_counter()
+    batch = []
+    for doc in source.find(query).sort("_id", 1).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            copied = _copy_batch(target, checkpoints, checkpoint_id, batch, copied)
+            batch = []
+            if time.perf_counter() - last_report >= 5:
+                last_report = time.perf_counter()
+                print(f"📦 {copied:,} readings copied ({copied / (last_report - started):,.0f}/s)")
+    if batch:
+        copied = _copy_batch(target, checkpoints, checkpoint_id, batch, copied)
+
+    skipped = source.count_documents({"timestamp": {"$not": {"$type": "date"}}})
+    return copied, skipped
+
+
+def _copy_batch(target, checkpoints, checkpoint_id, batch, copied):
+    target.insert_many(batch, ordered=False)
+    copied += len(batch)
+    checkpoints.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"last_id": batch[-1]["_id"], "copied": copied, "updated": datetime.utcnow()}},
+        upsert=True
+    )
+    return copied
+
+
+def replace_with_timeseries(db, name, retention_days=None, granularity="seconds"):
+    """
+    Rename `name` to <name>_backup_<time> and create a time-series collection
+    under `name`, so writers carry on into the new layout while the backup is
+    copied over. Returns the backup name.
+    """
+    backup = f"{name}_backup_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    db[name].rename(backup)
+    create_timeseries_collection(db, name, retention_days, granularity)
+    return backup
+
+
+def main():
+    import pymongo
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Manage indexes and the time-series layout of the sensor collection")
+    parser.add_argument("command", choices=["indexes", "migrate", "retention"])
+    parser.add_argument("--collection", default=os.getenv("COLLECTION_NAME"))
+    parser.add_argument("--check", action="store_true", help="indexes: only report, do not create")
+    parser.add_argument("--target", help="migrate: time-series collection to copy into")
+    parser.add_argument("--retention-days", type=float, default=None,
+                        help="expire readings after this many days (migrate, retention; omit for no expiry)")
+    parser.add_argument("--granularity", choices=["seconds", "minutes", "hours"], default="seconds")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--in-place", action="store_true",
+                        help="migrate: replace --collection itself, keeping the original as a backup")
+    args = parser.parse_args()
+
+    db = pymongo.MongoClient(os.getenv("MONGODB_URI"))[os.getenv("DB_NAME")]
+
+    if args.command == "indexes":
+        collection = db[args.collection]
+        print_index_report(collection, ensure_indexes(collection, create=not args.check))
+
+    elif args.command == "retention":
+        if not is_timeseries(db, args.collection):
+            parser.error(f"{args.collection} is not a time-series collection")
+        set_retention(db, args.collection, args.retention_days)
+        print(f"✓ {args.collection}: retention {args.retention_days or 'off'} days")
+
+    else:
+        source, target = args.collection, args.target
+        if args.in_place:
+            if is_timeseries(db, source):
+                parser.error(f"{source} already is a time-series collection")
+            source, target = replace_with_timeseries(db, source, args.retention_days, args.granularity), source
+            print(f"✓ {target} is now a time-series collection; copying the original from {source}")
+            print(f"   (if interrupted, resume with: migrate --collection {source} --target {target})")
+        elif not target:
+            parser.error("migrate needs --target or --in-place")
+
+        copied, skipped = migrate(db, source, target, args.retention_days, args.batch_size, args.granularity)
+        print(f"✓ Copied {copied:,} readings into {target}")
+        if skipped:
+            print(f"⚠️  Skipped {skipped:,} readings without a date timestamp")
+        print_index_report(db[target], ensure_indexes(db[target]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+In-process metrics for the prediction API, served on /metrics.
+
+- per-endpoint request latency, split into stages (mongo, features,
+  inference); a stage's time is summed over the calls a request makes, so
+  concurrent Mongo reloads can add up to more than the request itself
+- model call latency and batch sizes per model function
+- event-loop lag: how late a periodic sleep wakes up
+
+Histograms are the log-binned ones from latency_trace.
+"""
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+
+import numpy as np
+
+from latency_trace import LatencyHistogram
+
+# Stage times of the request being handled: {stage: seconds}
+current_stages = contextvars.ContextVar("current_stages", default=None)
+
+
+def batch_size(args, kwargs):
+    """Rows in the first array-like argument of a model call"""
+    for value in (*args, *kwargs.values()):
+        shape = getattr(value, "shape", None)
+        if shape:
+            return int(shape[0])
+    return None
+
+
+def function_name(fn):
+    while hasattr(fn, "func"):  # functools.partial
+        fn = fn.func
+    return getattr(fn, "__name__", repr(fn))
+
+
+class BatchSizes:
+    """Counts of batch sizes in power-of-two buckets (1, 2, 3-4, 5-8, ...)"""
+
+    def __init__(self):
+        self.buckets = np.zeros(33, dtype=np.int64)
+        self.calls = 0
+        self.rows = 0
+        self.max = 0
+
+    def add(self, n):
+        self.buckets[min(max(n - 1, 0).bit_length(), 32)] += 1
+        self.calls += 1
+        self.rows += n
+        self.max = max(self.max, n)
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "avg": round(self.rows / self.calls, 1) if self.calls else 0,
+            "max": self.max,
+            "buckets": {f"<={1 << i}": int(c) for i, c in enumerate(self.buckets) if c},
+        }
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+        self.stages = {}
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": self.latency.summary(),
+            "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+        }
+
+
+class ServiceMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints = {}
+        self.model_latency = {}
+        self.batch_sizes = {}
+        self.loop_lag = LatencyHistogram()
+        self.loop_lag_max = 0.0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Add the time spent in the block to the current request's `name` stage.
+        Pool threads running with the request's context (see in_context in
+        prediction_api) add to the same dict, hence the lock.
+        """
+        stages = current_stages.get()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if stages is not None:
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    stages[name] = stages.get(name, 0.0) + elapsed
+
+    def record_request(self, endpoint, seconds, stages, status):
+        with self.lock:
+            metrics = self.endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self.endpoints[endpoint] = EndpointMetrics()
+            metrics.requests += 1
+            metrics.errors += status >= 500
+            metrics.latency.add([seconds * 1000])
+            for stage, stage_seconds in stages.items():
+                if stage not in metrics.stages:
+                    metrics.stages[stage] = LatencyHistogram()
+                metrics.stages[stage].add([stage_seconds * 1000])
+
+    def record_model_call(self, name, seconds, rows):
+        with self.lock:
+            if name not in self.model_latency:
+                self.model_latency[name] = LatencyHistogram()
+                self.batch_sizes[name] = BatchSizes()
+            self.model_latency[name].add([seconds * 1000])
+            if rows is not None:
+                self.batch_sizes[name].add(rows)
+
+    def record_loop_lag(self, seconds):
+        with self.lock:
+            self.loop_lag.add([seconds * 1000])
+            self.loop_lag_max = max(self.loop_lag_max, seconds)
+
+    async def monitor_loop_lag(self, interval=0.1):
+        """Run on the event loop: a sleep that wakes up late means the loop was blocked"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.record_loop_lag(max(time.perf_counter() - started - interval, 0.0))
+
+    def summary(self):
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "endpoints": {name: metrics.summary() for name, metrics in sorted(self.endpoints.items())},
+                "model_calls": {
+                    name: {"latency": self.model_latency[name].summary(), "batch_size": self.batch_sizes[name].summary()}
+                    for name in sorted(self.model_latency)
+                },
+                "event_loop_lag": {**self.loop_lag.summary(), "max_ms": round(self.loop_lag_max * 1000, 3)},
+            }
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template (not raw path)"""
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stages = {}
+        token = current_stages.set(stages)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_stages.reset(token)
+            # The router stores the matched route in the scope; unmatched paths share one entry
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {route.path if route is not None else '<unmatched>'}"
+            self.metrics.record_request(endpoint, elapsed, stages, status[0])
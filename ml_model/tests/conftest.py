@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service modules are imported as top-level scripts (e.g. `from fused_model import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
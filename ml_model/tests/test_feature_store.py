@@ -0,0 +1,75 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import feature_store
+from feature_store import COLUMNS, FeatureStore, build
+
+START = datetime(2025, 11, 1, 22, 0)
+
+
+def feature_chunk(offset, n, step=timedelta(minutes=30)):
+    """n feature rows shaped like data_loader chunks, two devices, 30 minutes apart"""
+    rows = np.arange(offset, offset + n, dtype=np.float64)
+    chunk = {name: rows + i for i, name in enumerate(COLUMNS) if name not in ('timestamp', 'device')}
+    chunk['device_id'] = np.array([f"sensor_0{i % 2 + 1}" for i in range(offset, offset + n)], dtype=object)
+    chunk['timestamp'] = np.array([START + step * i for i in range(offset, offset + n)], dtype='datetime64[ms]')
+    return chunk
+
+
+def test_rollback_restores_committed_rows(tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.append(feature_chunk(0, 6))     # 2025-11-01 and 2025-11-02
+    committed = {day: store.rows(day) for day in store.partitions()}
+    expected = store.read(list(COLUMNS))
+
+    # A build that crashed after appending, before its state was saved
+    store.append(feature_chunk(6, 60))    # more of 2025-11-02, and 2025-11-03
+    assert store.partitions() == ["2025-11-01", "2025-11-02", "2025-11-03"]
+
+    store.rollback(committed)
+
+    assert {day: store.rows(day) for day in store.partitions()} == dict(committed, **{"2025-11-03": 0})
+    for column, values in store.read(list(COLUMNS)).items():
+        np.testing.assert_array_equal(values, expected[column])
+    for column, dtype in COLUMNS.items():
+        path = os.path.join(str(tmp_path), "day=2025-11-02", f"{column}.{feature_store.SUFFIX[dtype]}")
+        assert os.path.getsize(path) == committed["2025-11-02"] * np.dtype(dtype).itemsize
+
+
+def test_build_after_crash_matches_clean_build(tmp_path, monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient().db.sensor_data
+    collection.insert_many([
+        {"device_id": f"sensor_0{i % 3 + 1}", "temperature": 20.0 + i % 7, "humidity": 50.0 + i % 5,
+         "timestamp": START + timedelta(minutes=10 * i)}
+        for i in range(600)
+    ])
+
+    clean = FeatureStore(str(tmp_path / "clean"))
+    build(clean, collection, chunk_size=100)
+
+    # Crash at the commit point of the third chunk: its rows are on disk but not in the state
+    crashed = FeatureStore(str(tmp_path / "crashed"))
+    save_state = crashed.save_state
+    saves = []
+
+    def failing_save(state):
+        saves.append(1)
+        if len(saves) == 3:
+            raise RuntimeError("killed")
+        save_state(state)
+
+    monkeypatch.setattr(crashed, "save_state", failing_save)
+    with pytest.raises(RuntimeError):
+        build(crashed, collection, chunk_size=100)
+    monkeypatch.undo()
+
+    resumed = FeatureStore(str(tmp_path / "crashed"))
+    build(resumed, collection, chunk_size=100)
+
+    expected = clean.read(list(COLUMNS))
+    for column, values in resumed.read(list(COLUMNS)).items():
+        np.testing.assert_array_equal(values, expected[column])
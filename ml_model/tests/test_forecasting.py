@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MinMaxScaler
+
+from forecasting import infer_step_seconds, rollout, time_features
+
+
+def fitted_pipeline(rng, n=500):
+    temp = rng.normal(25, 3, n)
+    humidity = rng.uniform(30, 80, n)
+    X = np.column_stack([
+        humidity, rng.integers(0, 24, n), rng.integers(0, 7, n),
+        temp + rng.normal(0, 0.5, n), temp + rng.normal(0, 0.5, n), humidity,
+    ])
+    return make_pipeline(MinMaxScaler(), LinearRegression()).fit(X, temp)
+
+
+def scalar_forecast(pipeline, humidity, lag_1, lag_2, start_time, step_seconds, horizon):
+    """One device, one model call per step"""
+    temperatures = []
+    for step in range(1, horizon + 1):
+        at = datetime.fromtimestamp(start_time + step_seconds * step, tz=timezone.utc)
+        row = [[humidity, at.hour, at.weekday(), lag_1, lag_2, humidity]]
+        prediction = pipeline.predict(row)[0]
+        temperatures.append(prediction)
+        lag_1, lag_2 = prediction, lag_1
+    return temperatures
+
+
+def test_rollout_matches_scalar_per_device_loop():
+    rng = np.random.default_rng(3)
+    pipeline = fitted_pipeline(rng)
+    k, horizon = 6, 12
+
+    humidity = rng.uniform(30, 80, k)
+    lag_1 = rng.normal(25, 3, k)
+    lag_2 = lag_1 + rng.normal(0, 0.5, k)
+    # Start just before midnight on a Sunday so the steps cross the hour, day and week
+    start = np.full(k, datetime(2025, 11, 2, 23, 59, 30, tzinfo=timezone.utc).timestamp()) + rng.integers(0, 60, k)
+    step = rng.choice([5.0, 10.0, 300.0], k)
+
+    calls = []
+
+    def predict(features):
+        calls.append(features.shape)
+        return pipeline.predict(features)
+
+    temperatures, times = rollout(predict, humidity, lag_1, lag_2, start, step, horizon)
+
+    assert calls == [(k, 6)] * horizon
+    np.testing.assert_allclose(times[:, 0], start + step)
+    for i in range(k):
+        expected = scalar_forecast(pipeline, humidity[i], lag_1[i], lag_2[i], start[i], step[i], horizon)
+        np.testing.assert_allclose(temperatures[i], expected, rtol=1e-9, atol=1e-9)
+
+
+def test_time_features_match_datetime():
+    stamps = np.array([0.0, 1761955199.0, 1761955200.0, 1762127999.5])
+    hours, days = time_features(stamps)
+    for ts, hour, day in zip(stamps, hours, days):
+        at = datetime.fromtimestamp(ts, tz=timezone.utc)
+        assert (hour, day) == (at.hour, at.weekday())
+
+
+def test_step_inferred_from_whole_window():
+    nan = np.nan
+    stamps = np.array([
+        [0.0, 5.0, 10.0, 15.0, 30.0],        # one gap does not move the median
+        [nan, nan, nan, 100.0, 110.0],        # short window, NaN-padded at the start
+        [nan, nan, nan, nan, 100.0],          # a single reading: default
+        [0.0, 0.0, 0.0, 60.0, 120.0],         # duplicate timestamps are ignored
+    ])
+    np.testing.assert_allclose(infer_step_seconds(stamps, default=7.0), [5.0, 10.0, 7.0, 60.0])
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MinMaxScaler
+
+from fused_model import FusedLinearModel, build_fused_model, predict_per_device
+
+
+def sensor_features(rng, n):
+    """Rows shaped like FEATURE_COLUMNS: humidity, hour, day_of_week, temp lags, humidity lag"""
+    temp = rng.normal(25, 3, n)
+    humidity = rng.uniform(30, 80, n)
+    return np.column_stack([
+        humidity,
+        rng.integers(0, 24, n),
+        rng.integers(0, 7, n),
+        temp + rng.normal(0, 0.5, n),
+        temp + rng.normal(0, 0.5, n),
+        humidity + rng.normal(0, 1, n),
+    ]).astype(np.float64), temp
+
+
+def fit_pipeline(rng, n=500):
+    X, y = sensor_features(rng, n)
+    return make_pipeline(MinMaxScaler(), LinearRegression()).fit(X, y)
+
+
+def test_fused_matches_pipeline():
+    rng = np.random.default_rng(0)
+    pipeline = fit_pipeline(rng)
+    scaler, model = pipeline[0], pipeline[-1]
+
+    # Include rows outside the training range: the scaler does not clip
+    X, _ = sensor_features(rng, 200)
+    X[:10] *= 1.5
+
+    fused = FusedLinearModel(scaler, model)
+    np.testing.assert_allclose(fused.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-9)
+    assert build_fused_model(scaler, model) is not None
+
+
+def test_fused_rejects_clipping_scaler():
+    rng = np.random.default_rng(1)
+    X, y = sensor_features(rng, 100)
+    scaler = MinMaxScaler(clip=True).fit(X)
+    model = LinearRegression().fit(scaler.transform(X), y)
+
+    with pytest.raises(ValueError):
+        FusedLinearModel(scaler, model)
+
+
+def test_per_device_path_matches_pipelines():
+    rng = np.random.default_rng(2)
+    pipelines = {f"sensor_{i}": fit_pipeline(rng) for i in range(3)}
+    global_pipeline = fit_pipeline(rng)
+
+    # Bundle laid out as train_per_device.py writes it
+    names = sorted(pipelines)
+    fused = [FusedLinearModel(pipelines[d][0], pipelines[d][-1]) for d in names]
+    bundle = {
+        "device_index": {d: i for i, d in enumerate(names)},
+        "weights": np.array([f.weights for f in fused]),
+        "bias": np.array([f.bias for f in fused]),
+    }
+
+    X, _ = sensor_features(rng, 60)
+    device_ids = [names[i % 3] if i % 4 else "unknown_sensor" for i in range(len(X))]
+    expected = np.array([
+        (pipelines.get(d) or global_pipeline).predict(row[None, :])[0]
+        for d, row in zip(device_ids, X)
+    ])
+
+    actual = predict_per_device(bundle, X, device_ids, global_pipeline.predict)
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,24 @@
+import pytest
+
+import model_registry
+from model_registry import create_version, version_dir
+
+
+def test_version_dir_refuses_an_existing_version(tmp_path):
+    version_dir(str(tmp_path), "20250101000000000000")
+    with pytest.raises(FileExistsError):
+        version_dir(str(tmp_path), "20250101000000000000")
+
+
+def test_create_version_retries_on_collision(tmp_path, monkeypatch):
+    # Two runs in the same microsecond
+    monkeypatch.setattr(model_registry, "new_version", lambda: "20250101000000000000")
+
+    first, first_path = create_version(str(tmp_path))
+    second, second_path = create_version(str(tmp_path))
+
+    assert first == "20250101000000000000"
+    assert second == "20250101000000000000-1"
+    assert first_path != second_path
+    # Still sorts between the plain name and the next timestamp
+    assert first < second < "20250101000000000001"
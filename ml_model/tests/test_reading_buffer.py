@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+
+from reading_buffer import ReadingBuffer
+
+
+def fill(buffer, device_id, n, start=1000.0):
+    """n readings, 5 s apart; temperature i, humidity 100 + i"""
+    for i in range(n):
+        buffer.append(device_id, i, 100 + i, start + 5 * i)
+
+
+def test_window_across_the_ring_wrap():
+    buffer = ReadingBuffer(window=4, max_devices=2)
+    fill(buffer, "sensor_01", 6)    # head has wrapped: the ring holds 4, 5, 2, 3
+
+    temps, hums = buffer.latest("sensor_01", n=4)
+    np.testing.assert_array_equal(temps, [5, 4, 3, 2])
+    np.testing.assert_array_equal(hums, [105, 104, 103, 102])
+
+    temps, hums, stamps, found = buffer.latest_many(["sensor_01", "sensor_02"], n=4)
+    assert found.tolist() == [True, False]
+    np.testing.assert_array_equal(temps[0], [5, 4, 3, 2])
+    np.testing.assert_array_equal(stamps[0], [1025, 1020, 1015, 1010])
+    assert np.isnan(temps[1]).all()
+
+
+def test_short_window_is_nan_padded():
+    buffer = ReadingBuffer(window=4, max_devices=1)
+    fill(buffer, "sensor_01", 2)
+
+    temps, _, _, found = buffer.latest_many(["sensor_01"], n=4, min_count=2)
+    assert found.tolist() == [True]
+    np.testing.assert_array_equal(temps[0, :2], [1, 0])
+    assert np.isnan(temps[0, 2:]).all()
+    assert buffer.latest("sensor_01", n=3) is None
+
+
+def test_out_of_order_reading_is_dropped():
+    buffer = ReadingBuffer(window=4, max_devices=1)
+    fill(buffer, "sensor_01", 3)
+
+    assert not buffer.append("sensor_01", 99, 99, 1005.0)
+    temps, _ = buffer.latest("sensor_01", n=3)
+    np.testing.assert_array_equal(temps, [2, 1, 0])
+
+
+def test_entries_expire_after_max_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    buffer = ReadingBuffer(window=4, max_devices=2, max_age=15)
+    fill(buffer, "sensor_01", 3)
+    fill(buffer, "sensor_02", 3)
+
+    now[0] = 110.0
+    assert buffer.latest("sensor_01", n=2) is not None
+
+    # sensor_02 keeps reporting, sensor_01 goes quiet past max_age
+    buffer.append("sensor_02", 3, 103, 1015.0)
+    now[0] = 116.0
+    assert buffer.latest("sensor_01", n=2) is None
+    _, _, _, found = buffer.latest_many(["sensor_01", "sensor_02"], n=2)
+    assert found.tolist() == [False, True]
+    assert buffer.stats()["expired"] == 2
+
+    # A reload makes it fresh again
+    buffer.load("sensor_01", [{"temperature": 7, "humidity": 70, "timestamp": 2000.0},
+                              {"temperature": 8, "humidity": 80, "timestamp": 2005.0}])
+    temps, _ = buffer.latest("sensor_01", n=2)
+    np.testing.assert_array_equal(temps, [8, 7])
+
+
+def test_least_recently_updated_device_is_evicted(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    buffer = ReadingBuffer(window=4, max_devices=2)
+    for i, device_id in enumerate(["sensor_01", "sensor_02", "sensor_03"]):
+        now[0] = float(i)
+        fill(buffer, device_id, 2)
+
+    assert sorted(buffer.device_ids()) == ["sensor_02", "sensor_03"]
+    assert buffer.stats()["evictions"] == 1
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from result_cache import ResultCache
+
+
+class Loader:
+    """compute() stand-in that counts calls and blocks until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return {"call": self.calls}
+
+
+def test_concurrent_misses_run_the_loader_once():
+    async def scenario():
+        cache = ResultCache(ttl=60)
+        loader = Loader()
+        waiters = [asyncio.ensure_future(cache.get("stats", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        loader.release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert loader.calls == 1
+        assert results == [{"call": 1}] * 5
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["coalesced"] == 4
+
+        # Served from the cache afterwards
+        assert await cache.get("stats", loader) == {"call": 1}
+        assert loader.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_the_computation():
+    async def scenario():
+        cache = ResultCache(ttl=60)
+        loader = Loader()
+        first = asyncio.ensure_future(cache.get("stats", loader))
+        second = asyncio.ensure_future(cache.get("stats", loader))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        loader.release.set()
+        assert await second == {"call": 1}
+        assert loader.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_invalidate_drops_entries_and_inflight_results():
+    async def scenario():
+        cache = ResultCache(ttl=60)
+        loader = Loader()
+        pending = asyncio.ensure_future(cache.get("stats", loader))
+        await asyncio.sleep(0)
+
+        # Readings arrived while the first computation was running
+        cache.invalidate()
+        loader.release.set()
+        assert await pending == {"call": 1}
+
+        assert await cache.get("stats", loader) == {"call": 2}
+        assert await cache.get("stats", loader) == {"call": 2}
+        assert cache.stats()["invalidations"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_computation_is_not_cached():
+    async def scenario():
+        cache = ResultCache(ttl=60)
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            raise RuntimeError("mongo down")
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await cache.get("stats", failing)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_entries_are_evicted():
+    async def scenario():
+        cache = ResultCache(ttl=60, max_entries=2)
+
+        async def value(v):
+            return v
+
+        for key in ["a", "b"]:
+            await cache.get(key, lambda key=key: value(key))
+        await cache.get("a", lambda: value("stale"))     # a is now the most recent
+        await cache.get("c", lambda: value("c"))
+
+        assert list(cache.entries) == ["a", "c"]
+        assert cache.stats()["evictions"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+"""
+The publisher and the ML service each keep their own copy of the binary
+codec and of the trace fields. These tests import both sides so a change
+to one that the other cannot read fails here.
+"""
+import importlib.util
+import json
+import os
+
+import numpy as np
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load(relative_path, name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def publisher_codec():
+    return load("mqtt_publisher/sensor_codec.py", "publisher_sensor_codec")
+
+
+@pytest.fixture(scope="module")
+def consumer_codec():
+    return load("ml_model/sensor_codec.py", "consumer_sensor_codec")
+
+
+def test_codec_layouts_match(publisher_codec, consumer_codec):
+    for name in ("MAGIC", "VERSION", "FLAG_TRACE", "RECORD"):
+        assert getattr(publisher_codec, name) == getattr(consumer_codec, name), name
+    for name in ("HEADER", "TRACE"):
+        assert getattr(publisher_codec, name).format == getattr(consumer_codec, name).format, name
+
+
+@pytest.mark.parametrize("trace", [None, (0xDEADBEEF, 2**40 + 7, 123456789012345)])
+def test_binary_round_trip(publisher_codec, consumer_codec, trace):
+    device = np.array([0, 1, 41])
+    temperature = np.array([21.37, -5.5, 99.99])
+    humidity = np.array([45.0, 0.01, 100.0])
+    timestamp_ms = np.array([1730000000000, 1730000005000, 1730000010123])
+
+    payload = publisher_codec.encode(device, temperature, humidity, timestamp_ms, trace)
+    assert consumer_codec.is_binary(payload)
+
+    records = consumer_codec.decode(payload)
+    device_ids, temps, hums, stamps = consumer_codec.to_columns(records)
+    assert device_ids == ["sensor_01", "sensor_02", "sensor_42"]
+    np.testing.assert_allclose(temps, temperature)
+    np.testing.assert_allclose(hums, humidity)
+    np.testing.assert_allclose(stamps, timestamp_ms / 1000.0)
+    assert consumer_codec.trace_of(payload) == trace
+
+
+def test_json_trace_round_trip():
+    tracing = load("mqtt_publisher/tracing.py", "publisher_tracing")
+    latency_trace = load("ml_model/latency_trace.py", "consumer_latency_trace")
+
+    trace = (0xDEADBEEF, 42, 123456789012345)
+    reading = json.loads('{"device_id": "sensor_01", ' + tracing.trace_json_fragment(trace) + "}")
+    assert latency_trace.trace_from_reading(reading) == trace
+    assert latency_trace.trace_from_reading({"device_id": "sensor_01"}) is None
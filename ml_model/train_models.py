@@ -1,15 +1,18 @@
 import numpy as np
-import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
-from sklearn.ensemble import IsolationForest
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 import joblib
 import os
+import argparse
 from dotenv import load_dotenv
 import pymongo
 from datetime import datetime, timedelta
+from model_registry import create_version, publish_version, carry_over, active_version_dir
+from lstm_service import KERAS_FILE, LSTM_FILES
+from data_loader import FEATURE_COLUMNS, build_query, iter_feature_chunks, parse_datetime
+from incremental_training import IncrementalCheckpoint, reservoir_sample
+from feature_store import FeatureStore
+from sensor_store import ensure_indexes
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -21,6 +24,21 @@ MONGO_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("DB_NAME")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
+parser = argparse.ArgumentParser(description="Train the IoT sensor models")
+parser.add_argument("--start", help="only readings at or after this ISO timestamp")
+parser.add_argument("--end", help="only readings before this ISO timestamp")
+parser.add_argument("--devices", help="comma-separated device ids (default: all)")
+parser.add_argument("--chunk-size", type=int, default=50000, help="documents per Mongo batch")
+parser.add_argument("--limit", type=int, default=None, help="cap on documents read")
+parser.add_argument("--sample-size", type=int, default=50000,
+                    help="rows sampled for the holdout metrics and the anomaly model")
+parser.add_argument("--lstm-readings", type=int, default=10000, help="latest readings of one device for the LSTM")
+parser.add_argument("--feature-store", help="read features from this feature_store.py directory instead of MongoDB")
+args = parser.parse_args()
+
+# Every run writes a new versioned directory; the API switches to it once published
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+
 print("=" * 70)
 print("🤖 IoT Sensor Data - ML Model Training")
 print("=" * 70)
@@ -31,103 +49,140 @@ client = pymongo.MongoClient(MONGO_URI)
 db = client[DB_NAME]
 collection = db[COLLECTION_NAME]
 
-# Fetch all sensor data
-data = list(collection.find({}).sort('timestamp', -1).limit(10000))
+device_filter = args.devices.split(",") if args.devices else None
+if args.feature_store:
+    # Precomputed features: memory-map only the columns training needs, a day at a time
+    print(f"📦 Reading features from {args.feature_store}...")
+    store = FeatureStore(args.feature_store)
 
-if len(data) < 100:
-    print("❌ Not enough data to train models. Need at least 100 records.")
-    print(f"   Current records: {len(data)}")
-    print("   Please run the MQTT publisher for some time to collect more data.")
-    exit()
+    def iter_chunks():
+        partitions = store.iter_partitions(
+            ['timestamp', 'device', 'temperature', 'humidity', 'hour', 'day_of_week',
+             'temp_lag_1', 'temp_lag_2', 'humidity_lag_1'],
+            device_ids=device_filter,
+            start=parse_datetime(args.start),
+            end=parse_datetime(args.end)
+        )
+        for _, data in partitions:
+            for offset in range(0, len(data['temperature']), args.chunk_size):
+                chunk = {name: np.asarray(column[offset:offset + args.chunk_size]) for name, column in data.items()}
+                chunk['timestamp'] = chunk['timestamp'].astype('datetime64[ms]')
+                chunk['device_id'] = store.device_names(chunk.pop('device'))
+                yield chunk
+else:
+    # Stream sensor data in timestamp-ordered chunks, projecting only the needed
+    # fields; hour/day_of_week/minute and lag features are built per chunk
+    # (lags carry across chunk boundaries) into NumPy columns
+    # Without the timestamp index the time-ordered read sorts the whole collection
+    missing = [name for name, status in ensure_indexes(collection, create=False).items() if status != "ok"]
+    if missing:
+        print(f"⚠️  Missing indexes on {COLLECTION_NAME}: {', '.join(missing)} (run: python sensor_store.py indexes)")
+    query = build_query(
+        start=parse_datetime(args.start),
+        end=parse_datetime(args.end),
+        device_ids=device_filter
+    )
+    print("🔧 Feature Engineering (chunked)...")
+
+    def iter_chunks():
+        return iter_feature_chunks(collection, query, chunk_size=args.chunk_size, limit=args.limit)
 
-print(f"✓ Fetched {len(data)} records from database")
+# Nothing is concatenated: each chunk is folded into the normal-equation sums of
+# the training rows (with the scaler's min/max) and into fixed-size samples, so
+# peak memory does not grow with the data. Rows are split 80/20 at random as
+# before; the holdout metrics and the anomaly model use reservoir samples of
+# --sample-size rows, and the LSTM the latest --lstm-readings of one device.
+fit = IncrementalCheckpoint(reservoir_size=args.sample_size)
+split_rng = np.random.default_rng(42)
+holdout = np.empty((args.sample_size, len(FEATURE_COLUMNS) + 1))
+holdout_seen = 0
 
-# Convert to DataFrame
-df = pd.DataFrame(data)
-df['timestamp'] = pd.to_datetime(df['timestamp'])
-df = df.sort_values('timestamp')
+rows = 0
+first_seen = last_seen = None
+devices = set()
+lstm_device = None
+lstm_temps = []
 
-print(f"✓ Data range: {df['timestamp'].min()} to {df['timestamp'].max()}")
-print(f"✓ Devices: {df['device_id'].unique()}")
+for chunk in iter_chunks():
+    n = len(chunk['temperature'])
+    rows += n
+    first_seen = min(first_seen, chunk['timestamp'].min()) if first_seen is not None else chunk['timestamp'].min()
+    last_seen = max(last_seen, chunk['timestamp'].max()) if last_seen is not None else chunk['timestamp'].max()
+    chunk_devices = np.unique(chunk['device_id'])
+    devices.update(chunk_devices)
 
-# Feature Engineering
-print("\n🔧 Feature Engineering...")
-df['hour'] = df['timestamp'].dt.hour
-df['day_of_week'] = df['timestamp'].dt.dayofweek
-df['minute'] = df['timestamp'].dt.minute
+    test = split_rng.random(n) < 0.2
+    if not test.all():
+        fit.update({name: column[~test] for name, column in chunk.items()})
+    holdout_seen = reservoir_sample(
+        holdout, holdout_seen,
+        np.column_stack([chunk[c][test] for c in FEATURE_COLUMNS + ['temperature']]),
+        split_rng
+    )
 
-# Create lag features (previous values)
-df['temp_lag_1'] = df.groupby('device_id')['temperature'].shift(1)
-df['temp_lag_2'] = df.groupby('device_id')['temperature'].shift(2)
-df['humidity_lag_1'] = df.groupby('device_id')['humidity'].shift(1)
+    # The LSTM trains on the first device by id, as before
+    if lstm_device is None or chunk_devices[0] < lstm_device:
+        lstm_device, lstm_temps = chunk_devices[0], []
+    lstm_temps.append(chunk['temperature'][chunk['device_id'] == lstm_device])
+    if sum(len(t) for t in lstm_temps) > 2 * args.lstm_readings:
+        lstm_temps = [np.concatenate(lstm_temps)[-args.lstm_readings:]]
+
+if rows < 100 or fit.rows < len(FEATURE_COLUMNS) + 1 or not holdout_seen:
+    print("❌ Not enough data to train models. Need at least 100 records.")
+    print(f"   Current records: {rows}")
+    print("   Please run the MQTT publisher for some time to collect more data.")
+    exit()
 
-# Drop rows with NaN values from lag features
-df = df.dropna()
+# Created only once there is something to publish
+VERSION, VERSION_DIR = create_version(MODELS_DIR)
+print(f"📦 Model version: {VERSION}")
 
+print(f"✓ Data range: {first_seen} to {last_seen}")
+print(f"✓ Devices: {np.array(sorted(devices))}")
 print(f"✓ Created features: hour, day_of_week, lag features")
-print(f"✓ Final dataset size: {len(df)} records")
+print(f"✓ Final dataset size: {rows} records")
 
 # Prepare data for Linear Regression (Temperature Prediction)
 print("\n🎯 Training Temperature Prediction Model (Linear Regression)...")
 
-feature_cols = ['humidity', 'hour', 'day_of_week', 'temp_lag_1', 'temp_lag_2', 'humidity_lag_1']
-X = df[feature_cols]
-y_temp = df['temperature']
-
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y_temp, test_size=0.2, random_state=42
-)
-
-# Scale features
-scaler = MinMaxScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-# Train Linear Regression Model
-lr_model = LinearRegression()
-lr_model.fit(X_train_scaled, y_train)
+# Solved from X^T X / X^T y of the training rows, for the MinMax-scaled features
+lr_model, _ = fit.solve()
+scaler = fit.scaler
 
-# Evaluate
+# Evaluate on the holdout sample
+test_rows = holdout[:min(holdout_seen, args.sample_size)]
+X_test_scaled = scaler.transform(test_rows[:, :-1])
+y_test = test_rows[:, -1]
 y_pred = lr_model.predict(X_test_scaled)
 mse = mean_squared_error(y_test, y_pred)
 mae = mean_absolute_error(y_test, y_pred)
 rmse = np.sqrt(mse)
 
-print(f"✓ Model trained successfully")
+print(f"✓ Model trained successfully on {fit.rows:,} rows")
 print(f"  - RMSE: {rmse:.4f}°C")
 print(f"  - MAE: {mae:.4f}°C")
 print(f"  - R² Score: {lr_model.score(X_test_scaled, y_test):.4f}")
 
 # Save Linear Regression Model
-joblib.dump(lr_model, 'models/temperature_model.pkl')
-joblib.dump(scaler, 'models/scaler.pkl')
-print(f"✓ Saved models to 'models/' directory")
+joblib.dump(lr_model, os.path.join(VERSION_DIR, 'temperature_model.pkl'))
+joblib.dump(scaler, os.path.join(VERSION_DIR, 'scaler.pkl'))
+print(f"✓ Saved models to '{VERSION_DIR}' directory")
 
 # Train Anomaly Detection Model (Isolation Forest)
 print("\n🔍 Training Anomaly Detection Model (Isolation Forest)...")
 
-anomaly_features = ['temperature', 'humidity']
-X_anomaly = df[anomaly_features]
-
-# Train Isolation Forest
-iso_forest = IsolationForest(
-    contamination=0.05,  # Expect 5% anomalies
-    random_state=42,
-    n_estimators=100
-)
-
-iso_forest.fit(X_anomaly)
+# Fitted on the reservoir sample of (temperature, humidity), expecting 5% anomalies
+iso_forest = fit.anomaly_model(n_estimators=100, contamination=0.05)
 
 # Predict anomalies
-anomaly_predictions = iso_forest.predict(X_anomaly)
-anomaly_count = (anomaly_predictions == -1).sum()
+sample = fit.reservoir[:min(fit.reservoir_seen, args.sample_size)]
+anomaly_count = (iso_forest.predict(sample) == -1).sum()
 
 print(f"✓ Anomaly detection model trained")
-print(f"  - Detected {anomaly_count} anomalies ({anomaly_count/len(df)*100:.2f}%)")
+print(f"  - Detected {anomaly_count} anomalies ({anomaly_count/len(sample)*100:.2f}%) in a sample of {len(sample):,}")
 
 # Save Anomaly Detection Model
-joblib.dump(iso_forest, 'models/anomaly_model.pkl')
+joblib.dump(iso_forest, os.path.join(VERSION_DIR, 'anomaly_model.pkl'))
 print(f"✓ Saved anomaly detection model")
 
 # Simple LSTM-based prediction (optional - requires more data)
@@ -146,8 +201,7 @@ try:
         return np.array(X), np.array(y)
     
     # Use temperature data for LSTM
-    temp_data = df.groupby('device_id')['temperature'].apply(list).values[0]
-    temp_array = np.array(temp_data).reshape(-1, 1)
+    temp_array = np.concatenate(lstm_temps)[-args.lstm_readings:].reshape(-1, 1)
     
     # Scale data
     lstm_scaler = MinMaxScaler()
@@ -194,8 +248,8 @@ try:
         print(f"  - MAE: {lstm_mae:.4f}")
         
         # Save LSTM model
-        lstm_model.save('models/lstm_temperature_model.h5')
-        joblib.dump(lstm_scaler, 'models/lstm_scaler.pkl')
+        lstm_model.save(os.path.join(VERSION_DIR, 'lstm_temperature_model.h5'))
+        joblib.dump(lstm_scaler, os.path.join(VERSION_DIR, 'lstm_scaler.pkl'))
         print(f"✓ Saved LSTM model")
     else:
         print("⚠️  Not enough data for LSTM training (need more sequences)")
@@ -203,6 +257,20 @@ try:
 except Exception as e:
     print(f"⚠️  LSTM training skipped: {e}")
 
+# Keep serving the previous LSTM when this run did not train one. The per-device
+# bundle is not carried: it belongs to the global model this run replaces.
+if not os.path.exists(os.path.join(VERSION_DIR, KERAS_FILE)):
+    carried = carry_over(MODELS_DIR, VERSION_DIR, LSTM_FILES)
+    if carried:
+        print(f"✓ Carried over {', '.join(carried)} from the active version")
+active_dir = active_version_dir(MODELS_DIR)
+if active_dir and os.path.exists(os.path.join(active_dir, 'device_models.pkl')):
+    print("ℹ️  Per-device models are not carried over; re-run train_per_device.py to refit them")
+
+# Publish only after every artifact is written, so the API never sees a partial version
+publish_version(MODELS_DIR, VERSION)
+print(f"\n✓ Published model version {VERSION}")
+
 print("\n" + "=" * 70)
 print("✅ Model Training Complete!")
 print("=" * 70)
@@ -0,0 +1,192 @@
+"""
+Per-device (or per-cluster) temperature model training on a process pool.
+
+The feature matrix is placed in shared memory once; workers attach to it by
+name and fit their device's contiguous row range, so nothing large is pickled
+to them. The result is a device_models.pkl bundle in a new model version,
+which the prediction API indexes by device_id (PER_DEVICE_MODELS=true).
+The global, anomaly and LSTM models are carried over from the active version;
+the bundle records which global model it was published with, and the API
+ignores it once train_models.py or incremental_training.py replace that model.
+
+    python train_per_device.py --workers 8
+    python train_per_device.py --clusters 20      # one model per device cluster
+"""
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+import pymongo
+from dotenv import load_dotenv
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import MinMaxScaler
+
+from data_loader import FEATURE_COLUMNS, build_query, load_features, parse_datetime
+from fused_model import FusedLinearModel
+from lstm_service import LSTM_FILES
+from model_registry import (
+    ANOMALY_MODEL_FILES, GLOBAL_MODEL_FILES, carry_over, create_version, global_model_id,
+    publish_version
+)
+
+warnings.filterwarnings('ignore')
+
+# Load environment variables
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("DB_NAME")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+BUNDLE_FILE = "device_models.pkl"
+
+# Worker-side views onto the shared feature matrix
+_shared = {}
+
+
+def attach_shared(x_name, y_name, n_rows, n_features):
+    for key, name, shape in (("X", x_name, (n_rows, n_features)), ("y", y_name, (n_rows,))):
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key + "_shm"] = shm     # keep the mapping alive
+        _shared[key] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def fit_group(group, start, end, test_fraction=0.2):
+    """Fit scaler + linear model on rows [start, end) (time-ordered) of one group"""
+    X = _shared["X"][start:end]
+    y = _shared["y"][start:end]
+
+    split = int(len(y) * (1 - test_fraction))
+    scaler = MinMaxScaler().fit(X[:split])
+    model = LinearRegression().fit(scaler.transform(X[:split]), y[:split])
+
+    rmse = None
+    if split < len(y):
+        residual = model.predict(scaler.transform(X[split:])) - y[split:]
+        rmse = float(np.sqrt(np.mean(residual ** 2)))
+
+    # Refit on every row for the published model
+    scaler = MinMaxScaler().fit(X)
+    model = LinearRegression().fit(scaler.transform(X), y)
+    return group, scaler, model, rmse, len(y)
+
+
+def to_shared(array):
+    shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm
+
+
+def cluster_devices(columns, device_ids, codes, n_clusters):
+    """Group devices by their mean temperature/humidity profile"""
+    from sklearn.cluster import KMeans
+
+    counts = np.bincount(codes, minlength=len(device_ids))
+    profile = np.column_stack([
+        np.bincount(codes, weights=columns['temperature'], minlength=len(device_ids)) / counts,
+        np.bincount(codes, weights=columns['humidity'], minlength=len(device_ids)) / counts,
+    ])
+    n_clusters = min(n_clusters, len(device_ids))
+    return KMeans(n_clusters=n_clusters, n_init=10, random_state=42).fit_predict(profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train one temperature model per device or device cluster")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--clusters", type=int, default=None, help="fit per device cluster instead of per device")
+    parser.add_argument("--min-rows", type=int, default=50, help="groups with fewer rows use the global model")
+    parser.add_argument("--start", help="only readings at or after this ISO timestamp")
+    parser.add_argument("--end", help="only readings before this ISO timestamp")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🤖 Per-device Model Training")
+    print("=" * 70)
+
+    collection = pymongo.MongoClient(MONGO_URI)[DB_NAME][COLLECTION_NAME]
+    query = build_query(start=parse_datetime(args.start), end=parse_datetime(args.end))
+    columns = load_features(collection, query, chunk_size=args.chunk_size)
+    if columns is None:
+        print("❌ No data to train on")
+        return
+
+    device_ids, codes = np.unique(columns['device_id'], return_inverse=True)
+    if args.clusters:
+        device_group = cluster_devices(columns, device_ids, codes, args.clusters)
+        group_names = [f"cluster_{c}" for c in range(device_group.max() + 1)]
+    else:
+        device_group = np.arange(len(device_ids))
+        group_names = [str(d) for d in device_ids]
+    row_group = device_group[codes]
+
+    # Contiguous row ranges per group; stable sort keeps time order within a group
+    order = np.argsort(row_group, kind='stable')
+    X = np.ascontiguousarray(np.column_stack([columns[c] for c in FEATURE_COLUMNS])[order])
+    y = np.ascontiguousarray(columns['temperature'][order])
+    bounds = np.searchsorted(row_group[order], np.arange(len(group_names) + 1))
+    print(f"✓ {len(y):,} rows, {len(device_ids)} devices, {len(group_names)} groups")
+
+    shm_X, shm_y = to_shared(X), to_shared(y)
+    del X, y
+    try:
+        started = time.perf_counter()
+        tasks = [
+            (g, int(bounds[g]), int(bounds[g + 1]))
+            for g in range(len(group_names))
+            if bounds[g + 1] - bounds[g] >= args.min_rows
+        ]
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=attach_shared,
+            initargs=(shm_X.name, shm_y.name, int(bounds[-1]), len(FEATURE_COLUMNS))
+        ) as pool:
+            results = list(pool.map(fit_group, *zip(*tasks))) if tasks else []
+        print(f"✓ Fitted {len(results)} models on {args.workers} workers in {time.perf_counter() - started:.2f}s")
+    finally:
+        for shm in (shm_X, shm_y):
+            shm.close()
+            shm.unlink()
+
+    # Bundle: per-group fused weights for vectorized lookup by device_id
+    fitted = {g: (scaler, model) for g, scaler, model, _, _ in results}
+    group_index = {g: i for i, g in enumerate(sorted(fitted))}
+    weights = np.zeros((len(group_index), len(FEATURE_COLUMNS)))
+    bias = np.zeros(len(group_index))
+    for g, i in group_index.items():
+        fused = FusedLinearModel(*fitted[g])
+        weights[i], bias[i] = fused.weights, fused.bias
+
+    bundle = {
+        "device_index": {
+            str(d): group_index[device_group[code]]
+            for code, d in enumerate(device_ids)
+            if device_group[code] in group_index
+        },
+        "groups": [group_names[g] for g in sorted(fitted)],
+        "weights": weights,
+        "bias": bias,
+        "models": {group_names[g]: fitted[g] for g in fitted},
+    }
+
+    rmses = [r[3] for r in results if r[3] is not None]
+    if rmses:
+        print(f"✓ Holdout RMSE per group: median {np.median(rmses):.4f}°C, worst {np.max(rmses):.4f}°C")
+    print(f"✓ {len(bundle['device_index'])}/{len(device_ids)} devices have their own model "
+          f"(the rest use the global model)")
+
+    version, path = create_version(MODELS_DIR)
+    carry_over(MODELS_DIR, path, GLOBAL_MODEL_FILES + ANOMALY_MODEL_FILES + LSTM_FILES)
+    bundle["global_model"] = global_model_id(path)
+    joblib.dump(bundle, os.path.join(path, BUNDLE_FILE))
+    publish_version(MODELS_DIR, version)
+    print(f"✓ Published model version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Topic sharding and multi-device batching for high-rate publishing.
+
+Devices are spread over N topics (e.g. sensors/<shard>/data) with jump
+consistent hashing of the device id, so a device always lands on the same
+shard and changing N only moves about 1/N of the devices. Each subscriber
+instance subscribes to its own shard topics; no coordination is needed.
+
+ShardedBatcher groups readings per shard into messages of up to max_count
+readings, flushing a partial batch once its oldest reading has waited
+max_delay seconds.
+"""
+import hashlib
+
+import numpy as np
+
+
+def stable_hash(device_id):
+    """64-bit hash of a device id that is the same in every process and run"""
+    return int.from_bytes(hashlib.blake2b(device_id.encode(), digest_size=8).digest(), "little")
+
+
+def jump_hash(keys, buckets):
+    """Jump consistent hash (Lamping & Veach) of an array of 64-bit keys, vectorized"""
+    keys = np.array(keys, dtype=np.uint64)
+    result = np.zeros(len(keys), dtype=np.int64)
+    j = np.zeros(len(keys), dtype=np.int64)
+    active = np.ones(len(keys), dtype=bool)
+    with np.errstate(over="ignore"):
+        while active.any():
+            result[active] = j[active]
+            k = keys[active] * np.uint64(2862933555777941757) + np.uint64(1)
+            keys[active] = k
+            scale = float(1 << 31) / ((k >> np.uint64(33)).astype(np.float64) + 1)
+            j[active] = ((result[active] + 1) * scale).astype(np.int64)
+            active &= j < buckets
+    return result
+
+
+def shard_of(device_ids, shards):
+    """Shard number of each device id (all 0 when sharding is off)"""
+    if shards <= 1:
+        return np.zeros(len(device_ids), dtype=np.int64)
+    return jump_hash([stable_hash(d) for d in device_ids], shards)
+
+
+def shard_topic(template, shard):
+    return template.format(shard=shard)
+
+
+class ShardedBatcher:
+    """Per-shard batches of column arrays, by count or time window"""
+
+    def __init__(self, shards, max_count, max_delay):
+        self.max_count = max_count
+        self.max_delay = max_delay
+        n = max(shards, 1)
+        self.chunks = [[] for _ in range(n)]
+        self.counts = np.zeros(n, dtype=np.int64)
+        self.oldest = np.full(n, np.inf)
+
+    def add(self, shard, columns, now):
+        """Queue readings; columns is a tuple of equal-length arrays, shard the shard of each row"""
+        order = np.argsort(shard, kind="stable")
+        bounds = np.searchsorted(shard[order], np.arange(len(self.chunks) + 1))
+        for s in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[s]:bounds[s + 1]]
+            self.chunks[s].append(tuple(c[rows] for c in columns))
+            if not self.counts[s]:
+                self.oldest[s] = now
+            self.counts[s] += len(rows)
+
+    def pending(self):
+        return int(self.counts.sum())
+
+    def ready(self, now, flush=False):
+        """
+        [(shard, columns)] for every full batch, plus partial batches whose
+        oldest reading is past the window (or all of them with flush=True).
+        """
+        batches = []
+        for s in np.flatnonzero(self.counts):
+            expired = flush or now - self.oldest[s] >= self.max_delay
+            if not expired and self.counts[s] < self.max_count:
+                continue
+
+            columns = [np.concatenate(c) for c in zip(*self.chunks[s])]
+            n = len(columns[0])
+            take = n if expired else n - n % self.max_count
+            for i in range(0, take, self.max_count):
+                batches.append((int(s), [c[i:i + self.max_count] for c in columns]))
+
+            self.counts[s] = n - take
+            if take < n:
+                # Keep the remainder; its age is at most that of the oldest reading
+                self.chunks[s] = [tuple(c[take:] for c in columns)]
+            else:
+                self.chunks[s] = []
+                self.oldest[s] = np.inf
+        return batches
@@ -0,0 +1,269 @@
+"""
+High-rate MQTT load generator.
+
+Simulates a large fleet (10k-1M devices) whose temperature/humidity state
+lives in NumPy arrays. The fleet is split across worker processes, each with
+its own MQTT connection and device slice, which publish round-robin at a
+shared target rate. Workers stay quiet and report to the parent, which
+prints one throughput/latency summary every --report-every seconds.
+
+Each worker publishes through a PublishEngine, so at most --inflight
+messages per connection are unacknowledged; when the broker falls behind,
+the sent rate drops instead of memory growing. Latency is publish -> PUBACK
+for QoS 1 and publish -> socket write for QoS 0.
+
+    mosquitto -p 1883 &
+    python load_generator.py --broker localhost --no-tls --devices 100000 --rate 50000 --processes 4
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import time
+from datetime import datetime
+
+import numpy as np
+
+import sensor_codec
+from batching import ShardedBatcher, shard_of, shard_topic
+from mqtt_publisher import (
+    BROKER, PORT, TOPIC, TOPIC_TEMPLATE, DeviceStates, create_client, device_name, generate_sensor_data
+)
+from publish_engine import PublishEngine
+from stream_recorder import StreamRecorder, record_path
+from tracing import Tracer, trace_json_fragment, producer_id
+
+TICK = 0.01
+# Workers report more often than the parent prints so intervals line up
+WORKER_REPORT_EVERY = 0.5
+# Latency histogram buckets (seconds), shared by workers and the parent
+LATENCY_BINS = np.concatenate([[0.0], np.geomspace(1e-5, 60.0, 256), [np.inf]])
+
+
+def latency_percentiles(hist, percentiles=(50, 99)):
+    """Approximate percentiles (ms) from a LATENCY_BINS histogram"""
+    total = hist.sum()
+    if not total:
+        return [None for _ in percentiles]
+    cumulative = np.cumsum(hist)
+    upper = np.minimum(LATENCY_BINS[1:], LATENCY_BINS[-2])
+    return [float(upper[np.searchsorted(cumulative, total * p / 100)]) * 1000 for p in percentiles]
+
+
+def worker(worker_id, start, end, rate, args, stats, stop):
+    asyncio.run(run_worker(worker_id, start, end, rate, args, stats, stop))
+
+
+async def run_worker(worker_id, start, end, rate, args, stats, stop):
+    """Publish readings for devices [start, end) at `rate` readings/s until stop is set"""
+    n = end - start
+    states = DeviceStates(n, None if args.seed is None else [args.seed, worker_id])
+    names = [device_name(i) for i in range(start, end)]
+
+    if args.shards > 1:
+        topics = [shard_topic(args.topic_template, s) for s in range(args.shards)]
+    else:
+        topics = [args.topic]
+    device_shard = shard_of(names, args.shards)
+    batcher = ShardedBatcher(len(topics), args.batch_size, args.batch_window_ms / 1000)
+    # Sequence numbers run per topic, so a consumer of some shards sees gap-free streams
+    tracers = [Tracer(producer_id(worker_id)) for _ in topics] if args.trace else None
+
+    def encode(shard, index, temperatures, humidities, timestamps_ms):
+        """One message for a batch of readings; index is local to this worker"""
+        trace = tracers[shard].next() if tracers else None
+        if args.format == "binary":
+            return sensor_codec.encode(index + start, temperatures, humidities, timestamps_ms, trace)
+        stamps = np.datetime_as_string(timestamps_ms.astype('datetime64[ms]'), unit='s')
+        readings = [
+            f'{{"device_id": "{names[i]}", "temperature": {temp}, "humidity": {humidity}, "timestamp": "{ts}Z"}}'
+            for i, temp, humidity, ts in zip(index.tolist(), temperatures.tolist(), humidities.tolist(), stamps)
+        ]
+        # The trace describes the whole message; it rides on the first reading
+        if trace is not None:
+            readings[0] = readings[0][:-1] + ", " + trace_json_fragment(trace) + "}"
+        # A lone reading stays a plain object, which every consumer understands
+        return readings[0] if len(readings) == 1 else "[" + ", ".join(readings) + "]"
+
+    client = create_client(f"IoT_LoadGen_{os.getpid()}_{worker_id}", use_tls=not args.no_tls)
+    engine = PublishEngine(client, args.broker, args.port, max_inflight=args.inflight)
+    await engine.start()
+
+    recorder = None
+    if args.record:
+        recorder = StreamRecorder(record_path(args.record, worker_id, args.processes))
+
+    async def publish(topic, message):
+        # Waits while the in-flight window is full
+        await engine.publish(topic, message, qos=args.qos)
+        if recorder is not None:
+            recorder.write(topic, message)
+
+    def report():
+        hist = np.histogram(engine.drain_latencies(), bins=LATENCY_BINS)[0]
+        stats.put((worker_id, sent, engine.sent, engine.errors, len(engine.pending), engine.reconnects, hist))
+
+    cursor = sent = 0
+    started = last_report = time.perf_counter()
+    try:
+        while not stop.is_set():
+            now = time.perf_counter()
+            if now - last_report >= WORKER_REPORT_EVERY:
+                report()
+                last_report = now
+
+            # Catch up to the target rate, but never build more than a second of backlog
+            due = min(int((now - started) * rate) - sent, max(int(rate), 1))
+            if due > 0:
+                index = (cursor + np.arange(due)) % n
+                cursor = (cursor + due) % n
+                temperatures, humidities = generate_sensor_data(states, index)
+                sent += due
+
+                if args.batch_size == 1 and args.format == "json":
+                    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+                    for i, temp, humidity in zip(index.tolist(), temperatures.tolist(), humidities.tolist()):
+                        shard = device_shard[i]
+                        trace = f', {trace_json_fragment(tracers[shard].next())}' if tracers else ''
+                        message = (f'{{"device_id": "{names[i]}", "temperature": {temp}, '
+                                   f'"humidity": {humidity}, "timestamp": "{timestamp}"{trace}}}')
+                        await publish(topics[shard], message)
+                else:
+                    timestamps_ms = np.full(due, sensor_codec.epoch_ms(), dtype=np.int64)
+                    batcher.add(device_shard[index], (index, temperatures, humidities, timestamps_ms), now)
+
+            for shard, columns in batcher.ready(now):
+                await publish(topics[shard], encode(shard, *columns))
+
+            await asyncio.sleep(max(0.0, TICK - (time.perf_counter() - now)))
+
+        for shard, columns in batcher.ready(time.perf_counter(), flush=True):
+            await publish(topics[shard], encode(shard, *columns))
+    finally:
+        await engine.close(timeout=5)
+        if recorder is not None:
+            recorder.close()
+        report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish simulated sensor readings at a target rate")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=10000, help="target readings per second (all processes)")
+    parser.add_argument("--processes", type=int, default=4, help="parallel client connections")
+    parser.add_argument("--duration", type=float, default=None, help="stop after N seconds")
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--format", choices=["json", "binary"], default="json", help="payload encoding")
+    parser.add_argument("--batch-size", type=int, default=1, help="readings per message (per shard)")
+    parser.add_argument("--batch-window-ms", type=float, default=100, help="max wait before a partial batch is sent")
+    parser.add_argument("--shards", type=int, default=0, help="spread devices over this many topics")
+    parser.add_argument("--topic-template", default=TOPIC_TEMPLATE, help="shard topic, {shard} is replaced")
+    parser.add_argument("--inflight", type=int, default=1000, help="max unacknowledged QoS 1 messages per client")
+    parser.add_argument("--broker", default=BROKER or "localhost")
+    parser.add_argument("--port", type=int, default=None, help="default 1883 with --no-tls, else MQTT_PORT")
+    parser.add_argument("--no-tls", action="store_true", help="plain TCP, e.g. for a local mosquitto")
+    parser.add_argument("--topic", default=TOPIC or "iot/sensors/data")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between summaries")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="reproducible readings for the same --devices/--processes/--seed")
+    parser.add_argument("--trace", action="store_true",
+                        help="add producer/sequence/send-time fields for end-to-end latency tracing")
+    parser.add_argument("--record", default=None,
+                        help="also write the published stream to this file (one per process, see stream_recorder.py)")
+    args = parser.parse_args()
+    if args.port is None:
+        args.port = 1883 if args.no_tls else PORT
+
+    processes = args.processes = max(1, min(args.processes, args.devices))
+    bounds = np.linspace(0, args.devices, processes + 1).astype(int)
+
+    print("=" * 70)
+    print("🚀 IoT LOAD GENERATOR")
+    print("=" * 70)
+    topic = args.topic_template.format(shard=f"0..{args.shards - 1}") if args.shards > 1 else args.topic
+    print(f"📡 Broker: {args.broker}:{args.port} ({'TCP' if args.no_tls else 'TLS'}) | 📢 Topic: {topic}")
+    print(f"🔢 Devices: {args.devices:,} | 🎯 Target: {args.rate:,.0f} readings/s | QoS {args.qos} | "
+          f"{processes} processes")
+    print(f"📦 Payload: {args.format}, up to {args.batch_size} readings per message"
+          + (f" / {args.batch_window_ms:g}ms" if args.batch_size > 1 else ""))
+    print("=" * 70)
+
+    stats = mp.Queue()
+    stop = mp.Event()
+    workers = [
+        mp.Process(
+            target=worker,
+            args=(w, int(bounds[w]), int(bounds[w + 1]), args.rate / processes, args, stats, stop),
+            daemon=True
+        )
+        for w in range(processes)
+    ]
+    for p in workers:
+        p.start()
+
+    # Latest cumulative counters per worker; latencies arrive as per-report histograms
+    sent = np.zeros(processes, dtype=np.int64)         # readings
+    messages = np.zeros(processes, dtype=np.int64)
+    errors = np.zeros(processes, dtype=np.int64)
+    in_flight = np.zeros(processes, dtype=np.int64)
+    reconnects = np.zeros(processes, dtype=np.int64)
+    interval_hist = np.zeros(len(LATENCY_BINS) - 1, dtype=np.int64)
+    total_hist = np.zeros_like(interval_hist)
+
+    def collect(timeout):
+        try:
+            w, w_sent, w_messages, w_errors, w_in_flight, w_reconnects, hist = stats.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        sent[w], messages[w], errors[w] = w_sent, w_messages, w_errors
+        in_flight[w], reconnects[w] = w_in_flight, w_reconnects
+        interval_hist[:] += hist
+        return True
+
+    started = last_report = time.perf_counter()
+    last_sent = 0
+    try:
+        while args.duration is None or time.perf_counter() - started < args.duration:
+            collect(timeout=0.5)
+            now = time.perf_counter()
+            if now - last_report >= args.report_every:
+                elapsed = now - last_report
+                p50, p99 = latency_percentiles(interval_hist)
+                latency = f"p50 {p50:.1f} ms, p99 {p99:.1f} ms" if p50 is not None else "no acks"
+                print(f"📈 {datetime.now().strftime('%H:%M:%S')} | "
+                      f"sent {(sent.sum() - last_sent) / elapsed:,.0f} readings/s | "
+                      f"acked {interval_hist.sum() / elapsed:,.0f} msg/s | {latency} | "
+                      f"in flight {in_flight.sum():,} | errors {errors.sum():,} | reconnects {reconnects.sum()}")
+                total_hist += interval_hist
+                interval_hist[:] = 0
+                last_sent = sent.sum()
+                last_report = now
+            if not any(p.is_alive() for p in workers):
+                print("✗ All workers exited")
+                break
+    except KeyboardInterrupt:
+        pass
+
+    stop.set()
+    for p in workers:
+        p.join(timeout=10)
+    while collect(timeout=0.5):
+        pass
+    total_hist += interval_hist
+
+    elapsed = time.perf_counter() - started
+    p50, p99 = latency_percentiles(total_hist)
+    print("\n" + "=" * 70)
+    print("🛑 LOAD TEST COMPLETE")
+    print("=" * 70)
+    print(f"✓ Sent {sent.sum():,} readings in {messages.sum():,} messages in {elapsed:.1f}s "
+          f"({sent.sum() / elapsed:,.0f} readings/s)")
+    print(f"✓ Acknowledged {total_hist.sum():,} | errors {errors.sum():,} | reconnects {reconnects.sum()}")
+    if p50 is not None:
+        print(f"✓ Latency p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    print("=" * 70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,37 @@
 import paho.mqtt.client as mqtt
+import numpy as np
 import json
 import time
-import random
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+import sensor_codec
+from batching import shard_of, shard_topic
+from tracing import Tracer, producer_id
 
 # Load environment variables
 load_dotenv()
 
 # Configuration
 BROKER = os.getenv('MQTT_BROKER')
-PORT = int(os.getenv('MQTT_PORT'))
+PORT = int(os.getenv('MQTT_PORT', '8883'))
 TOPIC = os.getenv('MQTT_TOPIC')
+# Topic sharding: with MQTT_SHARDS > 1 each device publishes to its shard's topic instead of MQTT_TOPIC
+MQTT_SHARDS = int(os.getenv('MQTT_SHARDS', '0'))
+TOPIC_TEMPLATE = os.getenv('MQTT_TOPIC_TEMPLATE', 'sensors/{shard}/data')
+MQTT_USERNAME = os.getenv('MQTT_USERNAME')
+MQTT_PASSWORD = os.getenv('MQTT_PASSWORD')
+# "json" (one message per reading) or "binary" (all devices packed into one message, see sensor_codec)
+PAYLOAD_FORMAT = os.getenv('PAYLOAD_FORMAT', 'json').lower()
+# Add producer/sequence/send-time fields for end-to-end latency tracing (see tracing.py)
+TRACE_PAYLOADS = os.getenv('TRACE_PAYLOADS', 'false').lower() == 'true'
+# Seed for a reproducible random walk (unset: different every run)
+SIMULATOR_SEED = int(os.getenv('SIMULATOR_SEED')) if os.getenv('SIMULATOR_SEED') else None
 
 # Sensor configuration
 DEVICES = [
     "sensor_01",
-    "sensor_02", 
+    "sensor_02",
     "sensor_03",
     "sensor_04",
     "sensor_05"
@@ -29,20 +43,68 @@ TEMP_MAX = 35.0
 HUMIDITY_MIN = 40.0
 HUMIDITY_MAX = 85.0
 
-# Add some variation to make it more realistic
-device_states = {}
-for device in DEVICES:
-    device_states[device] = {
-        'temperature': random.uniform(TEMP_MIN, TEMP_MAX),
-        'humidity': random.uniform(HUMIDITY_MIN, HUMIDITY_MAX)
-    }
+# Maximum drift per reading
+TEMP_DRIFT = 1.5
+HUMIDITY_DRIFT = 3.0
+
+def device_name(index):
+    """Device id for a simulated device index (sensor_01, sensor_02, ...)"""
+    return f"sensor_{index + 1:02d}"
+
+class DeviceStates:
+    """
+    Temperature/humidity of every simulated device, stored as NumPy arrays
+    so a whole fleet can be advanced with a few vectorized operations.
+
+    Temperature and humidity draw from separate random streams, so with a
+    seed the values each device produces are the same however the updates
+    are split into batches.
+    """
+
+    def __init__(self, n_devices, seed=None):
+        temp_seed, humidity_seed = np.random.SeedSequence(seed).spawn(2)
+        self.temp_rng = np.random.default_rng(temp_seed)
+        self.humidity_rng = np.random.default_rng(humidity_seed)
+        self.temperature = self.temp_rng.uniform(TEMP_MIN, TEMP_MAX, n_devices)
+        self.humidity = self.humidity_rng.uniform(HUMIDITY_MIN, HUMIDITY_MAX, n_devices)
+
+    def __len__(self):
+        return len(self.temperature)
+
+def generate_sensor_data(states, index=None):
+    """
+    Generate realistic IoT sensor data with gradual changes
+    to simulate real-world sensor behavior.
+
+    Advances the devices selected by `index` (slice or index array; default
+    all) by one reading and returns their (temperature, humidity) arrays,
+    rounded to two decimals.
+    """
+    if index is None:
+        index = slice(None)
+
+    # Add small random variation to previous values (realistic sensor drift)
+    temp = states.temperature[index]
+    humidity = states.humidity[index]
+    n = len(temp)
+
+    temp = np.clip(temp + states.temp_rng.uniform(-TEMP_DRIFT, TEMP_DRIFT, n), TEMP_MIN, TEMP_MAX)
+    humidity = np.clip(
+        humidity + states.humidity_rng.uniform(-HUMIDITY_DRIFT, HUMIDITY_DRIFT, n), HUMIDITY_MIN, HUMIDITY_MAX
+    )
+
+    # Update state
+    states.temperature[index] = temp
+    states.humidity[index] = humidity
+
+    return np.round(temp, 2), np.round(humidity, 2)
 
 # MQTT Callbacks
 def on_connect(client, userdata, flags, rc):
     """Callback when connected to MQTT broker"""
     if rc == 0:
         print(f"Connected to MQTT Broker at {BROKER}:{PORT}")
-        print(f"Publishing to topic: {TOPIC}")
+        print(f"Publishing to topic: {TOPIC if MQTT_SHARDS <= 1 else TOPIC_TEMPLATE}")
         print("-" * 70)
     else:
         print(f"Connection failed with code {rc}")
@@ -57,128 +119,157 @@ def on_disconnect(client, userdata, rc):
     if rc != 0:
         print("Unexpected disconnection. Reconnecting...")
 
-# Create MQTT Client
-client = mqtt.Client(client_id="IoT_Simulator_Publisher")
+def create_client(client_id="IoT_Simulator_Publisher", use_tls=True):
+    """Create an MQTT client configured from the environment"""
+    client = mqtt.Client(client_id=client_id)
 
-# Enable TLS encryption for HiveMQ Cloud
-client.tls_set()  # Uses default trusted CA certificates
+    # Enable TLS encryption for HiveMQ Cloud
+    if use_tls:
+        client.tls_set()  # Uses default trusted CA certificates
 
-# Set username and password (HiveMQ Cloud requires this)
-MQTT_USERNAME = os.getenv('MQTT_USERNAME')
-MQTT_PASSWORD = os.getenv('MQTT_PASSWORD')
-if MQTT_USERNAME and MQTT_PASSWORD:
-    client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-
-client.on_connect = on_connect
-client.on_publish = on_publish
-client.on_disconnect = on_disconnect
-
-# Connect to broker
-try:
-    client.connect(BROKER, PORT, 60)
-    client.loop_start()
-    time.sleep(1)  # Wait for connection
-except Exception as e:
-    print(f"✗ Failed to connect: {e}")
-    exit(1)
-
-def generate_sensor_data(device_id):
-    """
-    Generate realistic IoT sensor data with gradual changes
-    to simulate real-world sensor behavior
-    """
-    # Get previous state
-    prev_state = device_states[device_id]
-    
-    # Add small random variation to previous values (realistic sensor drift)
-    temp_variation = random.uniform(-1.5, 1.5)
-    humidity_variation = random.uniform(-3.0, 3.0)
-    
-    # Calculate new values with bounds
-    new_temp = prev_state['temperature'] + temp_variation
-    new_temp = max(TEMP_MIN, min(TEMP_MAX, new_temp))  # Keep within bounds
-    
-    new_humidity = prev_state['humidity'] + humidity_variation
-    new_humidity = max(HUMIDITY_MIN, min(HUMIDITY_MAX, new_humidity))
-    
-    # Update state
-    device_states[device_id]['temperature'] = new_temp
-    device_states[device_id]['humidity'] = new_humidity
-    
-    # Create data payload
-    data = {
-        "device_id": device_id,
-        "temperature": round(new_temp, 2),
-        "humidity": round(new_humidity, 2),
-        "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-    }
-    
-    return data
-
-def publish_sensor_data():
+    # Set username and password (HiveMQ Cloud requires this)
+    if MQTT_USERNAME and MQTT_PASSWORD:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+
+    return client
+
+def device_topics(device_ids):
+    """Topic for each device: MQTT_TOPIC, or its shard topic when sharding is on"""
+    if MQTT_SHARDS <= 1:
+        return [TOPIC] * len(device_ids)
+    return [shard_topic(TOPIC_TEMPLATE, s) for s in shard_of(device_ids, MQTT_SHARDS)]
+
+# One sequence per topic, so consumers of a subset of shards see gap-free streams
+tracers = {}
+
+def next_trace(topic):
+    if not TRACE_PAYLOADS:
+        return None
+    if topic not in tracers:
+        tracers[topic] = Tracer(producer_id())
+    return tracers[topic].next()
+
+def print_reading(device_id, temp, humidity, timestamp):
+    # Add warning indicators for high values
+    temp_indicator = "🔥" if temp > 32 else "🌡️"
+    humidity_indicator = "💧" if humidity > 75 else "💨"
+
+    print(f"📤 [{device_id}] {temp_indicator} Temp: {temp}°C | "
+          f"{humidity_indicator} Humidity: {humidity}% | "
+          f"Time: {timestamp}")
+
+def publish_packed(client, temperatures, humidities):
+    """Publish the readings as one binary message per topic"""
+    timestamp_ms = sensor_codec.epoch_ms()
+    timestamp = datetime.utcfromtimestamp(timestamp_ms / 1000).strftime("%Y-%m-%dT%H:%M:%SZ")
+    topics = np.array(device_topics(DEVICES))
+    published = 0
+
+    for topic in np.unique(topics):
+        index = np.flatnonzero(topics == topic)
+        message = sensor_codec.encode(
+            index, temperatures[index], humidities[index], timestamp_ms, next_trace(str(topic))
+        )
+        result = client.publish(str(topic), message, qos=1)
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            print(f"✗ Failed to publish packed message to {topic}")
+            continue
+
+        for i in index:
+            print_reading(DEVICES[i], float(temperatures[i]), float(humidities[i]), timestamp)
+        print(f"📦 Packed {len(index)} readings into {len(message)} bytes → {topic}")
+        published += len(index)
+    return published
+
+def publish_sensor_data(client, states):
     """Publish sensor data for all devices"""
     messages_published = 0
-    
-    for device_id in DEVICES:
+    temperatures, humidities = generate_sensor_data(states)
+    if PAYLOAD_FORMAT == "binary":
+        return publish_packed(client, temperatures, humidities)
+
+    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+    topics = device_topics(DEVICES)
+
+    for i, device_id in enumerate(DEVICES):
         try:
-            # Generate sensor data
-            sensor_data = generate_sensor_data(device_id)
-            
+            # Create data payload
+            sensor_data = {
+                "device_id": device_id,
+                "temperature": float(temperatures[i]),
+                "humidity": float(humidities[i]),
+                "timestamp": timestamp
+            }
+            trace = next_trace(topics[i])
+            if trace is not None:
+                sensor_data["trace"] = dict(zip(("producer", "seq", "sent_ns"), trace))
+
             # Convert to JSON
             message = json.dumps(sensor_data)
-            
+
             # Publish to MQTT broker
-            result = client.publish(TOPIC, message, qos=1)
-            
+            result = client.publish(topics[i], message, qos=1)
+
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
                 messages_published += 1
                 # Color-coded output for better visibility
-                temp = sensor_data['temperature']
-                humidity = sensor_data['humidity']
-                
-                # Add warning indicators for high values
-                temp_indicator = "🔥" if temp > 32 else "🌡️"
-                humidity_indicator = "💧" if humidity > 75 else "💨"
-                
-                print(f"📤 [{device_id}] {temp_indicator} Temp: {temp}°C | "
-                      f"{humidity_indicator} Humidity: {humidity}% | "
-                      f"Time: {sensor_data['timestamp']}")
+                print_reading(device_id, sensor_data['temperature'], sensor_data['humidity'], sensor_data['timestamp'])
             else:
                 print(f"✗ Failed to publish for {device_id}")
-                
+
         except Exception as e:
             print(f"✗ Error publishing data for {device_id}: {e}")
-    
+
     return messages_published
 
 # Main simulation loop
 def main():
+    client = create_client()
+    client.on_connect = on_connect
+    client.on_publish = on_publish
+    client.on_disconnect = on_disconnect
+
+    # Connect to broker
+    try:
+        client.connect(BROKER, PORT, 60)
+        client.loop_start()
+        time.sleep(1)  # Wait for connection
+    except Exception as e:
+        print(f"✗ Failed to connect: {e}")
+        exit(1)
+
+    states = DeviceStates(len(DEVICES), SIMULATOR_SEED)
+
     print("\n" + "="*70)
     print("🚀 IoT SENSOR SIMULATOR - MQTT Publisher")
     print("="*70)
     print(f"📡 Broker: {BROKER}:{PORT}")
-    print(f"📢 Topic: {TOPIC}")
+    if MQTT_SHARDS > 1:
+        print(f"📢 Topics: {TOPIC_TEMPLATE} ({MQTT_SHARDS} shards)")
+    else:
+        print(f"📢 Topic: {TOPIC}")
     print(f"🔢 Devices: {len(DEVICES)}")
+    print(f"📦 Payload: {PAYLOAD_FORMAT}")
     print(f"⏱️  Interval: 5 seconds")
     print("="*70)
     print("Press Ctrl+C to stop\n")
-    
+
     cycle_count = 0
-    
+
     try:
         while True:
             cycle_count += 1
             print(f"\n📊 Cycle #{cycle_count} - {datetime.now().strftime('%H:%M:%S')}")
             print("-" * 70)
-            
-            messages_published = publish_sensor_data()
-            
+
+            messages_published = publish_sensor_data(client, states)
+
             print("-" * 70)
             print(f"✓ Published {messages_published}/{len(DEVICES)} messages")
-            
+
             # Wait 5 seconds before next cycle
             time.sleep(5)
-            
+
     except KeyboardInterrupt:
         print("\n\n" + "="*70)
         print("🛑 STOPPING SIMULATOR")
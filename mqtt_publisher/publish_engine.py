@@ -0,0 +1,204 @@
+"""
+Asyncio MQTT publish engine.
+
+Drives a paho client from the asyncio event loop (no loop_start() thread)
+and bounds the number of unacknowledged messages: publish() waits while the
+in-flight window is full, so a producer that outruns the broker is slowed
+down instead of queueing messages in memory without limit. The
+publish -> PUBACK round trip of every message is recorded.
+
+A dropped connection is re-established with backoff on the same client.
+paho keeps unacknowledged QoS 1 messages and resends them (DUP flag set)
+after the new CONNACK, so nothing in flight is lost; publish() holds new
+messages until the connection is back.
+"""
+import asyncio
+import collections
+import time
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+
+class PublishEngine:
+    def __init__(self, client, host, port, max_inflight=1000, keepalive=60, latency_window=100000):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.max_inflight = max_inflight
+
+        self.pending = {}           # mid -> send time
+        self.latencies = collections.deque(maxlen=latency_window)
+        self.fresh = []             # latencies since the last drain_latencies()
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.backpressure_seconds = 0.0
+
+        self.loop = None
+        self.closing = False
+        self.reconnecting = None
+        self.housekeeping = None
+
+        client.max_inflight_messages_set(max_inflight)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    # Lifecycle
+
+    async def start(self, timeout=10):
+        self.loop = asyncio.get_running_loop()
+        self.window = asyncio.Semaphore(self.max_inflight)
+        self.connected = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.connack = self.loop.create_future()
+
+        self.client.connect(self.host, self.port, self.keepalive)
+        self.housekeeping = self.loop.create_task(self._housekeeping())
+        rc = await asyncio.wait_for(self.connack, timeout)
+        if rc != 0:
+            raise ConnectionError(f"MQTT connection refused: {mqtt.connack_string(rc)}")
+
+    async def close(self, timeout=10):
+        """Wait (up to timeout) for in-flight messages, then disconnect"""
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.closing = True
+        for task in (self.reconnecting, self.housekeeping):
+            if task is not None:
+                task.cancel()
+        self.client.disconnect()
+
+    async def flush(self):
+        """Wait until every published message has been acknowledged"""
+        await self.idle.wait()
+
+    # Publishing
+
+    async def publish(self, topic, payload, qos=1):
+        """
+        Queue one message, waiting while the in-flight window is full or the
+        connection is down. Returns False if paho rejected the message.
+        """
+        if self.window.locked():
+            started = time.perf_counter()
+            await self.window.acquire()
+            self.backpressure_seconds += time.perf_counter() - started
+        else:
+            await self.window.acquire()
+        if not self.connected.is_set():
+            await self.connected.wait()
+
+        info = self.client.publish(topic, payload, qos=qos)
+        # QoS 1 messages stay queued in paho across a disconnect; QoS 0 ones are dropped
+        if info.rc == mqtt.MQTT_ERR_SUCCESS or (qos > 0 and info.rc == mqtt.MQTT_ERR_NO_CONN):
+            self.pending[info.mid] = time.perf_counter()
+            self.idle.clear()
+            self.sent += 1
+            return True
+
+        self.window.release()
+        self.errors += 1
+        return False
+
+    def _on_publish(self, client, userdata, mid):
+        sent_at = self.pending.pop(mid, None)
+        if sent_at is None:
+            return
+        latency = time.perf_counter() - sent_at
+        self.latencies.append(latency)
+        self.fresh.append(latency)
+        self.acked += 1
+        self.window.release()
+        if not self.pending:
+            self.idle.set()
+
+    # Connection
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if not self.connack.done():
+            self.connack.set_result(rc)
+        if rc == 0:
+            self.connected.set()
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected.clear()
+        if not self.closing and self.reconnecting is None:
+            self.reconnecting = self.loop.create_task(self._reconnect())
+
+    async def _reconnect(self, max_delay=30):
+        delay = 0.5
+        try:
+            while not self.closing:
+                await asyncio.sleep(delay)
+                try:
+                    self.client.reconnect()
+                    await asyncio.wait_for(self.connected.wait(), self.keepalive)
+                    self.reconnects += 1
+                    return
+                except (OSError, asyncio.TimeoutError) as e:
+                    print(f"✗ Reconnect to {self.host}:{self.port} failed: {e}")
+                    delay = min(delay * 2, max_delay)
+        finally:
+            self.reconnecting = None
+
+    async def _housekeeping(self):
+        """Keepalive pings and QoS retries, which loop_start() would otherwise do"""
+        while not self.closing:
+            if self.client.socket() is not None:
+                self.client.loop_misc()
+            await asyncio.sleep(1)
+
+    # paho external event loop hooks
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, self._on_readable)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    def _on_readable(self):
+        self.client.loop_read()
+        sock = self.client.socket()
+        # TLS can hold decrypted bytes that the selector does not report
+        if sock is not None and hasattr(sock, "pending") and sock.pending():
+            self.loop.call_soon(self._on_readable)
+
+    # Stats
+
+    def drain_latencies(self):
+        """Ack latencies (seconds) recorded since the previous call"""
+        fresh, self.fresh = self.fresh, []
+        return fresh
+
+    def stats(self):
+        p50 = p99 = None
+        if self.latencies:
+            p50, p99 = (np.percentile(np.fromiter(self.latencies, dtype=np.float64), [50, 99]) * 1000).tolist()
+        return {
+            "sent": self.sent,
+            "acked": self.acked,
+            "errors": self.errors,
+            "in_flight": len(self.pending),
+            "max_inflight": self.max_inflight,
+            "reconnects": self.reconnects,
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+            "ack_latency_p50_ms": p50,
+            "ack_latency_p99_ms": p99,
+        }
@@ -0,0 +1,77 @@
+"""
+Compact binary encoding of sensor readings.
+
+A message is an 8-byte header followed by fixed-size 16-byte records, all
+little-endian:
+
+    header   magic b"SR" | version u8 | flags u8 | count u32
+    record   device u32 | temperature i16 | humidity u16 | timestamp i64
+    trace    producer u32 | seq u64 | sent_ns u64      (only with flags & FLAG_TRACE)
+
+device is the numeric device index (sensor_01 is 0), temperature and
+humidity are in hundredths (°C, %) and timestamp is epoch milliseconds. One
+message carries any number of readings. JSON payloads start with "{", so
+consumers can accept both formats on the same topic.
+
+ml_model/sensor_codec.py is the consumer-side copy; ml_model/tests/test_wire_format.py
+round-trips messages between the two copies.
+"""
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"SR"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+TRACE = struct.Struct("<IQQ")
+FLAG_TRACE = 1
+RECORD = np.dtype([
+    ('device', '<u4'),
+    ('temperature', '<i2'),
+    ('humidity', '<u2'),
+    ('timestamp', '<i8'),
+])
+
+
+def epoch_ms():
+    return time.time_ns() // 1_000_000
+
+
+def encode(device, temperature, humidity, timestamp_ms, trace=None):
+    """
+    Pack readings (arrays, or scalars for a single reading) into one message,
+    optionally with a (producer, seq, sent_ns) trace trailer.
+    """
+    device = np.atleast_1d(device)
+    records = np.empty(len(device), dtype=RECORD)
+    records['device'] = device
+    records['temperature'] = np.rint(np.asarray(temperature) * 100)
+    records['humidity'] = np.rint(np.asarray(humidity) * 100)
+    records['timestamp'] = timestamp_ms
+    if trace is None:
+        return HEADER.pack(MAGIC, VERSION, 0, len(records)) + records.tobytes()
+    return HEADER.pack(MAGIC, VERSION, FLAG_TRACE, len(records)) + records.tobytes() + TRACE.pack(*trace)
+
+
+def is_binary(payload):
+    return payload[:2] == MAGIC
+
+
+def decode(payload):
+    """Records of a message as a read-only NumPy view onto the payload (no copy)"""
+    if len(payload) < HEADER.size:
+        raise ValueError("payload shorter than the header")
+    magic, version, flags, count = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a version {VERSION} sensor payload")
+    if len(payload) != HEADER.size + count * RECORD.itemsize + (TRACE.size if flags & FLAG_TRACE else 0):
+        raise ValueError(f"payload size does not match {count} records")
+    return np.frombuffer(payload, dtype=RECORD, count=count, offset=HEADER.size)
+
+
+def trace_of(payload):
+    """(producer, seq, sent_ns) of a traced message, or None"""
+    if not payload[3] & FLAG_TRACE:
+        return None
+    return TRACE.unpack_from(payload, len(payload) - TRACE.size)
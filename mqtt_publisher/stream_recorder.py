@@ -0,0 +1,283 @@
+"""
+Record and replay MQTT sensor streams.
+
+Recordings are compact append-only files, all little-endian:
+
+    header   magic b"IOTREC1\n" | start time u64 (epoch ns)
+    frame    offset from start u64 (ns) | topic id u16 | payload length u32 | payload
+
+The first time a topic appears, a definition frame (topic id 0xFFFF) with
+the topic name as payload assigns it the next id. A truncated last frame
+(e.g. after a crash) is ignored on read and cut off before appending.
+
+Replay re-publishes the frames through a PublishEngine with their original
+inter-arrival times, scaled by --speed (1, N or max). Several files (one
+per load generator worker) are merged by timestamp. --retime shifts the
+timestamps inside the payloads to the replay time, so consumers that drop
+old or duplicate readings accept a replayed stream again, and restamps trace
+send times so latency tracing measures the replay.
+
+    python stream_recorder.py record capture.rec --topic 'sensors/#'    # capture live traffic
+    python load_generator.py --record synthetic.rec --seed 42 ...      # record generated traffic
+    python stream_recorder.py replay capture.rec --speed 1
+    python stream_recorder.py replay synthetic-*.rec --speed max --retime
+    python stream_recorder.py info capture.rec
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta
+
+import sensor_codec
+from tracing import clock_ns
+
+MAGIC = b"IOTREC1\n"
+FILE_HEADER = struct.Struct("<8sQ")
+FRAME = struct.Struct("<QHI")
+TOPIC_DEF = 0xFFFF
+
+
+def scan_frames(data):
+    """Yield (end, offset_ns, topic_id, payload_start) for each complete frame of a mapped recording"""
+    pos = FILE_HEADER.size
+    while pos + FRAME.size <= len(data):
+        offset, topic_id, length = FRAME.unpack_from(data, pos)
+        end = pos + FRAME.size + length
+        if end > len(data):
+            return
+        yield end, offset, topic_id, pos + FRAME.size
+        pos = end
+
+
+def map_recording(path):
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, start_ns = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a stream recording")
+    return data, start_ns
+
+
+def read_frames(path):
+    """Yield (epoch_ns, topic, payload) for every complete frame of a recording"""
+    data, start_ns = map_recording(path)
+    topics = []
+    for end, offset, topic_id, payload_start in scan_frames(data):
+        if topic_id == TOPIC_DEF:
+            topics.append(data[payload_start:end].decode())
+        else:
+            yield start_ns + offset, topics[topic_id], data[payload_start:end]
+
+
+class StreamRecorder:
+    """Appends published messages to a recording file"""
+
+    def __init__(self, path, buffer_size=1 << 20):
+        self.path = path
+        self.topics = {}
+        self.frames = 0
+
+        if os.path.exists(path) and os.path.getsize(path) >= FILE_HEADER.size:
+            data, self.start_ns = map_recording(path)
+            valid = FILE_HEADER.size
+            for end, _, topic_id, payload_start in scan_frames(data):
+                if topic_id == TOPIC_DEF:
+                    self.topics[data[payload_start:end].decode()] = len(self.topics)
+                else:
+                    self.frames += 1
+                valid = end
+            data.close()
+            self.file = open(path, "r+b", buffering=buffer_size)
+            self.file.truncate(valid)
+            self.file.seek(valid)
+        else:
+            self.start_ns = time.time_ns()
+            self.file = open(path, "wb", buffering=buffer_size)
+            self.file.write(FILE_HEADER.pack(MAGIC, self.start_ns))
+
+    def write(self, topic, payload, t_ns=None):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        topic_id = self.topics.get(topic)
+        if topic_id is None:
+            topic_id = self.topics[topic] = len(self.topics)
+            name = topic.encode()
+            self.file.write(FRAME.pack(0, TOPIC_DEF, len(name)) + name)
+
+        offset = max((t_ns if t_ns is not None else time.time_ns()) - self.start_ns, 0)
+        self.file.write(FRAME.pack(offset, topic_id, len(payload)))
+        self.file.write(payload)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+
+def record_path(path, worker_id, workers):
+    """One file per load generator worker: capture.rec -> capture-0.rec, capture-1.rec, ..."""
+    if workers <= 1:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}-{worker_id}{ext}"
+
+
+def retime_payload(payload, shift_ms):
+    """Shift the reading timestamps inside a binary or JSON payload by shift_ms; trace send times become now"""
+    if sensor_codec.is_binary(payload):
+        records = sensor_codec.decode(payload).copy()
+        records['timestamp'] += shift_ms
+        trace = sensor_codec.trace_of(payload)
+        tail = sensor_codec.TRACE.pack(trace[0], trace[1], clock_ns()) if trace else b""
+        return payload[:sensor_codec.HEADER.size] + records.tobytes() + tail
+
+    try:
+        data = json.loads(payload)
+        for reading in data if isinstance(data, list) else [data]:
+            ts = datetime.fromisoformat(reading["timestamp"].replace("Z", "+00:00"))
+            reading["timestamp"] = (ts + timedelta(milliseconds=shift_ms)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            if "trace" in reading:
+                reading["trace"]["sent_ns"] = clock_ns()
+        return json.dumps(data)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return payload
+
+
+async def replay(paths, engine, speed=1.0, retime=False, qos=1, topic=None, report_every=5.0):
+    """Publish recorded frames, paced by their original timestamps / speed (None = as fast as possible)"""
+    frames = heapq.merge(*(read_frames(p) for p in paths), key=lambda frame: frame[0])
+    first_ns = None
+    started = last_report = time.perf_counter()
+    published = last_published = 0
+
+    for t_ns, frame_topic, payload in frames:
+        if first_ns is None:
+            first_ns = t_ns
+        if speed:
+            delay = started + (t_ns - first_ns) / 1e9 / speed - time.perf_counter()
+            if delay > 0.001:
+                await asyncio.sleep(delay)
+        if retime:
+            payload = retime_payload(payload, (time.time_ns() - t_ns) // 1_000_000)
+
+        await engine.publish(topic or frame_topic, payload, qos=qos)
+        published += 1
+
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            print(f"📈 {datetime.now().strftime('%H:%M:%S')} | replayed {published:,} | "
+                  f"{(published - last_published) / (now - last_report):,.0f} msg/s | "
+                  f"in flight {len(engine.pending):,}")
+            last_report, last_published = now, published
+
+    await engine.flush()
+    return published, time.perf_counter() - started
+
+
+def capture(args):
+    from mqtt_publisher import create_client
+
+    recorder = StreamRecorder(args.files[0])
+    client = create_client(f"IoT_Recorder_{os.getpid()}", use_tls=not args.no_tls)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(args.topic, qos=1)
+            print(f"✓ Recording {args.topic} on {args.broker}:{args.port} → {args.files[0]}")
+        else:
+            print(f"❌ Connection failed with code {rc}")
+
+    def on_message(client, userdata, msg):
+        recorder.write(msg.topic, msg.payload)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(args.broker, args.port, 60)
+    client.loop_start()
+    try:
+        while True:
+            time.sleep(args.report_every)
+            print(f"📼 {recorder.frames:,} messages recorded")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        recorder.close()
+        print(f"✓ {recorder.frames:,} messages in {args.files[0]}")
+
+
+async def run_replay(args):
+    from mqtt_publisher import create_client
+    from publish_engine import PublishEngine
+
+    speed = None if args.speed == "max" else float(args.speed)
+    client = create_client(f"IoT_Replay_{os.getpid()}", use_tls=not args.no_tls)
+    engine = PublishEngine(client, args.broker, args.port, max_inflight=args.inflight)
+    await engine.start()
+    try:
+        for _ in range(args.loop):
+            published, elapsed = await replay(
+                args.files, engine, speed, args.retime, args.qos, args.topic, args.report_every
+            )
+            print(f"✓ Replayed {published:,} messages in {elapsed:.2f}s "
+                  f"({published / max(elapsed, 1e-9):,.0f} msg/s)")
+    finally:
+        await engine.close()
+    stats = engine.stats()
+    if stats["ack_latency_p50_ms"] is not None:
+        print(f"✓ Ack latency p50 {stats['ack_latency_p50_ms']:.1f} ms, p99 {stats['ack_latency_p99_ms']:.1f} ms")
+
+
+def info(args):
+    for path in args.files:
+        data, start_ns = map_recording(path)
+        topics, frames, payload_bytes, last = 0, 0, 0, 0
+        for end, offset, topic_id, payload_start in scan_frames(data):
+            if topic_id == TOPIC_DEF:
+                topics += 1
+            else:
+                frames += 1
+                payload_bytes += end - payload_start
+                last = offset
+        started = datetime.utcfromtimestamp(start_ns / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"📼 {path}: {frames:,} messages on {topics} topics, {last / 1e9:.1f}s from {started} UTC, "
+              f"{os.path.getsize(path):,} bytes (avg payload {payload_bytes / max(frames, 1):.0f} B)")
+
+
+def main():
+    from mqtt_publisher import BROKER, PORT, TOPIC
+
+    parser = argparse.ArgumentParser(description="Record and replay MQTT sensor streams")
+    parser.add_argument("command", choices=["record", "replay", "info"])
+    parser.add_argument("files", nargs="+", help="recording file(s); replay merges several by time")
+    parser.add_argument("--broker", default=BROKER or "localhost")
+    parser.add_argument("--port", type=int, default=None, help="default 1883 with --no-tls, else MQTT_PORT")
+    parser.add_argument("--no-tls", action="store_true", help="plain TCP, e.g. for a local mosquitto")
+    parser.add_argument("--topic", default=None,
+                        help="record: topic filter (default MQTT_TOPIC); replay: publish everything here")
+    parser.add_argument("--speed", default="1", help="replay speed multiplier, or 'max'")
+    parser.add_argument("--retime", action="store_true", help="shift payload timestamps to replay time")
+    parser.add_argument("--loop", type=int, default=1, help="replay the recording N times")
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--inflight", type=int, default=1000)
+    parser.add_argument("--report-every", type=float, default=5.0)
+    args = parser.parse_args()
+    if args.port is None:
+        args.port = 1883 if args.no_tls else PORT
+
+    if args.command == "record":
+        args.topic = args.topic or TOPIC or "iot/sensors/data"
+        capture(args)
+    elif args.command == "replay":
+        asyncio.run(run_replay(args))
+    else:
+        info(args)
+
+
+if __name__ == "__main__":
+    main()
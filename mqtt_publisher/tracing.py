@@ -0,0 +1,42 @@
+"""
+Latency tracing fields for published messages.
+
+Each traced message carries its producer id, a per-producer sequence number
+(1, 2, 3, ...) and the send time in nanoseconds. Consumers use them for
+per-hop latency and to detect dropped or duplicated messages.
+
+The send time is CLOCK_MONOTONIC by default, which every process on the
+same host shares (e.g. a local mosquitto benchmark). Set
+TRACE_CLOCK=realtime on both sides to use the wall clock instead when
+publisher and consumers run on different, clock-synchronized hosts.
+"""
+import os
+import time
+
+TRACE_CLOCK = os.getenv("TRACE_CLOCK", "monotonic").lower()
+
+
+def clock_ns():
+    return time.time_ns() if TRACE_CLOCK == "realtime" else time.monotonic_ns()
+
+
+def producer_id(worker_id=0):
+    """32-bit id that is unique per publishing process/worker on a host"""
+    return ((os.getpid() << 8) | worker_id) & 0xFFFFFFFF
+
+
+class Tracer:
+    def __init__(self, producer):
+        self.producer = producer
+        self.seq = 0
+
+    def next(self):
+        """(producer, seq, sent_ns) for the next message"""
+        self.seq += 1
+        return self.producer, self.seq, clock_ns()
+
+
+def trace_json_fragment(trace):
+    """The "trace" member for a JSON reading"""
+    producer, seq, sent_ns = trace
+    return f'"trace": {{"producer": {producer}, "seq": {seq}, "sent_ns": {sent_ns}}}'